@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+import asyncio
+
+from app.core.auth import get_current_user
+from app.db import models
+from app.db.database import get_read_db
+from app.db.surveillance import surveillance_query
+from app.schemas import schemas
+from app.services.outbreak import alert_stream, outbreak_monitor
+
+router = APIRouter(
+    prefix="/api/analytics",
+    tags=["analytics"],
+    responses={404: {"description": "Not found"}},
+)
+
+# Seconds between SSE keep-alive comments so proxies don't drop idle streams
+STREAM_HEARTBEAT_SECONDS = 15
+
+@router.on_event("startup")
+def start_outbreak_monitor():
+    outbreak_monitor.start()
+
+@router.on_event("shutdown")
+def stop_outbreak_monitor():
+    outbreak_monitor.stop()
+
+@router.get("/surveillance", response_model=List[schemas.SurveillanceCount])
+def read_surveillance(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    district: Optional[str] = None,
+    village: Optional[str] = None,
+    disease: Optional[str] = None,
+    level: str = Query("village", pattern="^(village|district)$"),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(get_current_user),
+):
+    """Diagnoses per disease and week, per village or summed per district.
+
+    ``start``/``end`` select the weeks (Monday to Sunday) overlapping that
+    range; counts come from the weekly aggregates in ``app.db.surveillance``.
+    """
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=400, detail="end is before start")
+    if village is not None and level == "district":
+        raise HTTPException(status_code=400, detail="village filter needs level=village")
+    rows = db.execute(surveillance_query(start, end, district, village, disease,
+                                         by_village=level == "village")).all()
+    # Patients without a recorded district or village are stored under ""
+    return [
+        {
+            "week_start": row.week_start,
+            "district": row.district or None,
+            "disease": row.disease,
+            "village": (row.village or None) if level == "village" else None,
+            "count": row.count,
+        }
+        for row in rows
+    ]
+
+@router.get("/alerts", response_model=List[schemas.OutbreakAlert])
+def read_alerts(
+    since: Optional[datetime] = None,
+    district: Optional[str] = None,
+    disease: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(get_current_user),
+):
+    """Outbreak alerts, newest first"""
+    query = db.query(models.OutbreakAlert)
+    if since is not None:
+        query = query.filter(models.OutbreakAlert.created_at >= since)
+    if district is not None:
+        query = query.filter(models.OutbreakAlert.district == district)
+    if disease is not None:
+        query = query.filter(models.OutbreakAlert.disease == models.DISEASE_ALIASES.get(disease, disease))
+    return query.order_by(models.OutbreakAlert.id.desc()).limit(limit).all()
+
+@router.get("/alerts/stream")
+async def stream_alerts(current_user: str = Depends(get_current_user)):
+    """Server-Sent Events stream of outbreak alerts as they are raised"""
+    async def event_source():
+        with alert_stream.subscribe() as queue:
+            while True:
+                try:
+                    alert = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: alert\ndata: {alert.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/alerts/detector")
+def read_detector_stats(current_user: str = Depends(get_current_user)) -> Dict[str, Any]:
+    """Outbreak detector state: series tracked, events processed, checkpoint"""
+    return outbreak_monitor.stats()
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import os
+import asyncio
 import json
 import random
 from datetime import datetime
 
-from app.db.database import get_db
-from app.models import models
+from app.core.uploads import save_upload
+from app.db.database import AsyncDB, get_async_db, get_read_db
+from app.db import models
+from app.models.diagnosis import DiagnosisType
 from app.schemas import schemas
+from app.services.model_registry import model_registry
 
 router = APIRouter(
     prefix="/api/diagnose",
@@ -27,31 +30,50 @@ DIAGNOSES = {
     "hypertension": ["headache", "shortness of breath", "chest pain", "dizziness"]
 }
 
+@router.on_event("startup")
+async def start_model_sweeper():
+    model_registry.start()
+
+@router.on_event("shutdown")
+async def stop_model_sweeper():
+    model_registry.stop()
+    model_registry.unload_all()
+
 @router.post("/", response_model=schemas.Diagnosis)
 async def create_diagnosis(
     patient_id: int = Form(...),
     symptoms: str = Form(...),
+    diagnosis_type: DiagnosisType = Form(DiagnosisType.GENERAL),
     image: Optional[UploadFile] = File(None),
     voice: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncDB = Depends(get_async_db)
 ):
     # Check if patient exists
-    db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    db_patient = await db.get(models.Patient, patient_id)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     
     # Simulate AI model prediction
-    symptoms_list = [s.strip().lower() for s in symptoms.split(',')]
+    symptoms_list = [s.lower() for s in models.split_symptoms(symptoms)]
+
+    # Quantized model for this diagnosis type when one is installed; inference
+    # and any model loading run off the event loop
+    loop = asyncio.get_running_loop()
+    prediction = await loop.run_in_executor(None, model_registry.predict, diagnosis_type.value, symptoms_list)
     
     # Simple matching algorithm for demonstration
     matches = {}
-    for disease, disease_symptoms in DIAGNOSES.items():
-        match_count = sum(1 for s in symptoms_list if s in disease_symptoms)
-        if match_count > 0:
-            matches[disease] = match_count / len(disease_symptoms)
+    if not prediction:
+        for disease, disease_symptoms in DIAGNOSES.items():
+            match_count = sum(1 for s in symptoms_list if s in disease_symptoms)
+            if match_count > 0:
+                matches[disease] = match_count / len(disease_symptoms)
     
+    if prediction:
+        diagnosis = max(prediction, key=prediction.get)
+        confidence = prediction[diagnosis]
     # If no matches, return generic response
-    if not matches:
+    elif not matches:
         diagnosis = "Unknown condition"
         confidence = 0.3
     else:
@@ -64,49 +86,46 @@ async def create_diagnosis(
     voice_path = None
     
     if image:
-        # Create directory if it doesn't exist
-        os.makedirs("uploads/images", exist_ok=True)
         image_path = f"uploads/images/{patient_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg"
-        with open(image_path, "wb") as f:
-            f.write(await image.read())
+        await save_upload(image, image_path)
     
     if voice:
-        # Create directory if it doesn't exist
-        os.makedirs("uploads/voice", exist_ok=True)
         voice_path = f"uploads/voice/{patient_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.mp3"
-        with open(voice_path, "wb") as f:
-            f.write(await voice.read())
+        await save_upload(voice, voice_path)
     
     # Create diagnosis record
     db_diagnosis = models.Diagnosis(
         patient_id=patient_id,
-        symptoms=symptoms,
+        diagnosis_type=diagnosis_type.value,
+        symptoms=symptoms_list,
         diagnosis=diagnosis,
+        prediction=prediction,
         confidence=confidence,
         image_path=image_path,
         voice_path=voice_path,
         synced=False
     )
     
-    db.add(db_diagnosis)
-    db.commit()
-    db.refresh(db_diagnosis)
-    
-    return db_diagnosis
+    return await db.save(db_diagnosis)
 
 @router.get("/", response_model=List[schemas.Diagnosis])
-def read_diagnoses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_diagnoses(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     diagnoses = db.query(models.Diagnosis).offset(skip).limit(limit).all()
     return diagnoses
 
+@router.get("/models")
+def read_model_stats():
+    """Loaded diagnosis models, memory budget use and per-model latency"""
+    return model_registry.stats()
+
 @router.get("/{diagnosis_id}", response_model=schemas.Diagnosis)
-def read_diagnosis(diagnosis_id: int, db: Session = Depends(get_db)):
+def read_diagnosis(diagnosis_id: int, db: Session = Depends(get_read_db)):
     db_diagnosis = db.query(models.Diagnosis).filter(models.Diagnosis.id == diagnosis_id).first()
     if db_diagnosis is None:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
     return db_diagnosis
 
 @router.get("/patient/{patient_id}", response_model=List[schemas.Diagnosis])
-def read_patient_diagnoses(patient_id: int, db: Session = Depends(get_db)):
+def read_patient_diagnoses(patient_id: int, db: Session = Depends(get_read_db)):
     diagnoses = db.query(models.Diagnosis).filter(models.Diagnosis.patient_id == patient_id).all()
     return diagnoses
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
-import os
-from ..db.database import get_db
-from ..models.diagnosis import Diagnosis, DiagnosisCreate, DiagnosisUpdate
+from ..db.database import AsyncDB, get_async_db, get_db, get_read_db
+from ..models.diagnosis import DiagnosisCreate, DiagnosisUpdate
+from ..schemas.schemas import Diagnosis
 from ..db.models import Diagnosis as DiagnosisModel
 from ..core.auth import get_current_user
+from ..core.uploads import save_upload
+from ..core.fast_json import FAST_JSON_RESPONSES, RowEncoder
 
 router = APIRouter()
 
@@ -17,13 +19,17 @@ def create_diagnosis(diagnosis: DiagnosisCreate, db: Session = Depends(get_db),
     db.refresh(db_diagnosis)
     return db_diagnosis
 
+diagnosis_rows = RowEncoder(Diagnosis)
+
 @router.get("/", response_model=List[Diagnosis])
-def read_diagnoses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
+def read_diagnoses(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db), current_user: str = Depends(get_current_user)):
+    if FAST_JSON_RESPONSES:
+        return diagnosis_rows.response(db.query(*diagnosis_rows.columns(DiagnosisModel)).offset(skip).limit(limit).all())
     diagnoses = db.query(DiagnosisModel).offset(skip).limit(limit).all()
     return diagnoses
 
 @router.get("/{diagnosis_id}", response_model=Diagnosis)
-def read_diagnosis(diagnosis_id: int, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
+def read_diagnosis(diagnosis_id: int, db: Session = Depends(get_read_db), current_user: str = Depends(get_current_user)):
     diagnosis = db.query(DiagnosisModel).filter(DiagnosisModel.id == diagnosis_id).first()
     if diagnosis is None:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
@@ -43,39 +49,29 @@ def update_diagnosis(diagnosis_id: int, diagnosis: DiagnosisUpdate, db: Session
     return db_diagnosis
 
 @router.post("/upload/image/{diagnosis_id}")
-async def upload_image(diagnosis_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    diagnosis = db.query(DiagnosisModel).filter(DiagnosisModel.id == diagnosis_id).first()
+async def upload_image(diagnosis_id: int, file: UploadFile = File(...), db: AsyncDB = Depends(get_async_db), current_user: str = Depends(get_current_user)):
+    diagnosis = await db.get(DiagnosisModel, diagnosis_id)
     if diagnosis is None:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
     
-    # Create uploads directory if it doesn't exist
-    os.makedirs("uploads/images", exist_ok=True)
-    
-    # Save the file
+    # Save the file off the event loop, creating the uploads directory if needed
     file_path = f"uploads/images/{diagnosis_id}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    await save_upload(file, file_path)
     
     diagnosis.image_path = file_path
-    db.commit()
+    await db.commit()
     return {"filename": file.filename}
 
 @router.post("/upload/voice/{diagnosis_id}")
-async def upload_voice(diagnosis_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    diagnosis = db.query(DiagnosisModel).filter(DiagnosisModel.id == diagnosis_id).first()
+async def upload_voice(diagnosis_id: int, file: UploadFile = File(...), db: AsyncDB = Depends(get_async_db), current_user: str = Depends(get_current_user)):
+    diagnosis = await db.get(DiagnosisModel, diagnosis_id)
     if diagnosis is None:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
     
-    # Create uploads directory if it doesn't exist
-    os.makedirs("uploads/voice", exist_ok=True)
-    
-    # Save the file
+    # Save the file off the event loop, creating the uploads directory if needed
     file_path = f"uploads/voice/{diagnosis_id}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    await save_upload(file, file_path)
     
     diagnosis.voice_path = file_path
-    db.commit()
+    await db.commit()
     return {"filename": file.filename} 
\ No newline at end of file
@@ -1,12 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import random
+import logging
 from datetime import datetime
 
-from app.db.database import get_db
-from app.models import models
+from app.db.database import ReadSessionLocal, db_executor, get_db, get_read_db
+from app.db import models
 from app.schemas import schemas
+from app.services.energy_stream import energy_stream
+from app.core.cache import cache
+from app.core.fast_json import FAST_JSON_RESPONSES, RowEncoder
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/energy",
@@ -14,23 +22,107 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Seconds between SSE keep-alive comments so proxies don't drop idle streams
+STREAM_HEARTBEAT_SECONDS = 15
+# Stats are recomputed at most this often; new readings invalidate them sooner
+ENERGY_STATS_CACHE_TTL = 60
+# Multi-worker mode: how often each worker checks for readings ingested by another
+ENERGY_FOLLOW_INTERVAL = 1.0
+
+
+def _publish(db_energy_log: models.EnergyLog) -> schemas.EnergyLog:
+    """Push a freshly committed reading to the in-memory latest holder and subscribers"""
+    reading = schemas.EnergyLog.model_validate(db_energy_log)
+    energy_stream.publish(reading)
+    return reading
+
+
+def _latest_reading(db: Session) -> Optional[schemas.EnergyLog]:
+    """Latest reading from memory, falling back to the database once after startup"""
+    reading = energy_stream.latest
+    if reading is None:
+        db_energy_log = db.query(models.EnergyLog).order_by(models.EnergyLog.timestamp.desc()).first()
+        if db_energy_log is not None:
+            energy_stream.prime(schemas.EnergyLog.model_validate(db_energy_log))
+            reading = energy_stream.latest
+    return reading
+
+
+async def _follow_other_workers() -> None:
+    """Publish readings committed by other workers to this worker's holder and subscribers.
+
+    Every committed energy log bumps the shared ``energy_logs`` cache tag, so
+    the poll is one shared-memory read; the database is only queried when
+    some worker wrote a reading.
+    """
+    shared = cache.shared_versions
+    seen = shared.version("energy_logs")
+    loop = asyncio.get_running_loop()
+
+    def load_latest() -> Optional[schemas.EnergyLog]:
+        with ReadSessionLocal() as db:
+            db_energy_log = db.query(models.EnergyLog).order_by(models.EnergyLog.timestamp.desc()).first()
+            return schemas.EnergyLog.model_validate(db_energy_log) if db_energy_log is not None else None
+
+    while True:
+        await asyncio.sleep(ENERGY_FOLLOW_INTERVAL)
+        version = shared.version("energy_logs")
+        if version == seen:
+            continue
+        seen = version
+        try:
+            reading = await loop.run_in_executor(db_executor, load_latest)
+        except Exception as e:
+            logger.error(f"Failed to load the latest energy reading: {str(e)}")
+            continue
+        latest = energy_stream.latest
+        if reading is not None and (latest is None or reading.id != latest.id):
+            energy_stream.publish(reading)
+
+
+_follower: Optional[asyncio.Task] = None
+
+@router.on_event("startup")
+async def start_following_other_workers():
+    global _follower
+    if cache.shared_versions is not None:
+        _follower = asyncio.get_running_loop().create_task(_follow_other_workers())
+
+@router.on_event("shutdown")
+async def stop_following_other_workers():
+    if _follower is not None:
+        _follower.cancel()
+
+
+def _sse_event(reading: schemas.EnergyLog) -> str:
+    return f"event: energy\ndata: {reading.model_dump_json()}\n\n"
+
+
 @router.post("/", response_model=schemas.EnergyLog)
 def create_energy_log(energy_log: schemas.EnergyLogCreate, db: Session = Depends(get_db)):
     db_energy_log = models.EnergyLog(**energy_log.dict(), synced=False)
     db.add(db_energy_log)
     db.commit()
     db.refresh(db_energy_log)
-    return db_energy_log
+    return _publish(db_energy_log)
+
+# Readings are plain numbers validated on ingest, so pages skip re-validation
+energy_log_rows = RowEncoder(schemas.EnergyLog, trusted=True)
 
 @router.get("/", response_model=List[schemas.EnergyLog])
-def read_energy_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_energy_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    if FAST_JSON_RESPONSES:
+        rows = (db.query(*energy_log_rows.columns(models.EnergyLog))
+                .order_by(models.EnergyLog.timestamp.desc()).offset(skip).limit(limit).all())
+        return energy_log_rows.response(rows)
     energy_logs = db.query(models.EnergyLog).order_by(models.EnergyLog.timestamp.desc()).offset(skip).limit(limit).all()
     return energy_logs
 
 @router.get("/latest", response_model=schemas.EnergyLog)
 def read_latest_energy_log(db: Session = Depends(get_db)):
-    db_energy_log = db.query(models.EnergyLog).order_by(models.EnergyLog.timestamp.desc()).first()
-    if db_energy_log is None:
+    """Latest reading, served from memory once the stream holder is warm"""
+    reading = _latest_reading(db)
+    if reading is None:
         # If no energy log exists, create a simulated one
         db_energy_log = models.EnergyLog(
             battery_level=random.uniform(50.0, 95.0),
@@ -42,7 +134,29 @@ def read_latest_energy_log(db: Session = Depends(get_db)):
         db.add(db_energy_log)
         db.commit()
         db.refresh(db_energy_log)
-    return db_energy_log
+        reading = _publish(db_energy_log)
+    return reading
+
+@router.get("/stream")
+async def stream_energy_logs():
+    """Server-Sent Events stream of energy readings as they are ingested"""
+    async def event_source():
+        with energy_stream.subscribe() as queue:
+            if energy_stream.latest is not None:
+                yield _sse_event(energy_stream.latest)
+            while True:
+                try:
+                    reading = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event(reading)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/simulate", response_model=schemas.EnergyLog)
 def simulate_energy_log(db: Session = Depends(get_db)):
@@ -55,7 +169,7 @@ def simulate_energy_log(db: Session = Depends(get_db)):
     
     # Battery level depends on solar input vs consumption
     # Get the latest battery level if available
-    latest_log = db.query(models.EnergyLog).order_by(models.EnergyLog.timestamp.desc()).first()
+    latest_log = _latest_reading(db)
     
     if latest_log:
         # Calculate new battery level based on solar input and consumption
@@ -82,11 +196,19 @@ def simulate_energy_log(db: Session = Depends(get_db)):
     db.add(db_energy_log)
     db.commit()
     db.refresh(db_energy_log)
-    return db_energy_log
+    return _publish(db_energy_log)
 
 @router.get("/stats", response_model=Dict[str, Any])
-def get_energy_stats(days: int = 1, db: Session = Depends(get_db)):
+def get_energy_stats(days: int = 1, db: Session = Depends(get_read_db)):
     """Get energy statistics for the specified number of days"""
+    return cache.get_or_set(
+        f"energy:stats:{days}",
+        lambda: _energy_stats(db, days),
+        ttl=ENERGY_STATS_CACHE_TTL,
+        tags=("energy_logs",),
+    )
+
+def _energy_stats(db: Session, days: int) -> Dict[str, Any]:
     # In a real implementation, we would query the database for the specified time range
     # For simulation, we'll return mock data
     
@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+from sqlalchemy.pool import QueuePool
+from typing import Dict, Any
+
+from app.core.metrics import registry
+from app.db import models
+from app.db.database import ReadSessionLocal, engine, read_engine
+from app.db.instrumentation import route_query_stats
+from app.services.energy_stream import energy_stream
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    responses={404: {"description": "Not found"}},
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _pool_checked_out():
+    pools = {"writer": engine.pool}
+    if read_engine is not engine:
+        pools["reader"] = read_engine.pool
+    for name, pool in pools.items():
+        if isinstance(pool, QueuePool):
+            yield {"pool": name}, pool.checkedout()
+
+
+def _sync_backlog():
+    with ReadSessionLocal() as db:
+        diagnoses = db.query(func.count(models.Diagnosis.id)).filter(models.Diagnosis.synced == False).scalar()
+        energy_logs = db.query(func.count(models.EnergyLog.id)).filter(models.EnergyLog.synced == False).scalar()
+    yield {"kind": "diagnoses"}, diagnoses
+    yield {"kind": "energy_logs"}, energy_logs
+
+
+def _battery_level():
+    reading = energy_stream.latest
+    if reading is not None:
+        yield {}, reading.battery_level
+
+
+registry.gauge_callback("solarmed_db_pool_checked_out", "Database connections checked out of the pool", _pool_checked_out)
+registry.gauge_callback("solarmed_sync_backlog", "Records waiting to be synced to the cloud", _sync_backlog)
+registry.gauge_callback("solarmed_battery_level_percent", "Latest reported battery level", _battery_level)
+
+
+@router.get("", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of request, database and device metrics"""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@router.get("/queries", response_model=Dict[str, Any])
+def get_query_stats():
+    """Per-route SQL statement counts, DB time and slowest statements"""
+    return route_query_stats.snapshot()
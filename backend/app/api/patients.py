@@ -3,10 +3,12 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 import json
 
-from app.db.database import get_db
-from app.models import models
+from app.db.database import get_db, get_read_db
+from app.db import models
 from app.schemas import schemas
 from app.core.auth import get_current_user
+from app.core.cache import cache
+from app.core.fast_json import FAST_JSON_RESPONSES, PreEncodedJSONResponse, RowEncoder
 
 router = APIRouter(
     prefix="/api/patients",
@@ -22,17 +24,42 @@ def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)
     db.refresh(db_patient)
     return db_patient
 
+# Cached reads are tagged with their table and dropped when a write to it commits
+PATIENT_CACHE_TTL = 300
+
+def _cached_patient(key: str, query) -> Any:
+    """Cache a single patient lookup as a schema object (None when not found)"""
+    def load():
+        db_patient = query.first()
+        return schemas.Patient.model_validate(db_patient) if db_patient is not None else None
+    return cache.get_or_set(key, load, ttl=PATIENT_CACHE_TTL, tags=("patients",))
+
+patient_rows = RowEncoder(schemas.Patient)
+
 @router.get("/", response_model=List[schemas.Patient])
-def read_patients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    patients = db.query(models.Patient).offset(skip).limit(limit).all()
-    return patients
+def read_patients(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db), current_user: str = Depends(get_current_user)):
+    if FAST_JSON_RESPONSES:
+        # The encoded page is cached, so a hit is just the bytes
+        def encode():
+            rows = db.query(*patient_rows.columns(models.Patient)).offset(skip).limit(limit).all()
+            return patient_rows.encode(rows)
+        return PreEncodedJSONResponse(cache.get_or_set(
+            f"patients:list-json:{skip}:{limit}", encode, ttl=PATIENT_CACHE_TTL, tags=("patients",)))
+
+    def load():
+        patients = db.query(models.Patient).offset(skip).limit(limit).all()
+        return [schemas.Patient.model_validate(patient) for patient in patients]
+    return cache.get_or_set(f"patients:list:{skip}:{limit}", load, ttl=PATIENT_CACHE_TTL, tags=("patients",))
 
 @router.get("/{patient_id}", response_model=schemas.Patient)
-def read_patient(patient_id: int, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
-    if db_patient is None:
+def read_patient(patient_id: int, db: Session = Depends(get_read_db), current_user: str = Depends(get_current_user)):
+    patient = _cached_patient(
+        f"patients:id:{patient_id}",
+        db.query(models.Patient).filter(models.Patient.id == patient_id),
+    )
+    if patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return db_patient
+    return patient
 
 @router.put("/{patient_id}", response_model=schemas.Patient)
 def update_patient(patient_id: int, patient: schemas.PatientCreate, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
@@ -58,7 +85,7 @@ def delete_patient(patient_id: int, db: Session = Depends(get_db)):
     return None
 
 @router.get("/{patient_id}/diagnoses", response_model=List[schemas.Diagnosis])
-def read_patient_diagnoses(patient_id: int, db: Session = Depends(get_db)):
+def read_patient_diagnoses(patient_id: int, db: Session = Depends(get_read_db)):
     db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -66,8 +93,11 @@ def read_patient_diagnoses(patient_id: int, db: Session = Depends(get_db)):
     return db_patient.diagnoses
 
 @router.get("/qr/{qr_code}", response_model=schemas.Patient)
-def read_patient_by_qr(qr_code: str, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    patient = db.query(models.Patient).filter(models.Patient.qr_code == qr_code).first()
+def read_patient_by_qr(qr_code: str, db: Session = Depends(get_read_db), current_user: str = Depends(get_current_user)):
+    patient = _cached_patient(
+        f"patients:qr:{qr_code}",
+        db.query(models.Patient).filter(models.Patient.qr_code == qr_code),
+    )
     if patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
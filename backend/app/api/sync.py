@@ -4,9 +4,14 @@ from typing import List, Dict, Any
 import json
 from datetime import datetime
 
-from app.db.database import get_db
-from app.models import models
+from app.db.database import get_db, get_read_db
+from app.db import models
 from app.schemas import schemas
+from app.core.cache import cache
+
+# Unsynced counts change with every diagnosis or energy write, which
+# invalidates the cached status; the TTL only bounds "last_sync" drift
+SYNC_STATUS_CACHE_TTL = 30
 
 router = APIRouter(
     prefix="/api/sync",
@@ -45,8 +50,16 @@ def sync_data(db: Session = Depends(get_db)):
     }
 
 @router.get("/status", response_model=Dict[str, Any])
-def sync_status(db: Session = Depends(get_db)):
+def sync_status(db: Session = Depends(get_read_db)):
     """Get the current sync status"""
+    return cache.get_or_set(
+        "sync:status",
+        lambda: _sync_status(db),
+        ttl=SYNC_STATUS_CACHE_TTL,
+        tags=("diagnoses", "energy_logs"),
+    )
+
+def _sync_status(db: Session) -> Dict[str, Any]:
     unsynced_diagnoses_count = db.query(models.Diagnosis).filter(models.Diagnosis.synced == False).count()
     unsynced_energy_logs_count = db.query(models.EnergyLog).filter(models.EnergyLog.synced == False).count()
     
@@ -1,49 +1,418 @@
 import os
 import sqlite3
-import shutil
 import datetime
+import hashlib
 import json
-from typing import Optional
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 import logging
-from pathlib import Path
+
+from app.backup_catalogue import FAILED, VERIFIED, BackupCatalogue, BackupVerifier, checksum_file
+from app.wal_archive import TIMESTAMP_FORMAT, WAL_ARCHIVE_DIR, WalArchiver, parse_timestamp
 
 logger = logging.getLogger(__name__)
 
+# Pages copied per backup step (4 KiB pages: 1024 pages = 4 MiB) and the
+# pause between steps, during which writers get the database to themselves
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "1024"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.02"))
+# Incremental backups: the database is split into fixed, page-aligned chunks
+# that are stored once (zlib-compressed) and shared between snapshots
+BACKUP_CHUNK_SIZE = int(os.getenv("BACKUP_CHUNK_SIZE", str(16 * 1024)))
+BACKUP_COMPRESSION_LEVEL = int(os.getenv("BACKUP_COMPRESSION_LEVEL", "6"))
+# How long a restore waits for in-flight write transactions to finish
+RESTORE_LOCK_TIMEOUT = float(os.getenv("RESTORE_LOCK_TIMEOUT", "30"))
+# Where the app keeps backups and their catalogue (empty disables verification)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+
+
+class ChunkStore:
+    """Content-addressed, compressed chunk store with one manifest per snapshot.
+
+    A snapshot is a database file cut into ``chunk_size`` pieces. Each piece
+    is stored once under its BLAKE2b digest, so chunks that didn't change
+    since an earlier snapshot (most of them, in a database that mostly
+    appends) cost nothing. SQLite writes whole pages, so page-aligned fixed
+    chunks dedupe as well as content-defined ones would.
+    """
+
+    def __init__(self, root: str, chunk_size: int = BACKUP_CHUNK_SIZE,
+                 compression_level: int = BACKUP_COMPRESSION_LEVEL):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.compression_level = compression_level
+        self.chunk_dir = os.path.join(root, "chunks")
+        self.manifest_dir = os.path.join(root, "snapshots")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.manifest_dir, f"{snapshot_id}.json")
+
+    def add_file(self, path: str, snapshot_id: str, metadata: Optional[dict] = None) -> dict:
+        """Store ``path`` as snapshot ``snapshot_id``; returns its manifest"""
+        chunks: List[str] = []
+        new_chunks = new_bytes = 0
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(self.chunk_size), b""):
+                digest = self.digest(data)
+                chunks.append(digest)
+                chunk_path = self._chunk_path(digest)
+                if os.path.exists(chunk_path):
+                    continue
+                os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                compressed = zlib.compress(data, self.compression_level)
+                self._write_atomic(chunk_path, compressed)
+                new_chunks += 1
+                new_bytes += len(compressed)
+
+        manifest = dict(metadata or {})
+        manifest.update({
+            "id": snapshot_id,
+            "size": os.path.getsize(path),
+            "chunk_size": self.chunk_size,
+            "chunks": chunks,
+            "new_chunks": new_chunks,
+            "new_bytes": new_bytes,
+        })
+        # The manifest goes last: a snapshot exists once all its chunks do
+        self._write_atomic(self._manifest_path(snapshot_id), json.dumps(manifest).encode())
+        return manifest
+
+    def read_chunks(self, manifest: dict) -> Iterator[bytes]:
+        for digest in manifest["chunks"]:
+            with open(self._chunk_path(digest), "rb") as f:
+                data = zlib.decompress(f.read())
+            if self.digest(data) != digest:
+                raise ValueError(f"Chunk {digest} of snapshot {manifest['id']} is corrupt")
+            yield data
+
+    def restore_file(self, snapshot_id: str, path: str) -> None:
+        """Reassemble snapshot ``snapshot_id`` into ``path``"""
+        manifest = self.get_manifest(snapshot_id)
+        if manifest is None:
+            raise FileNotFoundError(f"Snapshot not found: {snapshot_id}")
+        with open(path, "wb") as f:
+            for data in self.read_chunks(manifest):
+                f.write(data)
+
+    def get_manifest(self, snapshot_id: str) -> Optional[dict]:
+        try:
+            with open(self._manifest_path(snapshot_id), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def snapshot_ids(self) -> List[str]:
+        """Snapshot ids, newest first"""
+        return sorted((name[:-5] for name in os.listdir(self.manifest_dir) if name.endswith(".json")),
+                      reverse=True)
+
+    def delete_snapshot(self, snapshot_id: str) -> None:
+        os.remove(self._manifest_path(snapshot_id))
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Delete chunks no manifest references; returns counts of what was removed"""
+        referenced: Set[str] = set()
+        for snapshot_id in self.snapshot_ids():
+            manifest = self.get_manifest(snapshot_id)
+            if manifest is not None:
+                referenced.update(manifest["chunks"])
+        removed = freed = 0
+        for prefix in os.listdir(self.chunk_dir):
+            prefix_dir = os.path.join(self.chunk_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if name in referenced:
+                    continue
+                chunk_path = os.path.join(prefix_dir, name)
+                freed += os.path.getsize(chunk_path)
+                os.remove(chunk_path)
+                removed += 1
+        return {"chunks_removed": removed, "bytes_freed": freed}
+
+    @staticmethod
+    def checksum(manifest: dict) -> str:
+        """Digest of a manifest's size and chunk list; each chunk checks itself"""
+        digest = hashlib.blake2b(str(manifest["size"]).encode(), digest_size=20)
+        for chunk in manifest["chunks"]:
+            digest.update(chunk.encode())
+        return digest.hexdigest()
+
+    def stored_bytes(self) -> int:
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        return total
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
 class BackupManager:
-    def __init__(self, db_path: str, backup_dir: str = "backups"):
+    """Online backups of the live SQLite database.
+
+    Backups use the sqlite3 backup API inside a read transaction, so the copy
+    is a consistent snapshot even in WAL mode and isn't restarted by
+    concurrent commits. Pages are copied ``pages_per_step`` at a time with a
+    ``step_sleep`` pause in between, and ``create_backup_async`` runs the
+    whole thing on a background thread.
+
+    ``create_incremental_backup`` stores a snapshot in the ``ChunkStore``
+    under ``backup_dir/incremental`` instead of a full copy; only chunks that
+    changed since earlier snapshots take space.
+
+    Restores need the application's write lock (see ``create_backup_manager``)
+    so they can wait out in-flight writes and copy the backup into the live
+    database in a single transaction. Pooled connections stay open: SQLite
+    notices the new contents itself, and closing them could checkpoint WAL
+    frames the archiver hasn't seen yet.
+
+    Every backup is recorded in a ``BackupCatalogue`` (``catalogue.db`` in
+    ``backup_dir``) with its checksum; ``verifier`` re-checks them in the
+    background and restores skip re-verifying backups it has passed.
+
+    With a ``WalArchiver`` attached, ``restore_to_point`` rebuilds the
+    database as of any moment the WAL archive covers.
+    """
+
+    def __init__(self, db_path: str, backup_dir: str = "backups",
+                 write_lock: Optional[threading.Lock] = None, after_restore: Optional[Callable[[], None]] = None,
+                 archiver: Optional[WalArchiver] = None,
+                 pages_per_step: int = BACKUP_PAGES_PER_STEP, step_sleep: float = BACKUP_STEP_SLEEP):
         self.db_path = db_path
         self.backup_dir = backup_dir
+        self.write_lock = write_lock
+        self.after_restore = after_restore
+        self.archiver = archiver
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solarmed-backup")
+        self._pending: Optional[Future] = None
         self._ensure_backup_dir()
+        self.chunk_store = ChunkStore(os.path.join(backup_dir, "incremental"))
+        # Pruning must not collect chunks a running backup is about to reference
+        self._store_lock = threading.Lock()
+        self.catalogue = BackupCatalogue(os.path.join(backup_dir, "catalogue.db"))
+        if self.catalogue.created:
+            self.rebuild_catalogue()
+        self.verifier = BackupVerifier(self)
 
     def _ensure_backup_dir(self):
         """Ensure backup directory exists"""
         os.makedirs(self.backup_dir, exist_ok=True)
 
+    @property
+    def backup_in_progress(self) -> bool:
+        return self._pending is not None and not self._pending.done()
+
+    def create_backup_async(self, incremental: bool = False) -> Future:
+        """Start a backup on the background thread; returns a Future of the backup path or snapshot id"""
+        if self.backup_in_progress:
+            return self._pending
+        self._pending = self._executor.submit(self.create_incremental_backup if incremental else self.create_backup)
+        return self._pending
+
     def create_backup(self) -> str:
         """Create a backup of the database"""
+        partial_path = os.path.join(self.backup_dir, f"solarmed_{threading.get_ident()}.partial")
         try:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            start = time.perf_counter()
+            pages, snapshot_at = self._copy_online(partial_path)
+            # Named after the moment the snapshot was taken; only complete
+            # backups ever carry the .db name
+            timestamp = snapshot_at.strftime(TIMESTAMP_FORMAT)
             backup_path = os.path.join(self.backup_dir, f"solarmed_{timestamp}.db")
-            
-            # Copy database file
-            shutil.copy2(self.db_path, backup_path)
-            
+            os.replace(partial_path, backup_path)
+            duration = time.perf_counter() - start
+
             # Create metadata
             metadata = {
                 "timestamp": timestamp,
                 "size": os.path.getsize(backup_path),
-                "original_path": self.db_path
+                "original_path": self.db_path,
+                "pages": pages,
+                "duration_seconds": round(duration, 3)
             }
-            
+
             # Save metadata
             with open(f"{backup_path}.meta", "w") as f:
                 json.dump(metadata, f)
-            
-            logger.info(f"Created backup: {backup_path}")
+            self.catalogue.add(backup_path, "full", timestamp, metadata["size"], checksum_file(backup_path))
+
+            logger.info(f"Created backup: {backup_path} ({pages} pages in {duration:.1f}s)")
             return backup_path
         except Exception as e:
             logger.error(f"Backup creation failed: {str(e)}")
             raise
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def _copy_online(self, target_path: str) -> Tuple[int, datetime.datetime]:
+        """Copy the live database page by page; returns the page count and snapshot time"""
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        source = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        target = sqlite3.connect(target_path)
+        total_pages = 0
+
+        def progress(status, remaining, total):
+            nonlocal total_pages
+            total_pages = total
+            if remaining and self.step_sleep:
+                # Hand the CPU and disk back to request handlers between steps
+                time.sleep(self.step_sleep)
+
+        try:
+            # A read transaction pins one snapshot for the whole copy; without
+            # it every commit on another connection would restart the backup
+            # The snapshot starts under the write lock, so no write is half
+            # committed and WAL archive segments are clearly before or after it
+            if self.write_lock is not None and not self.write_lock.acquire(timeout=RESTORE_LOCK_TIMEOUT):
+                raise TimeoutError("Timed out waiting for the database writer")
+            try:
+                snapshot_at = datetime.datetime.now()
+                source.execute("BEGIN")
+                source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            finally:
+                if self.write_lock is not None:
+                    self.write_lock.release()
+            source.backup(target, pages=self.pages_per_step, progress=progress)
+            source.execute("COMMIT")
+        finally:
+            target.close()
+            source.close()
+        return total_pages, snapshot_at
+
+    def create_incremental_backup(self) -> str:
+        """Snapshot the database into the chunk store; returns the snapshot id"""
+        staging_path = os.path.join(self.backup_dir, f"snapshot_{threading.get_ident()}.partial")
+        try:
+            start = time.perf_counter()
+            # Chunk a consistent online copy; the live file may be mid-write
+            pages, snapshot_at = self._copy_online(staging_path)
+            snapshot_id = snapshot_at.strftime(TIMESTAMP_FORMAT)
+            with self._store_lock:
+                manifest = self.chunk_store.add_file(staging_path, snapshot_id, {
+                    "timestamp": snapshot_id,
+                    "original_path": self.db_path,
+                    "pages": pages,
+                    "duration_seconds": round(time.perf_counter() - start, 3),
+                })
+            self.catalogue.add(snapshot_id, "incremental", snapshot_id, manifest["size"],
+                               ChunkStore.checksum(manifest))
+            logger.info(
+                f"Created incremental backup {snapshot_id}: {manifest['new_chunks']}/{len(manifest['chunks'])} "
+                f"new chunks, {manifest['new_bytes']} bytes stored"
+            )
+            return snapshot_id
+        except Exception as e:
+            logger.error(f"Incremental backup failed: {str(e)}")
+            raise
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+
+    def list_snapshots(self) -> List[dict]:
+        """Incremental snapshots, newest first"""
+        return [{
+            "id": entry["id"],
+            "timestamp": entry["timestamp"],
+            "size": entry["size"],
+            "status": entry["status"],
+        } for entry in self.catalogue.entries("incremental")]
+
+    def restore_snapshot(self, snapshot_id: str) -> bool:
+        """Restore the database from an incremental snapshot"""
+        staging_path = os.path.join(self.backup_dir, f"restore_{snapshot_id}.partial")
+        try:
+            # Reassembly checks every chunk digest; the integrity check is
+            # only needed if the verifier hasn't passed this snapshot yet
+            self.chunk_store.restore_file(snapshot_id, staging_path)
+            if not self._is_verified(snapshot_id) and not self._check_integrity(staging_path):
+                raise ValueError(f"Snapshot failed verification: {snapshot_id}")
+
+            current = self.create_incremental_backup()
+            logger.info(f"Created snapshot of current database: {current}")
+
+            self._swap_in(staging_path)
+            logger.info(f"Restored database from snapshot: {snapshot_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Snapshot restore failed: {str(e)}")
+            raise
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+
+    def prune_snapshots(self, max_snapshots: int = 30) -> Dict[str, int]:
+        """Keep the newest ``max_snapshots`` snapshots and drop chunks nothing references"""
+        with self._store_lock:
+            for snapshot_id in self.chunk_store.snapshot_ids()[max_snapshots:]:
+                self.chunk_store.delete_snapshot(snapshot_id)
+                self.catalogue.remove(snapshot_id)
+                logger.info(f"Removed old snapshot: {snapshot_id}")
+            result = self.chunk_store.collect_garbage()
+        logger.info(f"Backup chunk GC removed {result['chunks_removed']} chunks, {result['bytes_freed']} bytes")
+        return result
+
+    def recover_to(self, target_path: str, until: datetime.datetime) -> datetime.datetime:
+        """Rebuild the database as of ``until`` into ``target_path`` from a backup plus the WAL archive.
+
+        Starts from the newest backup taken at or before ``until`` that isn't
+        marked failed and that the archive covers. Returns the moment the
+        result corresponds to: the last replayed segment, or the backup itself.
+        """
+        if self.archiver is None:
+            raise ValueError("WAL archiving is not configured")
+        for entry in self.catalogue.entries():
+            base_time = parse_timestamp(entry["timestamp"])
+            if entry["status"] == FAILED or base_time > until or not self.archiver.covers(base_time):
+                continue
+            if entry["kind"] == "full":
+                shutil.copyfile(entry["id"], target_path)
+            else:
+                self.chunk_store.restore_file(entry["id"], target_path)
+            recovered_at = self.archiver.replay(target_path, base_time, until) or base_time
+            logger.info(f"Recovered database as of {recovered_at} from backup {entry['id']}")
+            return recovered_at
+        raise ValueError(f"No usable base backup at or before {until}")
+
+    def restore_to_point(self, until: datetime.datetime) -> datetime.datetime:
+        """Restore the live database to its state at ``until`` (to archive-interval precision)"""
+        staging_path = os.path.join(self.backup_dir, f"pitr_{threading.get_ident()}.partial")
+        try:
+            recovered_at = self.recover_to(staging_path, until)
+            if not self._check_integrity(staging_path):
+                raise ValueError("Recovered database failed verification")
+
+            current = self.create_incremental_backup()
+            logger.info(f"Created snapshot of current database: {current}")
+
+            self._swap_in(staging_path)
+            logger.info(f"Restored database to {recovered_at}")
+            return recovered_at
+        except Exception as e:
+            logger.error(f"Point-in-time restore failed: {str(e)}")
+            raise
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
 
     def restore_backup(self, backup_path: str) -> bool:
         """Restore database from backup"""
@@ -51,15 +420,16 @@ class BackupManager:
             if not os.path.exists(backup_path):
                 raise FileNotFoundError(f"Backup file not found: {backup_path}")
             
-            # Verify backup integrity
-            self._verify_backup(backup_path)
+            # Verify backup integrity, unless the verifier already has
+            if not self._is_verified(backup_path) and not self._verify_backup(backup_path):
+                raise ValueError(f"Backup failed verification: {backup_path}")
             
             # Create backup of current database
             current_backup = self.create_backup()
             logger.info(f"Created backup of current database: {current_backup}")
             
             # Restore from backup
-            shutil.copy2(backup_path, self.db_path)
+            self._swap_in(backup_path)
             
             logger.info(f"Restored database from backup: {backup_path}")
             return True
@@ -67,6 +437,29 @@ class BackupManager:
             logger.error(f"Restore failed: {str(e)}")
             raise
 
+    def _swap_in(self, backup_path: str) -> None:
+        """Replace the live database contents with the backup in one transaction"""
+        if self.write_lock is not None and not self.write_lock.acquire(timeout=RESTORE_LOCK_TIMEOUT):
+            raise TimeoutError("Timed out waiting for in-flight writes before restore")
+        try:
+            source = sqlite3.connect(backup_path)
+            target = sqlite3.connect(self.db_path, timeout=RESTORE_LOCK_TIMEOUT)
+            # Leave the checkpoint to the app (or the WAL archiver, which
+            # must see these pages before they are checkpointed)
+            target.execute("PRAGMA wal_autocheckpoint=0")
+            try:
+                # pages=-1 copies everything in a single step: readers see either
+                # the old database or the restored one, never a mix
+                source.backup(target, pages=-1)
+            finally:
+                target.close()
+                source.close()
+            if self.after_restore is not None:
+                self.after_restore()
+        finally:
+            if self.write_lock is not None:
+                self.write_lock.release()
+
     def _verify_backup(self, backup_path: str) -> bool:
         """Verify backup integrity"""
         try:
@@ -79,43 +472,102 @@ class BackupManager:
             if not os.path.exists(meta_path):
                 return False
             
-            # Verify database integrity
-            conn = sqlite3.connect(backup_path)
-            cursor = conn.cursor()
-            
-            # Check if database is valid
-            cursor.execute("PRAGMA integrity_check")
-            result = cursor.fetchone()
-            
-            conn.close()
-            
-            if result[0] != "ok":
-                return False
-            
-            return True
+            return self._check_integrity(backup_path)
         except Exception as e:
             logger.error(f"Backup verification failed: {str(e)}")
             return False
 
+    def _check_integrity(self, db_path: str, quick: bool = False) -> bool:
+        """Run PRAGMA integrity_check (or the cheaper quick_check) on a database file"""
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                result = conn.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check").fetchone()
+            finally:
+                conn.close()
+            return result[0] == "ok"
+        except sqlite3.Error as e:
+            logger.error(f"Integrity check failed: {str(e)}")
+            return False
+
+    def _is_verified(self, backup_id: str) -> bool:
+        entry = self.catalogue.get(backup_id)
+        if entry is None or entry["status"] != VERIFIED:
+            return False
+        # A full backup that changed size since it was verified is not the same file
+        return entry["kind"] != "full" or (
+            os.path.exists(backup_id) and os.path.getsize(backup_id) == entry["size"]
+        )
+
+    def verify_entry(self, entry: dict) -> bool:
+        """Check a catalogue entry's checksum and run quick_check; records the result"""
+        error = None
+        try:
+            if entry["kind"] == "full":
+                if not os.path.exists(entry["id"]):
+                    error = "backup file missing"
+                elif checksum_file(entry["id"]) != entry["checksum"]:
+                    error = "checksum mismatch"
+                elif not self._check_integrity(entry["id"], quick=True):
+                    error = "quick_check failed"
+            else:
+                error = self._verify_snapshot(entry)
+        except Exception as e:
+            error = str(e)
+        if error:
+            logger.error(f"Backup {entry['id']} failed verification: {error}")
+        self.catalogue.mark(entry["id"], FAILED if error else VERIFIED, error)
+        return error is None
+
+    def _verify_snapshot(self, entry: dict) -> Optional[str]:
+        manifest = self.chunk_store.get_manifest(entry["id"])
+        if manifest is None:
+            return "manifest missing"
+        if ChunkStore.checksum(manifest) != entry["checksum"]:
+            return "checksum mismatch"
+        staging_path = os.path.join(self.backup_dir, f"verify_{entry['id']}.partial")
+        try:
+            # Raises on a missing or corrupt chunk
+            self.chunk_store.restore_file(entry["id"], staging_path)
+            if not self._check_integrity(staging_path, quick=True):
+                return "quick_check failed"
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+        return None
+
+    def rebuild_catalogue(self) -> int:
+        """Index existing .meta files and snapshot manifests; returns the number added"""
+        added = 0
+        for file in os.listdir(self.backup_dir):
+            backup_path = os.path.join(self.backup_dir, file)
+            meta_path = f"{backup_path}.meta"
+            if not file.endswith(".db") or not os.path.exists(meta_path):
+                continue
+            with open(meta_path, "r") as f:
+                metadata = json.load(f)
+            self.catalogue.add(backup_path, "full", metadata["timestamp"], metadata["size"],
+                               checksum_file(backup_path))
+            added += 1
+        for snapshot_id in self.chunk_store.snapshot_ids():
+            manifest = self.chunk_store.get_manifest(snapshot_id)
+            if manifest is not None:
+                self.catalogue.add(snapshot_id, "incremental", manifest["timestamp"], manifest["size"],
+                                   ChunkStore.checksum(manifest))
+                added += 1
+        if added:
+            logger.info(f"Indexed {added} existing backups in the catalogue")
+        return added
+
     def list_backups(self) -> list:
         """List all available backups"""
         try:
-            backups = []
-            for file in os.listdir(self.backup_dir):
-                if file.endswith(".db"):
-                    backup_path = os.path.join(self.backup_dir, file)
-                    meta_path = f"{backup_path}.meta"
-                    
-                    if os.path.exists(meta_path):
-                        with open(meta_path, "r") as f:
-                            metadata = json.load(f)
-                            backups.append({
-                                "path": backup_path,
-                                "timestamp": metadata["timestamp"],
-                                "size": metadata["size"]
-                            })
-            
-            return sorted(backups, key=lambda x: x["timestamp"], reverse=True)
+            return [{
+                "path": entry["id"],
+                "timestamp": entry["timestamp"],
+                "size": entry["size"],
+                "status": entry["status"],
+            } for entry in self.catalogue.entries("full")]
         except Exception as e:
             logger.error(f"Failed to list backups: {str(e)}")
             return []
@@ -129,10 +581,12 @@ class BackupManager:
             
             # Remove oldest backups
             for backup in backups[max_backups:]:
-                os.remove(backup["path"])
+                if os.path.exists(backup["path"]):
+                    os.remove(backup["path"])
                 meta_path = f"{backup['path']}.meta"
                 if os.path.exists(meta_path):
                     os.remove(meta_path)
+                self.catalogue.remove(backup["path"])
                 
                 logger.info(f"Removed old backup: {backup['path']}")
         except Exception as e:
@@ -156,8 +610,30 @@ class BackupManager:
                 "path": backup_path,
                 "timestamp": metadata["timestamp"],
                 "size": metadata["size"],
-                "original_path": metadata["original_path"]
+                "original_path": metadata["original_path"],
+                "status": (self.catalogue.get(backup_path) or {}).get("status")
             }
         except Exception as e:
             logger.error(f"Failed to get backup info: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+
+def create_backup_manager(backup_dir: str = BACKUP_DIR, archiver: Optional[WalArchiver] = None) -> BackupManager:
+    """BackupManager wired to the application's database, engines and write lock.
+
+    Pass the app's running ``archiver``, if any; otherwise one is created
+    when ``WAL_ARCHIVE_DIR`` is set.
+    """
+    from app.core.cache import cache
+    from app.db.database import engine, write_lock
+
+    if archiver is None and WAL_ARCHIVE_DIR:
+        archiver = WalArchiver(engine.url.database, WAL_ARCHIVE_DIR, engine=engine, write_lock=write_lock)
+    return BackupManager(
+        engine.url.database,
+        backup_dir,
+        write_lock=write_lock,
+        # Cached reads describe the pre-restore database
+        after_restore=cache.clear,
+        archiver=archiver,
+    )
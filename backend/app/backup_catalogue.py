@@ -0,0 +1,193 @@
+"""Index of backups and background verification.
+
+Every full backup and incremental snapshot gets a row in a small SQLite
+catalogue next to the backups, with its size, checksum and last
+verification result. Listing backups is one query instead of a directory
+scan plus a JSON parse per file, and restores can skip the integrity check
+for a backup the verifier has already passed.
+
+``BackupVerifier`` re-checks backups on a schedule in a worker pool:
+checksum first, then ``PRAGMA quick_check`` on the database it holds.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds between verifier runs, and how old a passing verification may get
+# before the backup is checked again (SD cards rot)
+BACKUP_VERIFY_INTERVAL = float(os.getenv("BACKUP_VERIFY_INTERVAL", "3600"))
+BACKUP_REVERIFY_AGE = float(os.getenv("BACKUP_REVERIFY_AGE", str(7 * 24 * 3600)))
+BACKUP_VERIFY_WORKERS = int(os.getenv("BACKUP_VERIFY_WORKERS", "2"))
+
+UNVERIFIED = "unverified"
+VERIFIED = "ok"
+FAILED = "failed"
+
+CATALOGUE_COLUMNS = ("id", "kind", "timestamp", "size", "checksum", "status", "verified_at", "error")
+
+
+def checksum_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BackupCatalogue:
+    """SQLite table of backups: one row per full backup (keyed by path) or snapshot (keyed by id)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.created = not os.path.exists(path)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS backups ("
+                    "id TEXT PRIMARY KEY, kind TEXT NOT NULL, timestamp TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "checksum TEXT, status TEXT NOT NULL DEFAULT 'unverified', verified_at REAL, error TEXT)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_backups_kind_timestamp ON backups (kind, timestamp)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _row(row) -> dict:
+        return dict(zip(CATALOGUE_COLUMNS, row))
+
+    def add(self, backup_id: str, kind: str, timestamp: str, size: int, checksum: Optional[str]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO backups (id, kind, timestamp, size, checksum, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (backup_id, kind, timestamp, size, checksum, UNVERIFIED),
+                )
+        finally:
+            conn.close()
+
+    def remove(self, backup_id: str) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM backups WHERE id = ?", (backup_id,))
+        finally:
+            conn.close()
+
+    def get(self, backup_id: str) -> Optional[dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(CATALOGUE_COLUMNS)} FROM backups WHERE id = ?", (backup_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return self._row(row) if row else None
+
+    def entries(self, kind: Optional[str] = None) -> List[dict]:
+        """Catalogue rows, newest first"""
+        query = f"SELECT {', '.join(CATALOGUE_COLUMNS)} FROM backups"
+        params: tuple = ()
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + " ORDER BY timestamp DESC", params).fetchall()
+        finally:
+            conn.close()
+        return [self._row(row) for row in rows]
+
+    def due_for_verification(self, max_age: float = BACKUP_REVERIFY_AGE) -> List[dict]:
+        """Unverified backups, and passing ones last verified more than ``max_age`` seconds ago"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join(CATALOGUE_COLUMNS)} FROM backups "
+                "WHERE status = ? OR (status = ? AND verified_at < ?) ORDER BY timestamp DESC",
+                (UNVERIFIED, VERIFIED, time.time() - max_age),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [self._row(row) for row in rows]
+
+    def mark(self, backup_id: str, status: str, error: Optional[str] = None) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE backups SET status = ?, verified_at = ?, error = ? WHERE id = ?",
+                    (status, time.time(), error, backup_id),
+                )
+        finally:
+            conn.close()
+
+    def summary(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM backups GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+
+class BackupVerifier:
+    """Periodically verifies due catalogue entries in a worker pool"""
+
+    def __init__(self, manager, workers: int = BACKUP_VERIFY_WORKERS, interval: float = BACKUP_VERIFY_INTERVAL,
+                 max_age: float = BACKUP_REVERIFY_AGE):
+        self.manager = manager
+        self.workers = workers
+        self.interval = interval
+        self.max_age = max_age
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def verify_due(self) -> Dict[str, int]:
+        """Verify every due backup once; returns counts of passed and failed"""
+        due = self.manager.catalogue.due_for_verification(self.max_age)
+        if not due:
+            return {"verified": 0, "failed": 0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="solarmed-verify") as pool:
+            results = list(pool.map(self.manager.verify_entry, due))
+        counts = {"verified": results.count(True), "failed": results.count(False)}
+        logger.info(
+            f"Verified {len(due)} backups in {time.perf_counter() - start:.1f}s: "
+            f"{counts['verified']} ok, {counts['failed']} failed"
+        )
+        return counts
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.verify_due()
+            except Exception as e:
+                logger.error(f"Backup verification run failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="solarmed-backup-verifier", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
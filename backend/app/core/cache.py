@@ -0,0 +1,342 @@
+"""In-process response cache.
+
+A size-bounded LRU with per-key TTL and tag-based invalidation, shared by
+all requests in the worker. ``get_or_set`` lets only one thread run the
+loader for a missing key while concurrent callers wait for its result, so
+an expired hot key doesn't send every request to SQLite at once.
+
+Entries are tagged with the tables they were read from. Committed sessions
+invalidate the tags of every table they wrote (see ``invalidate_on_commit``),
+and each tag carries a version so a load that raced with a write is not
+stored.
+
+With ``CACHE_PERSIST_PATH`` set, live entries are saved to a small SQLite
+file on shutdown and loaded on startup so the cache starts warm.
+
+Each worker process has its own cache. In multi-worker mode tag versions
+are also kept in a shared file (``SharedTagVersions``), so a write committed
+by one worker drops the matching entries in every other worker too.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+import logging
+
+from sqlalchemy import event
+
+from app.core.workers import FileLock, shared_path
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "300"))
+CACHE_PERSIST_PATH = os.getenv("CACHE_PERSIST_PATH", "")
+
+MISSING = object()
+
+_COUNTER = struct.Struct("<Q")
+
+
+class SharedTagVersions:
+    """Tag invalidation counters in an mmap'd file shared by worker processes.
+
+    Slot 0 is an epoch bumped by every invalidation; the other slots count
+    invalidations per tag, indexed by a stable hash of the tag (tags that
+    collide just invalidate each other). Readers check the epoch, a single
+    8-byte read, and only look at tag slots when it has moved. Writers take
+    a file lock so concurrent bumps aren't lost.
+    """
+
+    def __init__(self, path: str, slots: int = 1024):
+        self.path = path
+        self.slots = slots
+        self._lock = FileLock(path + ".lock")
+        size = (slots + 1) * _COUNTER.size
+        with open(path, "a+b") as f:
+            if os.path.getsize(path) < size:
+                f.truncate(size)
+            self._map = mmap.mmap(f.fileno(), size)
+
+    def _offset(self, tag: str) -> int:
+        return (1 + zlib.crc32(tag.encode("utf-8")) % self.slots) * _COUNTER.size
+
+    def epoch(self) -> int:
+        return _COUNTER.unpack_from(self._map, 0)[0]
+
+    def version(self, tag: str) -> int:
+        return _COUNTER.unpack_from(self._map, self._offset(tag))[0]
+
+    def bump(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Count an invalidation of ``tags``; returns their new versions"""
+        versions = {}
+        with self._lock:
+            for tag in tags:
+                offset = self._offset(tag)
+                versions[tag] = _COUNTER.unpack_from(self._map, offset)[0] + 1
+                _COUNTER.pack_into(self._map, offset, versions[tag])
+            _COUNTER.pack_into(self._map, 0, self.epoch() + 1)
+        return versions
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with TTLs, tags and single-flight loading"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, default_ttl: float = CACHE_DEFAULT_TTL,
+                 persist_path: Optional[str] = CACHE_PERSIST_PATH or None,
+                 shared_versions: Optional[SharedTagVersions] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.persist_path = persist_path
+        self.shared_versions = shared_versions
+        # Shared epoch and per-tag versions this process has already applied
+        self._shared_epoch = shared_versions.epoch() if shared_versions else 0
+        self._shared_seen: Dict[str, int] = {}
+        # key -> (value, expires_at, tags)
+        self._entries: "OrderedDict[str, Tuple[Any, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tag_keys: Dict[str, Set[str]] = {}
+        self._tag_versions: Dict[str, int] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        with self._lock:
+            if self.shared_versions is not None:
+                self._sync_shared()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()) -> None:
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        tags = tuple(tags)
+        with self._lock:
+            self._store(key, value, expires_at, tags)
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None,
+                   tags: Iterable[str] = ()) -> Any:
+        """Return the cached value, running ``loader`` once across threads on a miss"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        tags = tuple(tags)
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                # Another thread may have loaded it while we waited
+                value = self.get(key)
+                if value is not MISSING:
+                    return value
+                with self._lock:
+                    if self.shared_versions is not None:
+                        self._sync_shared()
+                        for tag in tags:
+                            # Watch the tag from here on, so a write elsewhere during the load counts
+                            self._shared_seen.setdefault(tag, self.shared_versions.version(tag))
+                    versions = [self._tag_versions.get(tag, 0) for tag in tags]
+                value = loader()
+                expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+                with self._lock:
+                    if self.shared_versions is not None:
+                        self._sync_shared()
+                    # Skip the store if a write invalidated one of our tags mid-load
+                    if versions == [self._tag_versions.get(tag, 0) for tag in tags]:
+                        self._store(key, value, expires_at, tags)
+                return value
+        finally:
+            with self._lock:
+                if self._loading.get(key) is lock:
+                    del self._loading[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Drop every entry carrying any of ``tags`` (in every worker); returns the number removed here"""
+        removed = 0
+        shared = self.shared_versions.bump(tags) if self.shared_versions is not None else {}
+        with self._lock:
+            self._shared_seen.update(shared)
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+                for key in list(self._tag_keys.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tag_keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "persist_path": self.persist_path,
+            "shared": self.shared_versions is not None,
+        }
+
+    # Internal helpers; callers hold self._lock
+
+    def _sync_shared(self) -> None:
+        """Apply invalidations made by other workers since the last call"""
+        epoch = self.shared_versions.epoch()
+        if epoch == self._shared_epoch:
+            return
+        self._shared_epoch = epoch
+        for tag, seen in list(self._shared_seen.items()):
+            version = self.shared_versions.version(tag)
+            if version != seen:
+                self._shared_seen[tag] = version
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+                for key in list(self._tag_keys.get(tag, ())):
+                    self._remove(key)
+
+    def _store(self, key: str, value: Any, expires_at: float, tags: Tuple[str, ...]) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at, tags)
+        for tag in tags:
+            self._tag_keys.setdefault(tag, set()).add(key)
+            if self.shared_versions is not None and tag not in self._shared_seen:
+                self._shared_seen[tag] = self.shared_versions.version(tag)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    # Persistence
+
+    def save(self, path: Optional[str] = None) -> int:
+        """Write unexpired entries to a SQLite file; returns the number saved"""
+        path = path or self.persist_path
+        if not path:
+            return 0
+        now_monotonic, now_wall = time.monotonic(), time.time()
+        with self._lock:
+            entries = [(key, value, expires_at - now_monotonic + now_wall, tags)
+                       for key, (value, expires_at, tags) in self._entries.items()
+                       if expires_at > now_monotonic]
+
+        rows = []
+        for key, value, expires_at, tags in entries:
+            try:
+                rows.append((key, pickle.dumps(value), expires_at, ",".join(tags)))
+            except Exception:
+                continue
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                conn.execute("DROP TABLE IF EXISTS cache_entries")
+                conn.execute(
+                    "CREATE TABLE cache_entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL, tags TEXT)"
+                )
+                conn.executemany("INSERT INTO cache_entries VALUES (?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+        logger.info(f"Saved {len(rows)} cache entries to {path}")
+        return len(rows)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Load unexpired entries saved by ``save``; returns the number loaded"""
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return 0
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(
+                "SELECT key, value, expires_at, tags FROM cache_entries WHERE expires_at > ?", (time.time(),)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Ignoring unreadable cache file {path}: {str(e)}")
+            return 0
+        finally:
+            conn.close()
+
+        loaded = 0
+        now_monotonic, now_wall = time.monotonic(), time.time()
+        with self._lock:
+            for key, blob, expires_at, tags in rows:
+                try:
+                    value = pickle.loads(blob)
+                except Exception:
+                    continue
+                tag_tuple = tuple(tag for tag in tags.split(",") if tag)
+                self._store(key, value, expires_at - now_wall + now_monotonic, tag_tuple)
+                loaded += 1
+        logger.info(f"Loaded {loaded} cache entries from {path}")
+        return loaded
+
+
+def invalidate_on_commit(session_factory, target_cache: "MemoryCache") -> None:
+    """Invalidate the cache tags of every table a session writes, once it commits.
+
+    Table names double as tags, so ``tags=("patients",)`` on a cached read is
+    enough for it to be dropped by any committed patient write.
+    """
+
+    @event.listens_for(session_factory, "after_flush")
+    def _collect_tables(session, flush_context):
+        tables = session.info.setdefault("cache_tables", set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, "__tablename__", None)
+            if table is not None:
+                tables.add(table)
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _collect_bulk_tables(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None:
+                orm_execute_state.session.info.setdefault("cache_tables", set()).add(mapper.local_table.name)
+
+    @event.listens_for(session_factory, "after_commit")
+    def _invalidate(session):
+        tables = session.info.pop("cache_tables", None)
+        if tables:
+            target_cache.invalidate_tags(*tables)
+
+    @event.listens_for(session_factory, "after_soft_rollback")
+    def _discard(session, previous_transaction):
+        session.info.pop("cache_tables", None)
+
+
+_shared_tags_path = shared_path("cache_tags")
+cache = MemoryCache(shared_versions=SharedTagVersions(_shared_tags_path) if _shared_tags_path else None)
@@ -0,0 +1,88 @@
+"""Deferred imports for the ML stack.
+
+torch, transformers, pandas and scikit-learn take seconds to import on a
+Raspberry Pi. Importing them at module level would keep the API down that
+long after every power cut. ``lazy_module`` returns a placeholder that
+imports the real module on first attribute access. ``start_warm_up``
+imports a configured list in a worker thread shortly after startup, so the
+first diagnosis doesn't pay for it either. Neither blocks serving requests.
+"""
+from types import ModuleType
+from typing import Any, Iterable, List, Optional
+import asyncio
+import importlib
+import os
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modules the API must never import at startup (checked by tests/test_startup.py)
+HEAVY_MODULES = ("torch", "transformers", "pandas", "sklearn", "numpy", "PIL")
+# Comma-separated modules imported in the background after startup, e.g. "numpy,torch"
+ML_WARMUP_MODULES = tuple(
+    name.strip() for name in os.getenv("ML_WARMUP_MODULES", "").split(",") if name.strip()
+)
+# Seconds to wait after startup before warming up, so early requests get the CPU
+ML_WARMUP_DELAY = float(os.getenv("ML_WARMUP_DELAY", "5"))
+
+
+class LazyModule(ModuleType):
+    """Module placeholder that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    self._module = importlib.import_module(self.__name__)
+                    logger.info(f"Imported {self.__name__} in {time.perf_counter() - start:.2f}s")
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+
+def lazy_module(name: str) -> LazyModule:
+    """Return a placeholder for ``name``; nothing is imported until it's used"""
+    return LazyModule(name)
+
+
+def loaded_heavy_modules() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def _import_all(modules: Iterable[str]) -> None:
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Warm-up import of {name} failed: {str(e)}")
+            continue
+        logger.info(f"Warmed up {name} in {time.perf_counter() - start:.2f}s")
+
+
+def start_warm_up(modules: Iterable[str] = ML_WARMUP_MODULES,
+                  delay: float = ML_WARMUP_DELAY) -> Optional[asyncio.Task]:
+    """Import ``modules`` in a worker thread ``delay`` seconds from now"""
+    modules = tuple(modules)
+    if not modules:
+        return None
+
+    async def warm_up():
+        await asyncio.sleep(delay)
+        await asyncio.get_running_loop().run_in_executor(None, _import_all, modules)
+
+    return asyncio.get_running_loop().create_task(warm_up())
@@ -0,0 +1,233 @@
+"""Non-blocking logging setup.
+
+Log calls made on the event loop only put the record on a bounded queue
+(``QueueHandler``). A single listener thread drains whatever has queued up
+and writes it as one batch, so the disk sees one write per batch instead of
+one per record. The log file rotates by size or age and rotated files are
+gzip-compressed on the listener thread, which keeps SD-card usage bounded.
+
+Rotation renames the file, so two processes must never share one. In
+multi-worker mode each worker claims a numbered slot for life (a lock file
+in ``SHARED_STATE_DIR``) and logs to ``app.log``, ``app.1.log``,
+``app.2.log`` and so on; a restarted worker reuses a free slot, so the
+number of log files stays bounded by the worker count.
+"""
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+import gzip
+import logging
+import os
+import queue
+import shutil
+import sys
+import time
+
+from app.core.workers import FileLock, shared_path
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_HOURS = float(os.getenv("LOG_ROTATE_HOURS", "24"))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of successful (< 400) requests written to the request log
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1.0"))
+# Upper bound on records written per batch
+LOG_BATCH_SIZE = 500
+# After the first record of a batch the listener waits this long for more, so
+# under load it wakes (and takes the GIL) once per batch rather than per record
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.05"))
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotate when the file exceeds ``max_bytes`` or is older than ``interval`` seconds.
+
+    Rotated files are named ``app.log.1.gz`` ... ``app.log.N.gz``.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, interval: float = LOG_ROTATE_HOURS * 3600,
+                 backup_count: int = LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = _gzip_rotator
+        self.interval = interval
+        self.rollover_at = self._next_rollover()
+
+    def _next_rollover(self) -> float:
+        return time.time() + self.interval if self.interval else float("inf")
+
+    def should_rotate(self, pending_bytes: int) -> bool:
+        try:
+            size = os.path.getsize(self.baseFilename)
+        except OSError:
+            size = 0
+        if size == 0:
+            # Nothing to rotate yet; an idle period doesn't produce empty archives
+            if time.time() >= self.rollover_at:
+                self.rollover_at = self._next_rollover()
+            return False
+        if time.time() >= self.rollover_at:
+            return True
+        return self.maxBytes > 0 and size + pending_bytes > self.maxBytes
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover()
+
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        """Write several records with a single write and flush"""
+        try:
+            text = "".join(self.format(record) + self.terminator for record in records)
+        except Exception:
+            for record in records:
+                self.handleError(record)
+            return
+        self.acquire()
+        try:
+            if self.should_rotate(len(text.encode("utf-8"))):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(text)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of raising when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that hands handlers everything already queued in one batch"""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def _monitor(self):
+        q = self.queue
+        stopping = False
+        while not stopping:
+            record = self.dequeue(True)
+            if record is self._sentinel:
+                break
+            batch = [record]
+            if self.flush_interval:
+                time.sleep(self.flush_interval)
+            while len(batch) < self.batch_size:
+                try:
+                    record = q.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+            self.handle_batch(batch)
+
+    def handle_batch(self, records: List[logging.LogRecord]) -> None:
+        records = [self.prepare(record) for record in records]
+        for handler in self.handlers:
+            accepted = [record for record in records if record.levelno >= handler.level]
+            if not accepted:
+                continue
+            if isinstance(handler, CompressingRotatingFileHandler):
+                handler.emit_batch(accepted)
+            else:
+                for record in accepted:
+                    handler.handle(record)
+
+
+_listener: Optional[BatchingQueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_log_slot: Optional[int] = None
+_log_slot_lock: Optional[FileLock] = None
+
+
+def worker_log_file(log_file: str) -> str:
+    """``log_file`` for this process: the file of its worker slot in multi-worker mode"""
+    global _log_slot, _log_slot_lock
+    if shared_path("log.0.lock") is None:
+        return log_file
+    if _log_slot is None:
+        slot = 0
+        while True:
+            lock = FileLock(shared_path(f"log.{slot}.lock"))
+            if lock.acquire(blocking=False):
+                break
+            slot += 1
+        # Held until the process exits
+        _log_slot, _log_slot_lock = slot, lock
+    if _log_slot == 0:
+        return log_file
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{_log_slot}{ext}"
+
+
+def configure_logging(log_file: Optional[str] = LOG_FILE, level: str = LOG_LEVEL,
+                      console: bool = True) -> BatchingQueueListener:
+    """Route the root logger through a queue to the file and console handlers"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = []
+    if log_file:
+        file_handler = CompressingRotatingFileHandler(worker_log_file(log_file))
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = BatchingQueueListener(log_queue, *handlers)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the listener thread and detach the queue from the root logger"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    # Nothing drains the queue once the listener stops, so later records
+    # fall through to logging's last-resort stderr handler instead
+    logging.getLogger().removeHandler(_queue_handler)
+    _queue_handler = None
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
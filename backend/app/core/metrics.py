@@ -0,0 +1,347 @@
+"""In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms live in a flat table of float slots keyed by
+metric name and labels. In a single process the table is a plain bytearray;
+when ``METRICS_DIR`` is set every worker process backs its table with its own
+mmap'd file in that directory and ``render`` merges all files, so the numbers
+are correct whichever worker answers ``/metrics``. Each file has exactly one
+writer, so no cross-process locking is needed; within a process one short
+lock guards slot allocation and updates. A worker removes its file when it
+exits, and files of workers that died without exiting cleanly are removed
+the next time metrics are collected.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import atexit
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import logging
+
+from app.core.workers import SHARED_STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Per-worker metrics files; multi-worker mode keeps them in the shared state directory
+METRICS_DIR = os.getenv("METRICS_DIR") or (os.path.join(SHARED_STATE_DIR, "metrics") if SHARED_STATE_DIR else None)
+
+# Request latency buckets in seconds, tuned for a Pi serving a handful of tablets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HEADER = struct.Struct("<Q")  # bytes used
+_KEY_LEN = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_INITIAL_SIZE = 64 * 1024
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class _SlotTable:
+    """Append-only table of (key, float) slots in a bytearray or mmap'd file.
+
+    Layout: an 8-byte used-size header, then entries of
+    ``[u32 key length][key bytes padded to 8][f64 value]``.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._positions: Dict[str, int] = {}
+        self._file = None
+        if path is None:
+            self._buf = bytearray(_INITIAL_SIZE)
+        else:
+            # Any existing file was left by an earlier process with the same pid
+            self._file = open(path, "w+b")
+            self._file.truncate(_INITIAL_SIZE)
+            self._buf = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.size
+
+    @property
+    def _used(self) -> int:
+        return _HEADER.unpack_from(self._buf, 0)[0]
+
+    @_used.setter
+    def _used(self, value: int) -> None:
+        _HEADER.pack_into(self._buf, 0, value)
+
+    @staticmethod
+    def _entries(buf) -> Iterable[Tuple[str, int]]:
+        used = _HEADER.unpack_from(buf, 0)[0]
+        pos = _HEADER.size
+        while pos < used:
+            key_len = _KEY_LEN.unpack_from(buf, pos)[0]
+            key_start = pos + _KEY_LEN.size
+            key = bytes(buf[key_start:key_start + key_len]).decode("utf-8")
+            value_offset = key_start + _pad8(key_len + _KEY_LEN.size) - _KEY_LEN.size
+            yield key, value_offset
+            pos = value_offset + _VALUE.size
+
+    def _grow(self, needed: int) -> None:
+        size = len(self._buf)
+        while size < needed:
+            size *= 2
+        if self._file is None:
+            self._buf.extend(bytes(size - len(self._buf)))
+        else:
+            self._buf.close()
+            self._file.truncate(size)
+            self._buf = mmap.mmap(self._file.fileno(), 0)
+
+    def offset(self, key: str) -> int:
+        """Offset of a key's value, allocating a zeroed slot on first use"""
+        offset = self._positions.get(key)
+        if offset is not None:
+            return offset
+        encoded = key.encode("utf-8")
+        entry_size = _pad8(_KEY_LEN.size + len(encoded)) + _VALUE.size
+        used = self._used
+        if used + entry_size > len(self._buf):
+            self._grow(used + entry_size)
+        _KEY_LEN.pack_into(self._buf, used, len(encoded))
+        self._buf[used + _KEY_LEN.size:used + _KEY_LEN.size + len(encoded)] = encoded
+        offset = used + entry_size - _VALUE.size
+        _VALUE.pack_into(self._buf, offset, 0.0)
+        self._used = used + entry_size
+        self._positions[key] = offset
+        return offset
+
+    def remove(self) -> None:
+        """Close and delete the backing file"""
+        if self._file is None:
+            return
+        self._buf.close()
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def add(self, offset: int, amount: float) -> None:
+        _VALUE.pack_into(self._buf, offset, _VALUE.unpack_from(self._buf, offset)[0] + amount)
+
+    def set(self, offset: int, value: float) -> None:
+        _VALUE.pack_into(self._buf, offset, value)
+
+    def items(self) -> Dict[str, float]:
+        return {key: _VALUE.unpack_from(self._buf, offset)[0] for key, offset in self._entries(self._buf)}
+
+    @classmethod
+    def read_file(cls, path: str) -> Dict[str, float]:
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            return {}
+        return {key: _VALUE.unpack_from(data, offset)[0] for key, offset in cls._entries(data)}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in Prometheus text format"""
+
+    def __init__(self, directory: Optional[str] = METRICS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        self._callbacks: Dict[str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = {}
+        self._bucket_labels: Dict[str, Tuple[str, ...]] = {}
+        self._keys: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], str] = {}
+        self._table: Optional[_SlotTable] = None
+        self._pid: Optional[int] = None
+
+    def _slots(self) -> _SlotTable:
+        # Re-open per process so forked workers never share a file
+        pid = os.getpid()
+        if self._table is None or self._pid != pid:
+            path = None
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"metrics_{pid}.db")
+            self._table = _SlotTable(path)
+            self._pid = pid
+            if path is not None:
+                atexit.register(self._remove_file, self._table)
+        return self._table
+
+    def _remove_file(self, table: _SlotTable) -> None:
+        # Counters of exited workers would otherwise stay in every merged total
+        with self._lock:
+            if table.path is None or self._pid != os.getpid():
+                return
+            table.remove()
+            self._table = None
+
+    # Declarations
+
+    def counter(self, name: str, help: str) -> None:
+        self._meta[name] = ("counter", help, ())
+
+    def gauge(self, name: str, help: str) -> None:
+        self._meta[name] = ("gauge", help, ())
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        buckets = tuple(sorted(buckets))
+        self._meta[name] = ("histogram", help, buckets)
+        self._bucket_labels[name] = tuple(_format_value(bound) for bound in buckets) + ("+Inf",)
+
+    def gauge_callback(self, name: str, help: str, fn: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+        """Gauge computed at scrape time by the process serving /metrics"""
+        self._meta[name] = ("gauge", help, ())
+        self._callbacks[name] = fn
+
+    # Updates
+
+    @staticmethod
+    def _encode(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+        return json.dumps([name, labels], separators=(",", ":"))
+
+    def _offset(self, slots: _SlotTable, name: str, labels: Tuple[Tuple[str, str], ...]) -> int:
+        # Encoded keys are cached so the hot path is a dict lookup, not json.dumps
+        cache_key = (name, labels)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = self._keys[cache_key] = self._encode(name, labels)
+        return slots.offset(key)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, amount: float = 1.0) -> None:
+        label_items = tuple(sorted(labels.items())) if labels else ()
+        with self._lock:
+            slots = self._slots()
+            slots.add(self._offset(slots, name, label_items), amount)
+
+    def dec(self, name: str, labels: Optional[Dict[str, str]] = None, amount: float = 1.0) -> None:
+        self.inc(name, labels, -amount)
+
+    def set(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 0.0) -> None:
+        label_items = tuple(sorted(labels.items())) if labels else ()
+        with self._lock:
+            slots = self._slots()
+            slots.set(self._offset(slots, name, label_items), value)
+
+    def observe(self, name: str, labels: Optional[Dict[str, str]], value: float) -> None:
+        """Record a histogram observation (bucket counts are stored non-cumulative)"""
+        buckets, bucket_labels = self._meta[name][2], self._bucket_labels[name]
+        index = bisect_left(buckets, value)
+        label_items = tuple(sorted(labels.items())) if labels else ()
+        with self._lock:
+            slots = self._slots()
+            slots.add(self._offset(slots, name + "_bucket", label_items + (("le", bucket_labels[index]),)), 1.0)
+            slots.add(self._offset(slots, name + "_sum", label_items), value)
+            slots.add(self._offset(slots, name + "_count", label_items), 1.0)
+
+    # Exposition
+
+    def _collect(self) -> Dict[str, float]:
+        """Merge values from every worker's table"""
+        if not self.directory:
+            with self._lock:
+                return self._slots().items()
+
+        merged: Dict[str, float] = {}
+        with self._lock:
+            self._slots()  # make sure this process' file exists
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.db")):
+            try:
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".db")])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                # A worker that was killed or crashed never removed its file
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                values = _SlotTable.read_file(path)
+            except OSError:
+                continue
+            for key, value in values.items():
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+    def render(self) -> str:
+        values = self._collect()
+        samples: Dict[str, List[Tuple[List[Tuple[str, str]], float]]] = {}
+        for key, value in values.items():
+            name, labels = json.loads(key)
+            samples.setdefault(name, []).append(([tuple(pair) for pair in labels], value))
+
+        lines: List[str] = []
+        for name, (kind, help, buckets) in sorted(self._meta.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if name in self._callbacks:
+                try:
+                    for labels, value in self._callbacks[name]():
+                        lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+                except Exception as e:
+                    logger.warning(f"Metric callback {name} failed: {str(e)}")
+            elif kind == "histogram":
+                lines.extend(self._render_histogram(name, buckets, samples))
+            else:
+                for labels, value in sorted(samples.get(name, [])):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(name: str, buckets: Tuple[float, ...], samples) -> List[str]:
+        counts: Dict[Tuple, Dict[str, float]] = {}
+        for labels, value in samples.get(name + "_bucket", []):
+            base = tuple(pair for pair in labels if pair[0] != "le")
+            le = dict(labels)["le"]
+            counts.setdefault(base, {})[le] = value
+        sums = {tuple(labels): value for labels, value in samples.get(name + "_sum", [])}
+        totals = {tuple(labels): value for labels, value in samples.get(name + "_count", [])}
+
+        lines = []
+        for base in sorted(totals):
+            cumulative = 0.0
+            per_bucket = counts.get(base, {})
+            for bound in buckets + (float("inf"),):
+                le = _format_value(bound)
+                cumulative += per_bucket.get(le, 0.0)
+                lines.append(f"{name}_bucket{_format_labels(list(base) + [('le', le)])} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(list(base))} {_format_value(sums.get(base, 0.0))}")
+            lines.append(f"{name}_count{_format_labels(list(base))} {_format_value(totals[base])}")
+        return lines
+
+
+registry = MetricsRegistry()
+
+registry.histogram("solarmed_http_request_duration_seconds", "HTTP request latency by route")
+registry.counter("solarmed_http_requests_total", "HTTP requests by route and status code")
+registry.gauge("solarmed_http_requests_in_flight", "HTTP requests currently being served")
+registry.counter("solarmed_http_compression_input_bytes_total", "Response bytes before compression")
+registry.counter("solarmed_http_compression_output_bytes_total", "Compressed response bytes sent")
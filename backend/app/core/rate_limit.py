@@ -0,0 +1,234 @@
+"""Token-bucket rate limiting with bounded memory.
+
+Each (rule, client) pair owns a bucket of ``limit`` tokens that refills
+continuously at ``limit / window`` tokens per second. A request costs one
+token, so checking a request is O(1): refill from the elapsed time, then
+take a token. Buckets live in an ``OrderedDict`` used as an LRU; once
+``max_clients`` buckets exist the least recently seen client is evicted.
+An evicted client simply starts again with a full bucket.
+
+Worker processes each have their own ``TokenBucketLimiter``, which would
+multiply every limit by the number of workers. In multi-worker mode
+``create_limiter`` returns a ``SharedTokenBucketLimiter`` instead, which
+keeps the buckets in a small SQLite file all workers use. Async callers use
+``hit_async``, which runs the shared limiter's SQLite transaction on a
+worker thread so a locked bucket file never stalls the event loop.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.workers import shared_path
+
+RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
+RATE_LIMIT_WINDOW = float(os.getenv("RATE_LIMIT_WINDOW", "60"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+# Per-route overrides: comma-separated "<path prefix>=<requests>/<seconds>"
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "")
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    prefix: str
+    limit: int
+    window: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.window
+
+
+def parse_route_limits(spec: str) -> List[RateLimitRule]:
+    """Parse ``/api/diagnose=20/60,/api/auth=10/60`` into rules"""
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        prefix, _, limit_spec = item.partition("=")
+        limit, _, window = limit_spec.partition("/")
+        if not prefix or not limit:
+            raise ValueError(f"Invalid rate limit rule: {item!r}")
+        rules.append(RateLimitRule(prefix.strip(), int(limit), float(window or RATE_LIMIT_WINDOW)))
+    return rules
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets with per-route limits and LRU eviction"""
+
+    def __init__(
+        self,
+        limit: int = RATE_LIMIT_REQUESTS,
+        window: float = RATE_LIMIT_WINDOW,
+        routes: Optional[Dict[str, Tuple[int, float]]] = None,
+        max_clients: int = RATE_LIMIT_MAX_CLIENTS,
+        clock=time.monotonic,
+    ):
+        self.default_rule = RateLimitRule("", limit, window)
+        if routes is None:
+            rules = parse_route_limits(RATE_LIMIT_ROUTES)
+        else:
+            rules = [RateLimitRule(prefix, limit, window) for prefix, (limit, window) in routes.items()]
+        # Longest prefix wins
+        self.rules = sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def rule_for(self, path: str) -> RateLimitRule:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return self.default_rule
+
+    def hit(self, client: str, path: str = "/") -> Tuple[bool, float]:
+        """Take a token for ``client`` on ``path``.
+
+        Returns ``(allowed, retry_after)`` where ``retry_after`` is the number
+        of seconds until a token is available again (0 when allowed).
+        """
+        rule = self.rule_for(path)
+        key = (rule.prefix, client)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # [tokens, last refill time]
+                bucket = self._buckets[key] = [float(rule.limit), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(rule.limit, bucket[0] + (now - bucket[1]) * rule.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return True, 0.0
+            return False, (1.0 - bucket[0]) / rule.rate
+
+    async def hit_async(self, client: str, path: str = "/") -> Tuple[bool, float]:
+        """``hit`` for the event loop; in-memory buckets are cheap enough to check inline"""
+        return self.hit(client, path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SharedTokenBucketLimiter(TokenBucketLimiter):
+    """Token buckets in a SQLite side store shared by worker processes.
+
+    Each check is one short ``BEGIN IMMEDIATE`` transaction on a WAL file
+    with ``synchronous=OFF`` (losing buckets in a crash only resets limits),
+    typically a few tens of microseconds. A bucket idle for its whole window
+    has refilled completely, the same as having no row, so idle rows are
+    pruned every ``prune_every`` checks and the least recently seen rows
+    are dropped beyond ``max_clients``.
+
+    A check can still wait up to 5 seconds on another worker's transaction,
+    so ``hit_async`` runs it on one of ``threads`` dedicated threads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        limit: int = RATE_LIMIT_REQUESTS,
+        window: float = RATE_LIMIT_WINDOW,
+        routes: Optional[Dict[str, Tuple[int, float]]] = None,
+        max_clients: int = RATE_LIMIT_MAX_CLIENTS,
+        clock=time.time,
+        prune_every: int = 1000,
+        threads: int = 2,
+    ):
+        # Wall-clock time: buckets are compared across processes
+        super().__init__(limit, window, routes=routes, max_clients=max_clients, clock=clock)
+        self.path = path
+        self.prune_every = prune_every
+        self.max_window = max([rule.window for rule in self.rules] + [self.default_rule.window])
+        self._local = threading.local()
+        self._hits = 0
+        self._hits_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="solarmed-rate-limit")
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_updated ON rate_limit_buckets (updated)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+
+    def hit(self, client: str, path: str = "/") -> Tuple[bool, float]:
+        rule = self.rule_for(path)
+        key = f"{rule.prefix}\x00{client}"
+        now = self.clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = float(rule.limit) if row is None else min(rule.limit, row[0] + max(0.0, now - row[1]) * rule.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            conn.execute("INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._hits_lock:
+            self._hits += 1
+            due = self._hits % self.prune_every == 0
+        if due:
+            self.prune()
+        return (True, 0.0) if allowed else (False, (1.0 - tokens) / rule.rate)
+
+    async def hit_async(self, client: str, path: str = "/") -> Tuple[bool, float]:
+        """``hit`` (and the occasional ``prune``) on the limiter's threads"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.hit, client, path)
+
+    def prune(self) -> None:
+        """Drop fully refilled buckets, then the least recently seen ones beyond ``max_clients``"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (self.clock() - self.max_window,))
+            conn.execute(
+                "DELETE FROM rate_limit_buckets WHERE key IN (SELECT key FROM rate_limit_buckets "
+                "ORDER BY updated DESC LIMIT -1 OFFSET ?)", (self.max_clients,)
+            )
+
+    def reset(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rate_limit_buckets")
+
+
+def create_limiter(
+    limit: int = RATE_LIMIT_REQUESTS,
+    window: float = RATE_LIMIT_WINDOW,
+    routes: Optional[Dict[str, Tuple[int, float]]] = None,
+    max_clients: int = RATE_LIMIT_MAX_CLIENTS,
+) -> Union[TokenBucketLimiter, SharedTokenBucketLimiter]:
+    """In-process buckets, or buckets shared by all workers in multi-worker mode"""
+    path = shared_path("rate_limits.db")
+    if path:
+        return SharedTokenBucketLimiter(path, limit, window, routes=routes, max_clients=max_clients)
+    return TokenBucketLimiter(limit, window, routes=routes, max_clients=max_clients)
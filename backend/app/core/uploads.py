@@ -0,0 +1,21 @@
+"""Saving uploaded files without blocking the event loop"""
+from fastapi import UploadFile
+import asyncio
+import os
+import shutil
+
+
+def _copy(upload: UploadFile, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    upload.file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
+
+
+async def save_upload(upload: UploadFile, path: str) -> None:
+    """Copy an upload to ``path``, creating its directory, on a worker thread.
+
+    Streams from the spooled upload, so a large image or recording is never
+    held in memory whole.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, _copy, upload, path)
@@ -0,0 +1,180 @@
+"""Coordination between worker processes.
+
+By default the app runs as a single process and everything here is
+in-process only. With ``SHARED_STATE_DIR`` set (``python -m app.serve
+--workers N`` sets it), worker processes serving the same database share
+state through small files in that directory:
+
+- ``write.lock``: database write transactions are serialized across all
+  workers, not just within one (see ``app.db.storage.serialize_writes``)
+- ``scheduler.lock``: held for life by the one worker that runs background
+  schedulers; the others take it over if that worker dies
+  (``scheduler_lease``)
+- cache tag versions, rate-limit buckets and metrics files (see
+  ``app.core.cache``, ``app.core.rate_limit`` and ``app.core.metrics``)
+- ``log.N.lock``: held for life by the worker writing the N-th log file
+  (see ``app.core.logging_config``)
+
+Locks are ``fcntl.flock`` locks, so the kernel releases them when a worker
+exits or crashes and nothing is left stale.
+"""
+from typing import Callable, List, Optional
+import fcntl
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+# Seconds between attempts by the other workers to take over the scheduler lease
+SCHEDULER_LEASE_RETRY = float(os.getenv("SCHEDULER_LEASE_RETRY", "5"))
+
+
+def shared_path(name: str) -> Optional[str]:
+    """Path of a file in the shared state directory, or None in single-process mode"""
+    if not SHARED_STATE_DIR:
+        return None
+    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+    return os.path.join(SHARED_STATE_DIR, name)
+
+
+class FileLock:
+    """A lock held by one thread across every process that opens the same file.
+
+    Threads of one process queue on a ``threading.Lock``; the holder then
+    takes an exclusive ``flock`` on the file, polling when ``timeout`` is
+    given. Like ``threading.Lock`` it may be released from a different
+    thread than the one that acquired it. The file is re-opened after a
+    fork, since flock locks belong to the open file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+
+    def _file(self) -> int:
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        deadline = None if timeout < 0 else time.monotonic() + timeout
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        fd = self._file()
+        if blocking and deadline is None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return True
+        delay = 0.0005
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    self._lock.release()
+                    return False
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, 0.01)
+
+    def release(self) -> None:
+        fcntl.flock(self._file(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class SchedulerLease:
+    """Decides which worker runs the background schedulers.
+
+    The first worker to call ``acquire`` takes ``scheduler.lock`` and keeps
+    it until it exits; the others get False and skip starting schedulers.
+    uvicorn doesn't replace workers that die, so the others keep retrying
+    the lock every ``retry_interval`` seconds on a background thread; when
+    the scheduler worker dies the kernel frees the lock, one of them takes
+    it and runs the schedulers registered with ``on_takeover``. In
+    single-process mode ``acquire`` always succeeds.
+    """
+
+    def __init__(self, path: Optional[str], retry_interval: float = SCHEDULER_LEASE_RETRY):
+        self.path = path
+        self.retry_interval = retry_interval
+        self._lock = FileLock(path) if path else None
+        self._held: Optional[bool] = None
+        self._takeover_lock = threading.Lock()
+        self._on_takeover: List[Callable[[], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def held(self) -> bool:
+        return bool(self._held)
+
+    def acquire(self) -> bool:
+        if self._held is None:
+            self._held = self._lock is None or self._lock.acquire(blocking=False)
+            if self._lock is not None and self._held:
+                logger.info(f"Worker {os.getpid()} runs the background schedulers")
+            elif self._lock is not None:
+                logger.info(f"Worker {os.getpid()} leaves background schedulers to another worker")
+        return self._held
+
+    def on_takeover(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` once this worker takes the lease over from a worker that died"""
+        with self._takeover_lock:
+            if not self.held:
+                self._on_takeover.append(callback)
+                self._start_watching()
+                return
+        # Taken over between the caller's acquire() and now
+        callback()
+
+    def _start_watching(self) -> None:
+        if self._lock is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="solarmed-scheduler-lease", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.retry_interval):
+            if not self._lock.acquire(blocking=False):
+                continue
+            with self._takeover_lock:
+                self._held = True
+                callbacks, self._on_takeover = self._on_takeover, []
+            logger.warning(f"Worker {os.getpid()} took over the background schedulers")
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Starting a scheduler after takeover failed: {str(e)}")
+            return
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def release(self) -> None:
+        self.stop_watching()
+        if self._held and self._lock is not None:
+            self._lock.release()
+        self._held = None
+
+
+scheduler_lease = SchedulerLease(shared_path("scheduler.lock"))
@@ -1,18 +1,79 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+import asyncio
+import contextvars
 import os
 
+from app.core.cache import cache, invalidate_on_commit
+from .storage import create_writer_engine, create_reader_engine, create_write_lock, serialize_writes
+from .instrumentation import instrument_engine
+
 # SQLite database for local storage
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./solarmed.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Write transactions are serialized (one open writer at a time); reads use a
+# separate read-only pool so they never queue behind a commit
+engine = create_writer_engine(SQLALCHEMY_DATABASE_URL)
+read_engine = create_reader_engine(SQLALCHEMY_DATABASE_URL, engine)
+instrument_engine(engine)
+instrument_engine(read_engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+# Shared by all worker processes when they run in multi-worker mode
+write_lock = serialize_writes(SessionLocal, write_lock=create_write_lock())
+# Committed writes drop cached reads tagged with the tables they touched
+invalidate_on_commit(SessionLocal, cache)
 
 Base = declarative_base()
 
+# Dedicated executor for blocking session work issued from async handlers, so
+# SQLite commits never run on the event loop and don't compete with the
+# threadpool that serves sync routes
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="solarmed-db")
+
+T = TypeVar("T")
+
+
+class AsyncDB:
+    """Async facade over a sync Session that runs all work on the DB executor.
+
+    Calls are awaited one at a time, so the session is only ever used by one
+    thread at once even though consecutive calls may land on different threads.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(session, *args, **kwargs)`` off the event loop"""
+        loop = asyncio.get_running_loop()
+        # Carry the request context (e.g. query stats) onto the executor thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(db_executor, partial(context.run, fn, self.session, *args, **kwargs))
+
+    async def get(self, model, ident) -> Any:
+        return await self.run(lambda session: session.get(model, ident))
+
+    async def save(self, instance: T) -> T:
+        """Add, commit and refresh an instance"""
+        def _save(session: Session) -> T:
+            session.add(instance)
+            session.commit()
+            session.refresh(instance)
+            return instance
+        return await self.run(_save)
+
+    async def commit(self) -> None:
+        await self.run(Session.commit)
+
+    async def close(self) -> None:
+        await self.run(Session.close)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -20,3 +81,19 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get a read-only DB session
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get an async DB facade for async route handlers
+async def get_async_db():
+    db = AsyncDB(SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,153 @@
+"""Per-request SQL statement counts and timings.
+
+Cursor-level engine events record every statement executed while a request
+is in flight. The per-request totals end up in the ``Server-Timing`` header,
+are folded into per-route aggregates, and statements slower than
+``SLOW_QUERY_MS`` are written to the slow-query log. When
+``SQL_INSTRUMENTATION`` is off no listeners are attached at all.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.db.slow_queries")
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Number of slowest statements kept per request and per route
+SLOWEST_KEPT = 3
+# Statements are truncated in logs and stats; parameters are never recorded
+STATEMENT_PREVIEW_CHARS = 200
+
+
+@dataclass
+class RequestQueryStats:
+    request_id: str
+    route: Optional[str] = None
+    count: int = 0
+    total_ms: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if len(self.slowest) < SLOWEST_KEPT or elapsed_ms > self.slowest[-1][0]:
+            self.slowest.append((elapsed_ms, statement[:STATEMENT_PREVIEW_CHARS]))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_ms:.2f};desc="{self.count} queries"'
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def start_request(request_id: str) -> RequestQueryStats:
+    """Begin collecting statements for the current request context"""
+    stats = RequestQueryStats(request_id=request_id)
+    _current.set(stats)
+    return stats
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+class RouteQueryStats:
+    """Aggregated statement counts and DB time per route template"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, stats: RequestQueryStats) -> None:
+        route = stats.route or "unmatched"
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {
+                    "requests": 0,
+                    "queries": 0,
+                    "db_ms": 0.0,
+                    "max_db_ms": 0.0,
+                    "max_queries": 0,
+                    "slowest": [],
+                }
+            entry["requests"] += 1
+            entry["queries"] += stats.count
+            entry["db_ms"] += stats.total_ms
+            entry["max_db_ms"] = max(entry["max_db_ms"], stats.total_ms)
+            entry["max_queries"] = max(entry["max_queries"], stats.count)
+            slowest = entry["slowest"] + stats.slowest
+            slowest.sort(key=lambda item: item[0], reverse=True)
+            entry["slowest"] = slowest[:SLOWEST_KEPT]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            routes = {route: dict(entry) for route, entry in self._routes.items()}
+        for entry in routes.values():
+            requests = entry["requests"] or 1
+            entry["avg_queries"] = entry["queries"] / requests
+            entry["avg_db_ms"] = entry["db_ms"] / requests
+            entry["slowest"] = [{"ms": ms, "statement": statement} for ms, statement in entry["slowest"]]
+        return routes
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+route_query_stats = RouteQueryStats()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_times")
+    if not start_times:
+        return
+    elapsed_ms = (time.perf_counter() - start_times.pop()[1]) * 1000
+
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        request_id = stats.request_id if stats is not None else "-"
+        slow_query_logger.warning(
+            f"Slow query {elapsed_ms:.1f}ms request_id={request_id}: "
+            f"{statement[:STATEMENT_PREVIEW_CHARS]}"
+        )
+
+
+def _handle_error(exception_context):
+    # A failed execute never reaches after_cursor_execute; drop its start time
+    # so the pooled connection's stack doesn't grow with every error
+    conn = exception_context.connection
+    context = exception_context.execution_context
+    if conn is None or context is None:
+        return
+    start_times = conn.info.get("query_start_times")
+    if start_times and start_times[-1][0] is context:
+        start_times.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach timing listeners to an engine when instrumentation is enabled"""
+    if not SQL_INSTRUMENTATION:
+        return
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
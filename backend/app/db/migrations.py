@@ -0,0 +1,172 @@
+"""Versioned schema migrations.
+
+Each step runs once, in order, in its own transaction and is recorded in the
+``schema_migrations`` table. Append new steps to ``MIGRATIONS``; never edit or
+reorder ones that have shipped. Run manually with::
+
+    python -m app.db.migrations
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from typing import Callable, List, Tuple
+from datetime import datetime
+import json
+import logging
+
+from .database import Base
+from . import models  # noqa: F401  (registers tables on Base.metadata)
+from . import surveillance
+
+logger = logging.getLogger(__name__)
+
+_version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String),
+    Column("applied_at", DateTime),
+)
+
+
+def _columns(conn: Connection, table: str) -> set:
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return set()
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def ensure_indexes(conn: Connection) -> None:
+    """Create every index declared on the models that doesn't exist yet"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _create_tables(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+def _reconcile_legacy_schemas(conn: Connection) -> None:
+    """Bring tables created by the old, diverging model sets up to the unified schema"""
+    for table in Base.metadata.sorted_tables:
+        existing = _columns(conn, table.name)
+        if not existing:
+            # Tables added after this step are created by their own step
+            continue
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+    diagnosis_columns = _columns(conn, "diagnoses")
+    if "synced" in diagnosis_columns:
+        conn.execute(text("UPDATE diagnoses SET is_synced = synced WHERE is_synced IS NULL"))
+
+    patient_columns = _columns(conn, "patients")
+    if "name" in patient_columns:
+        conn.execute(text(
+            "UPDATE patients SET "
+            "first_name = CASE WHEN instr(name, ' ') > 0 THEN substr(name, 1, instr(name, ' ') - 1) ELSE name END, "
+            "last_name = CASE WHEN instr(name, ' ') > 0 THEN substr(name, instr(name, ' ') + 1) ELSE '' END "
+            "WHERE first_name IS NULL AND name IS NOT NULL"
+        ))
+    if "location" in patient_columns:
+        conn.execute(text("UPDATE patients SET village = location WHERE village IS NULL"))
+    if "contact" in patient_columns:
+        conn.execute(text("UPDATE patients SET phone_number = contact WHERE phone_number IS NULL"))
+
+    if _columns(conn, "energy_data"):
+        empty = conn.execute(text("SELECT COUNT(*) FROM energy_logs")).scalar() == 0
+        if empty:
+            conn.execute(text(
+                "INSERT INTO energy_logs (battery_level, solar_input, power_consumption, timestamp, synced) "
+                "SELECT battery_level, solar_power, power_usage, timestamp, 0 FROM energy_data"
+            ))
+
+
+def _hot_query_indexes(conn: Connection) -> None:
+    # Indexes on diagnoses.patient_id, is_synced/synced flags,
+    # energy_logs.timestamp and patients.qr_code
+    ensure_indexes(conn)
+
+
+def _surveillance_aggregates(conn: Connection) -> None:
+    models.SurveillanceWeek.__table__.create(conn, checkfirst=True)
+    models.SurveillanceDistrictWeek.__table__.create(conn, checkfirst=True)
+    rows = surveillance.rebuild(conn)
+    logger.info(f"Built surveillance_weekly from existing diagnoses: {rows} rows")
+
+
+def _outbreak_alerts(conn: Connection) -> None:
+    models.OutbreakAlert.__table__.create(conn, checkfirst=True)
+
+
+def _diagnosis_symptom_lists(conn: Connection) -> None:
+    """Store symptoms as JSON lists; the form endpoint used to keep the raw string"""
+    rows = conn.execute(text(
+        "SELECT id, symptoms FROM diagnoses WHERE symptoms IS NULL OR "
+        "CASE WHEN json_valid(symptoms) THEN json_type(symptoms) != 'array' ELSE 1 END"
+    )).all()
+    updates = []
+    for row in rows:
+        try:
+            value = json.loads(row.symptoms) if row.symptoms is not None else None
+        except ValueError:
+            # Written as plain text by the old model sets
+            value = row.symptoms
+        updates.append({"id": row.id, "symptoms": json.dumps(models.split_symptoms(value))})
+    if updates:
+        conn.execute(text("UPDATE diagnoses SET symptoms = :symptoms WHERE id = :id"), updates)
+    logger.info(f"Converted symptoms of {len(updates)} diagnoses to lists")
+
+
+def _canonical_disease_keys(conn: Connection) -> None:
+    """Count predicted conditions under their diagnosis type's name (see models.disease_key)"""
+    for alias, name in models.DISEASE_ALIASES.items():
+        conn.execute(text("UPDATE outbreak_alerts SET disease = :name WHERE disease = :alias"),
+                     {"name": name, "alias": alias})
+    rows = surveillance.rebuild(conn)
+    logger.info(f"Rebuilt surveillance_weekly with canonical disease names: {rows} rows")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create_tables", _create_tables),
+    (2, "reconcile_legacy_schemas", _reconcile_legacy_schemas),
+    (3, "hot_query_indexes", _hot_query_indexes),
+    (4, "surveillance_aggregates", _surveillance_aggregates),
+    (5, "outbreak_alerts", _outbreak_alerts),
+    (6, "diagnosis_symptom_lists", _diagnosis_symptom_lists),
+    (7, "canonical_disease_keys", _canonical_disease_keys),
+]
+
+
+def current_version(engine: Engine) -> int:
+    _version_metadata.create_all(engine)
+    with engine.connect() as conn:
+        versions = conn.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def migrate(engine: Engine) -> int:
+    """Apply pending migrations and return the resulting schema version"""
+    version = current_version(engine)
+    for step_version, name, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=step_version, name=name, applied_at=datetime.utcnow()
+            ))
+        logger.info(f"Applied migration {step_version}: {name}")
+        version = step_version
+    return version
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"Schema version: {migrate(engine)}")
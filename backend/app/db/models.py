@@ -1,24 +1,57 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, JSON, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Date, ForeignKey, Index, Integer, String, DateTime, Float, JSON
+from sqlalchemy.orm import relationship, synonym, validates
 from datetime import datetime
+from typing import Any, List, Optional
+import json
 from .database import Base
 
+# Single source of truth for the database schema. Indexes are declared for
+# every column the API filters or orders on; existing databases pick them up
+# through app.db.migrations and tests/test_query_plans.py guards against regressions.
+
+def split_symptoms(value: Any) -> List[str]:
+    """Symptoms as a list of names.
+
+    Form posts send them as one string, either comma separated or a JSON
+    array; lists pass through.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            try:
+                return split_symptoms(json.loads(text))
+            except ValueError:
+                pass
+        return [symptom.strip() for symptom in text.split(",") if symptom.strip()]
+    return [str(symptom).strip() for symptom in value if str(symptom).strip()]
+
+# Predicted conditions that are also a diagnosis type are counted under the
+# type's name, so a disease is one series whichever way it was recorded
+DISEASE_ALIASES = {"covid19": "covid", "maternal_complication": "maternal"}
+
+def disease_key(diagnosis: Optional[str], diagnosis_type: Optional[str]) -> Optional[str]:
+    """The predicted condition, else the type a health worker filed it under, by its canonical name"""
+    disease = diagnosis if diagnosis is not None else diagnosis_type
+    return DISEASE_ALIASES.get(disease, disease)
+
 class Patient(Base):
     __tablename__ = "patients"
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, index=True)
     last_name = Column(String, index=True)
-    date_of_birth = Column(DateTime)
+    date_of_birth = Column(DateTime, nullable=True)
     gender = Column(String)
     phone_number = Column(String, nullable=True)
     address = Column(String, nullable=True)
-    village = Column(String)
-    district = Column(String)
-    qr_code = Column(String, nullable=True)
+    village = Column(String, nullable=True)
+    district = Column(String, nullable=True)
+    qr_code = Column(String, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    is_synced = Column(Boolean, default=False)
+    is_synced = Column(Boolean, default=False, index=True)
 
     diagnoses = relationship("Diagnosis", back_populates="patient")
 
@@ -26,9 +59,12 @@ class Diagnosis(Base):
     __tablename__ = "diagnoses"
 
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"))
-    diagnosis_type = Column(String)
-    symptoms = Column(JSON)
+    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
+    diagnosis_type = Column(String, nullable=True)
+    # Always a JSON list of symptom names (see split_symptoms)
+    symptoms = Column(JSON, default=list)
+    # Top predicted condition from the diagnose endpoint
+    diagnosis = Column(String, nullable=True)
     notes = Column(String, nullable=True)
     image_path = Column(String, nullable=True)
     voice_path = Column(String, nullable=True)
@@ -37,6 +73,67 @@ class Diagnosis(Base):
     confidence = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    is_synced = Column(Boolean, default=False)
+    is_synced = Column(Boolean, default=False, index=True)
+    # Older endpoints and schemas call the flag "synced"
+    synced = synonym("is_synced")
 
-    patient = relationship("Patient", back_populates="diagnoses") 
\ No newline at end of file
+    patient = relationship("Patient", back_populates="diagnoses")
+
+    @validates("symptoms")
+    def _normalize_symptoms(self, key, value):
+        return split_symptoms(value)
+
+class EnergyLog(Base):
+    __tablename__ = "energy_logs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    battery_level = Column(Float)
+    solar_input = Column(Float)
+    power_consumption = Column(Float)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    synced = Column(Boolean, default=False, index=True)
+
+class SurveillanceWeek(Base):
+    """Diagnoses per disease, district, village and week (maintained by app.db.surveillance)"""
+    __tablename__ = "surveillance_weekly"
+    # Clustered on the key, so a week range is one contiguous range read; a
+    # district's report reads its own range of the district index
+    __table_args__ = (
+        Index("ix_surveillance_weekly_district", "district", "week_start", "disease", "village"),
+        {"sqlite_with_rowid": False},
+    )
+
+    # Monday of the week the diagnosis was made
+    week_start = Column(Date, primary_key=True)
+    # Patient's district and village; "" when not recorded
+    district = Column(String, primary_key=True)
+    disease = Column(String, primary_key=True)
+    village = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class SurveillanceDistrictWeek(Base):
+    """District totals of SurveillanceWeek, so district reports don't sum villages"""
+    __tablename__ = "surveillance_district_weekly"
+    __table_args__ = (
+        Index("ix_surveillance_district_weekly_district", "district", "week_start", "disease"),
+        {"sqlite_with_rowid": False},
+    )
+
+    week_start = Column(Date, primary_key=True)
+    district = Column(String, primary_key=True)
+    disease = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class OutbreakAlert(Base):
+    """A (district, disease) window well above its baseline (raised by app.services.outbreak)"""
+    __tablename__ = "outbreak_alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    district = Column(String, index=True)
+    disease = Column(String, index=True)
+    window_start = Column(DateTime)
+    window_end = Column(DateTime)
+    cases = Column(Integer)
+    expected = Column(Float)
+    z_score = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
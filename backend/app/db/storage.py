@@ -0,0 +1,157 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from typing import Dict, Any, Optional, Union
+import os
+import threading
+import logging
+
+from app.core.workers import FileLock, shared_path
+
+logger = logging.getLogger(__name__)
+
+# Named SQLite storage profiles. "balanced" is the default for clinic boxes:
+# WAL lets readers run while a writer commits, and synchronous=NORMAL only
+# fsyncs at checkpoints, which is still crash-safe in WAL mode.
+STORAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,  # 64MB
+        "cache_size": -8000,  # 8MB (negative values are KiB)
+        "busy_timeout": 5000,  # ms
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -8000,
+        "busy_timeout": 10000,
+    },
+    # SQLite defaults, kept for comparison benchmarks
+    "legacy": {},
+}
+
+STORAGE_PROFILE = os.getenv("SQLITE_STORAGE_PROFILE", "balanced")
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+# Write transactions are serialized (across workers in multi-worker mode); sessions wait up to
+# this many seconds for the writer instead of failing with "database is locked"
+WRITE_LOCK_TIMEOUT = int(os.getenv("DB_WRITE_LOCK_TIMEOUT", "30"))
+
+# Pragmas that only make sense on a connection allowed to write
+_WRITE_ONLY_PRAGMAS = {"journal_mode"}
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_file_database(url: str) -> bool:
+    database = make_url(url).database
+    return bool(database) and database != ":memory:" and not database.startswith("file:")
+
+
+def get_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """Get pragmas for a storage profile"""
+    name = name or STORAGE_PROFILE
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown SQLite storage profile: {name}")
+    return STORAGE_PROFILES[name]
+
+
+def apply_pragmas(engine: Engine, pragmas: Dict[str, Any], read_only: bool = False) -> None:
+    """Apply pragmas to every new DBAPI connection made by the engine"""
+    if read_only:
+        pragmas = {k: v for k, v in pragmas.items() if k not in _WRITE_ONLY_PRAGMAS}
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_writer_engine(url: str, profile: Optional[str] = None) -> Engine:
+    """Create the read-write engine with the storage profile applied"""
+    if not is_sqlite(url):
+        return create_engine(url, pool_pre_ping=True)
+
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    apply_pragmas(engine, get_profile(profile))
+    return engine
+
+
+def create_write_lock() -> Union[threading.Lock, FileLock]:
+    """Lock for write transactions: in-process, or shared by all workers in multi-worker mode.
+
+    SQLite only has one writer either way. Taking it up front means a worker
+    never starts a write transaction it can't upgrade (SQLITE_BUSY with no
+    retry) and waiters queue instead of polling in SQLite's busy handler.
+    """
+    path = shared_path("write.lock")
+    return FileLock(path) if path else threading.Lock()
+
+
+def serialize_writes(session_factory: sessionmaker, timeout: float = WRITE_LOCK_TIMEOUT,
+                     write_lock: Optional[Union[threading.Lock, FileLock]] = None) -> Union[threading.Lock, FileLock]:
+    """Serialize write transactions from sessions made by ``session_factory``.
+
+    The lock is taken on a session's first flush and released when its
+    transaction ends (commit, rollback or close), so only one write transaction is open
+    at a time while reads never wait. Pure reads don't flush and never take
+    it. Bulk ORM DML takes it too. The lock may be released from a different thread than the one that
+    acquired it, which plain ``threading.Lock`` and ``FileLock`` allow.
+    """
+    if write_lock is None:
+        write_lock = threading.Lock()
+
+    def _acquire_writer(session):
+        if session.info.get("holds_write_lock"):
+            return
+        if not write_lock.acquire(timeout=timeout):
+            raise PoolTimeoutError(f"Timed out after {timeout}s waiting for the database writer")
+        session.info["holds_write_lock"] = True
+
+    @event.listens_for(session_factory, "before_flush")
+    def _acquire_for_flush(session, flush_context, instances):
+        _acquire_writer(session)
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _acquire_for_bulk_dml(orm_execute_state):
+        # Bulk query.update()/delete() and insert() statements skip the flush
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            _acquire_writer(orm_execute_state.session)
+
+    @event.listens_for(session_factory, "after_transaction_end")
+    def _release_writer(session, transaction):
+        # Commit, rollback and close all end the root transaction
+        if transaction.parent is None and session.info.pop("holds_write_lock", False):
+            write_lock.release()
+
+    return write_lock
+
+
+def create_reader_engine(url: str, writer: Engine, profile: Optional[str] = None) -> Engine:
+    """Create a read-only engine with its own pool for SQLite files.
+
+    Falls back to the writer engine for in-memory databases and non-SQLite
+    backends, where a separate read-only pool isn't meaningful.
+    """
+    if not is_sqlite(url) or not _is_file_database(url):
+        return writer
+
+    database = make_url(url).database
+    engine = create_engine(
+        f"sqlite:///file:{database}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        pool_size=READ_POOL_SIZE,
+        max_overflow=READ_POOL_SIZE,
+    )
+    apply_pragmas(engine, get_profile(profile), read_only=True)
+    return engine
@@ -0,0 +1,250 @@
+"""Weekly disease surveillance counts, kept in step with diagnosis writes.
+
+``surveillance_weekly`` holds one row per (week, district, disease, village)
+with the number of diagnoses made there that week (the disease is the
+predicted condition, else the diagnosis type, under the canonical name
+from ``models.disease_key``), and
+``surveillance_district_weekly`` the same per district, so reports read
+only the rows they return instead of joining ``diagnoses`` to ``patients``
+over the whole history.
+
+Counts are adjusted in the same transaction as the write, from mapper
+events on the ORM models:
+
+- a diagnosis insert adds one to its row
+- an update that changes the disease, patient or date moves it from the
+  old row to the new one, and a delete removes it
+- a patient moving district or village moves all their diagnoses
+- deleting a patient detaches any diagnoses still pointing at them and
+  moves them to the blank district and village, as a rebuild would
+
+Bulk ``query.update()``/``delete()`` and raw SQL bypass the mapper, so bulk
+loads and repairs finish with a rebuild, which recomputes the table from
+scratch::
+
+    python -m app.db.surveillance
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+import logging
+
+from sqlalchemy import bindparam, event, func, inspect, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from .models import DISEASE_ALIASES, Diagnosis, Patient, SurveillanceDistrictWeek, SurveillanceWeek, disease_key
+
+# Key columns in clustering order
+_KEY = ("week_start", "district", "disease", "village")
+_WATCHED_DIAGNOSIS = ("diagnosis", "diagnosis_type", "patient_id", "created_at")
+_WATCHED_PATIENT = ("district", "village")
+
+# Monday of the diagnosis week in SQL, matching week_start() below
+_SQL_WEEK = "date(d.created_at, '-' || ((strftime('%w', d.created_at) + 6) % 7) || ' days')"
+# The predicted condition, or the type a health worker filed it under,
+# matching disease_key()
+_SQL_DISEASE = (
+    "CASE coalesce(d.diagnosis, d.diagnosis_type) "
+    + "".join(f"WHEN '{alias}' THEN '{name}' " for alias, name in DISEASE_ALIASES.items())
+    + "ELSE coalesce(d.diagnosis, d.diagnosis_type) END"
+)
+
+REBUILD_STATEMENTS = (
+    "DELETE FROM surveillance_weekly",
+    "INSERT INTO surveillance_weekly (week_start, district, disease, village, count) "
+    f"SELECT {_SQL_WEEK}, coalesce(p.district, ''), {_SQL_DISEASE}, coalesce(p.village, ''), count(*) "
+    "FROM diagnoses d LEFT JOIN patients p ON p.id = d.patient_id "
+    f"WHERE {_SQL_DISEASE} IS NOT NULL AND d.created_at IS NOT NULL "
+    "GROUP BY 1, 2, 3, 4",
+    "DELETE FROM surveillance_district_weekly",
+    "INSERT INTO surveillance_district_weekly (week_start, district, disease, count) "
+    "SELECT week_start, district, disease, sum(count) FROM surveillance_weekly GROUP BY 1, 2, 3",
+)
+
+Key = Tuple[date, str, str, str]
+
+
+def week_start(value: datetime) -> date:
+    """Monday of the week containing ``value``"""
+    day = value.date() if isinstance(value, datetime) else value
+    return day - timedelta(days=day.weekday())
+
+
+def _region(connection: Connection, patient_id: Optional[int]) -> Tuple[str, str]:
+    if patient_id is None:
+        return "", ""
+    row = connection.execute(
+        select(Patient.district, Patient.village).where(Patient.id == patient_id)
+    ).first()
+    if row is None:
+        return "", ""
+    return row.district or "", row.village or ""
+
+
+def _key(connection: Connection, patient_id: Optional[int], diagnosis: Optional[str],
+         diagnosis_type: Optional[str], created_at: Optional[datetime]) -> Optional[Key]:
+    disease = disease_key(diagnosis, diagnosis_type)
+    if disease is None or created_at is None:
+        return None
+    district, village = _region(connection, patient_id)
+    return week_start(created_at), district, disease, village
+
+
+def _upsert(connection: Connection, table, key_columns: Tuple[str, ...], deltas: Dict[tuple, int]) -> None:
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    statement = insert(table)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=list(key_columns), set_={"count": table.c.count + statement.excluded.count}
+        ),
+        [dict(zip(key_columns, key), count=delta) for key, delta in deltas.items()],
+    )
+    decreased = [dict(zip(key_columns, key)) for key, delta in deltas.items() if delta < 0]
+    if decreased:
+        connection.execute(
+            table.delete().where(*(table.c[name] == bindparam(name) for name in key_columns), table.c.count <= 0),
+            decreased,
+        )
+
+
+def _apply(connection: Connection, deltas: Dict[Optional[Key], int]) -> None:
+    """Add each delta to its village and district counts; rows that reach zero are removed"""
+    villages: Dict[Key, int] = {}
+    districts: Dict[tuple, int] = {}
+    for key, delta in deltas.items():
+        if key is None:
+            continue
+        villages[key] = villages.get(key, 0) + delta
+        districts[key[:3]] = districts.get(key[:3], 0) + delta
+    _upsert(connection, SurveillanceWeek.__table__, _KEY, villages)
+    _upsert(connection, SurveillanceDistrictWeek.__table__, _KEY[:3], districts)
+
+
+def _changed(target, names) -> bool:
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _stored_key(connection: Connection, diagnosis_id: int) -> Optional[Key]:
+    row = connection.execute(
+        select(Diagnosis.diagnosis, Diagnosis.diagnosis_type, Diagnosis.created_at, Diagnosis.patient_id)
+        .where(Diagnosis.id == diagnosis_id)
+    ).first()
+    if row is None:
+        return None
+    return _key(connection, row.patient_id, row.diagnosis, row.diagnosis_type, row.created_at)
+
+
+def _move_diagnoses(connection: Connection, patient_id: int, old_region: Tuple[str, str],
+                    new_region: Tuple[str, str]) -> None:
+    """Move the counts of a patient's diagnoses from one (district, village) to another"""
+    rows = connection.execute(
+        select(Diagnosis.diagnosis, Diagnosis.diagnosis_type, Diagnosis.created_at)
+        .where(Diagnosis.patient_id == patient_id, Diagnosis.created_at.isnot(None))
+    ).all()
+    moves: Dict[Key, int] = {}
+    for row in rows:
+        disease = disease_key(row.diagnosis, row.diagnosis_type)
+        if disease is None:
+            continue
+        week = week_start(row.created_at)
+        old = (week, old_region[0], disease, old_region[1])
+        new = (week, new_region[0], disease, new_region[1])
+        moves[old] = moves.get(old, 0) - 1
+        moves[new] = moves.get(new, 0) + 1
+    _apply(connection, moves)
+
+
+@event.listens_for(Diagnosis, "after_insert")
+def _count_insert(mapper, connection, target):
+    key = _key(connection, target.patient_id, target.diagnosis, target.diagnosis_type, target.created_at)
+    _apply(connection, {key: 1})
+
+
+@event.listens_for(Diagnosis, "before_update")
+def _move_update(mapper, connection, target):
+    if not _changed(target, _WATCHED_DIAGNOSIS):
+        return
+    # The row still holds the old values until this flush writes it
+    old = _stored_key(connection, target.id)
+    new = _key(connection, target.patient_id, target.diagnosis, target.diagnosis_type, target.created_at)
+    if old != new:
+        _apply(connection, {old: -1, new: 1})
+
+
+@event.listens_for(Diagnosis, "before_delete")
+def _count_delete(mapper, connection, target):
+    _apply(connection, {_stored_key(connection, target.id): -1})
+
+
+@event.listens_for(Patient, "before_update")
+def _move_patient(mapper, connection, target):
+    if not _changed(target, _WATCHED_PATIENT):
+        return
+    old_district, old_village = _region(connection, target.id)
+    state = inspect(target)
+    added = {name: state.attrs[name].history.added for name in _WATCHED_PATIENT}
+    district = (added["district"][0] if added["district"] else old_district) or ""
+    village = (added["village"][0] if added["village"] else old_village) or ""
+    if (district, village) != (old_district, old_village):
+        _move_diagnoses(connection, target.id, (old_district, old_village), (district, village))
+
+
+@event.listens_for(Patient, "before_delete")
+def _orphan_diagnoses(mapper, connection, target):
+    # Usually a no-op, since the ORM detaches a deleted patient's diagnoses
+    # first (and _move_update moves them). Any left pointing at it are
+    # detached here too: SQLite reuses the id of the last row, and a new
+    # patient would otherwise adopt them.
+    region = _region(connection, target.id)
+    if region != ("", ""):
+        _move_diagnoses(connection, target.id, region, ("", ""))
+    connection.execute(
+        update(Diagnosis.__table__).where(Diagnosis.__table__.c.patient_id == target.id).values(patient_id=None)
+    )
+
+
+def rebuild(connection: Connection) -> int:
+    """Recompute every count from diagnoses and patients; returns the number of village rows"""
+    for statement in REBUILD_STATEMENTS:
+        connection.exec_driver_sql(statement)
+    return connection.execute(select(func.count()).select_from(SurveillanceWeek)).scalar()
+
+
+def surveillance_query(start: Optional[date] = None, end: Optional[date] = None,
+                       district: Optional[str] = None, village: Optional[str] = None,
+                       disease: Optional[str] = None, by_village: bool = True) -> Select:
+    """Weekly counts for the weeks overlapping ``start``..``end``, optionally per village"""
+    if by_village:
+        table = SurveillanceWeek
+        statement = select(table.week_start, table.district, table.disease, table.village, table.count)
+    else:
+        table = SurveillanceDistrictWeek
+        statement = select(table.week_start, table.district, table.disease, table.count)
+    if start is not None:
+        statement = statement.where(table.week_start >= week_start(start))
+    if end is not None:
+        statement = statement.where(table.week_start <= end)
+    if district is not None:
+        statement = statement.where(table.district == district)
+    if village is not None:
+        statement = statement.where(table.village == village)
+    if disease is not None:
+        statement = statement.where(table.disease == DISEASE_ALIASES.get(disease, disease))
+    order = [table.week_start, table.district, table.disease] + ([table.village] if by_village else [])
+    return statement.order_by(*order)
+
+
+if __name__ == "__main__":
+    from .database import engine, write_lock
+    from .migrations import migrate
+
+    logging.basicConfig(level=logging.INFO)
+    with write_lock:
+        migrate(engine)
+        with engine.begin() as conn:
+            rows = rebuild(conn)
+    print(f"Rebuilt surveillance_weekly: {rows} rows")
@@ -1,13 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
-from redis import asyncio as aioredis
+from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
 import time
-import psutil
-import sqlite3
-import os
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+from app.core.cache import cache
+from app.core.workers import scheduler_lease
+from app.services.system_monitor import HEALTH_HISTORY_SIZE, system_sampler
 
 router = APIRouter()
 
@@ -21,71 +19,81 @@ async def health_check() -> Dict[str, Any]:
     }
 
 @router.get("/health/detailed")
-async def detailed_health_check() -> Dict[str, Any]:
-    """Detailed health check including system metrics"""
-    try:
-        # Check database connection
-        db_path = os.getenv("DATABASE_URL", "sqlite:///./solarmed.db")
-        if db_path.startswith("sqlite"):
-            db_path = db_path.replace("sqlite:///", "")
-            if not os.path.exists(db_path):
-                raise HTTPException(status_code=500, detail="Database file not found")
-            
-            conn = sqlite3.connect(db_path)
-            conn.close()
+async def detailed_health_check(window: int = Query(6, ge=1, le=HEALTH_HISTORY_SIZE)) -> Dict[str, Any]:
+    """Detailed health check from the latest background sample plus short-window trends"""
+    snapshot = system_sampler.latest()
+    if snapshot is None:
+        # Sampler hasn't produced a reading yet; take one off the event loop
+        snapshot = await asyncio.get_running_loop().run_in_executor(None, system_sampler.sample)
 
-        # Get system metrics
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+    if snapshot["database"] != "healthy":
+        raise HTTPException(status_code=500, detail="Database unreachable")
 
-        return {
-            "status": "healthy",
-            "timestamp": time.time(),
-            "system": {
-                "cpu_percent": cpu_percent,
-                "memory_percent": memory.percent,
-                "disk_percent": disk.percent,
-                "memory_available": memory.available,
-                "disk_free": disk.free
-            },
-            "services": {
-                "database": "healthy",
-                "cache": "healthy",
-                "api": "healthy"
-            }
+    return {
+        "status": "healthy",
+        "timestamp": time.time(),
+        "sampled_at": snapshot["timestamp"],
+        "system": {
+            "cpu_percent": snapshot["cpu_percent"],
+            "memory_percent": snapshot["memory_percent"],
+            "disk_percent": snapshot["disk_percent"],
+            "memory_available": snapshot["memory_available"],
+            "disk_free": snapshot["disk_free"]
+        },
+        "power": {
+            "battery_level": snapshot["battery_level"],
+            "solar_input": snapshot["solar_input"]
+        },
+        "trends": system_sampler.trends(window),
+        "services": {
+            "database": snapshot["database"],
+            "cache": "healthy",
+            "api": "healthy"
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    }
+
+@router.get("/health/history")
+async def health_history() -> List[Dict[str, Any]]:
+    """All samples in the ring buffer, oldest first"""
+    return system_sampler.history()
+
+@router.on_event("startup")
+async def start_system_sampler():
+    system_sampler.start()
+
+@router.on_event("shutdown")
+async def stop_system_sampler():
+    await system_sampler.stop()
 
 @router.get("/health/cache")
-@cache(expire=60)
 async def cache_health_check() -> Dict[str, Any]:
-    """Check cache health with caching"""
+    """In-process cache statistics"""
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "cache": "working"
+        "cache": cache.stats()
     }
 
-async def init_cache():
-    """Initialize cache backend"""
-    redis = aioredis.from_url(
-        "redis://localhost",
-        encoding="utf8",
-        decode_responses=True
-    )
-    FastAPICache.init(RedisBackend(redis))
+@router.on_event("startup")
+def load_cache():
+    """Warm the cache from its persisted snapshot, if persistence is enabled"""
+    cache.load()
+
+@router.on_event("shutdown")
+def save_cache():
+    # One snapshot is enough when several workers share the persist path
+    if scheduler_lease.acquire():
+        cache.save()
 
-# Cache configuration
+# Cache configuration (TTL in seconds, key prefix)
 CACHE_CONFIG = {
     "default": {
-        "backend": "redis",
+        "backend": "memory",
         "expire": 300,  # 5 minutes
         "prefix": "solarmed:"
     },
     "long_term": {
-        "backend": "redis",
+        "backend": "memory",
         "expire": 3600,  # 1 hour
         "prefix": "solarmed:long:"
     }
@@ -93,4 +101,4 @@ CACHE_CONFIG = {
 
 def get_cache_config(cache_type: str = "default") -> Dict[str, Any]:
     """Get cache configuration"""
-    return CACHE_CONFIG.get(cache_type, CACHE_CONFIG["default"]) 
\ No newline at end of file
+    return CACHE_CONFIG.get(cache_type, CACHE_CONFIG["default"])
@@ -1,14 +1,102 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .api import patients, diagnoses
-from .db.database import engine, Base
-from .core.auth import router as auth_router
+from typing import Optional
+from .api import auth, patients, diagnose, diagnoses, energy, metrics, analytics
+from .db.database import engine, write_lock
+from .db.migrations import migrate
+from .db.instrumentation import SQL_INSTRUMENTATION
+from .health import router as health_router
+from .wal_archive import WAL_ARCHIVE_DIR, create_wal_archiver
+from .backup import BACKUP_DIR, BackupManager, create_backup_manager
+from .core.lazy_imports import start_warm_up
+from .core.workers import scheduler_lease
+from .core.logging_config import configure_logging, shutdown_logging
+from .middleware import (
+    CompressionMiddleware, MetricsMiddleware, QueryStatsMiddleware, RateLimitMiddleware, RequestLoggingMiddleware,
+    RequestValidationMiddleware,
+)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Queue-backed logging: the event loop never writes to disk directly
+configure_logging()
 
 app = FastAPI(title="SolarMed AI", description="Offline-first healthcare diagnosis system")
 
+# Continuous WAL archiving for point-in-time recovery, when an archive
+# directory is configured. Registered before the other startup hooks, so
+# frames a crashed run left in the WAL are archived before anything writes.
+wal_archiver = create_wal_archiver() if WAL_ARCHIVE_DIR else None
+
+@app.on_event("startup")
+def start_wal_archiving():
+    if wal_archiver is None:
+        return
+    # With several workers only the one holding the scheduler lease archives;
+    # the others leave checkpoints to it, and start archiving if they take
+    # the lease over after it dies
+    if scheduler_lease.acquire():
+        wal_archiver.start()
+    else:
+        wal_archiver.disable_autocheckpoint()
+        scheduler_lease.on_takeover(wal_archiver.start)
+
+@app.on_event("shutdown")
+def stop_scheduler_takeover():
+    # Before the shutdown hooks below, so no scheduler starts while they run
+    scheduler_lease.stop_watching()
+
+@app.on_event("shutdown")
+def stop_wal_archiving():
+    if wal_archiver is not None and scheduler_lease.held:
+        wal_archiver.stop()
+
+@app.on_event("startup")
+def prepare_database():
+    """Create or upgrade database tables before the first request is served.
+
+    Kept out of module import so importing the app (tests, tooling, worker
+    boot) never touches the database. Holding the write lock means that with
+    several workers only the first applies pending steps.
+    """
+    with write_lock:
+        migrate(engine)
+
+@app.on_event("startup")
+async def warm_up_ml_imports():
+    # ML libraries load in the background once the server is accepting requests
+    start_warm_up()
+
+# Built at startup, and only on the worker holding the scheduler lease, since
+# opening the catalogue touches BACKUP_DIR
+backup_manager: Optional[BackupManager] = None
+
+@app.on_event("startup")
+def start_backup_verification():
+    """Re-verify catalogued backups every BACKUP_VERIFY_INTERVAL seconds"""
+    if not BACKUP_DIR:
+        return
+    if scheduler_lease.acquire():
+        _start_backup_verifier()
+    else:
+        scheduler_lease.on_takeover(_start_backup_verifier)
+
+def _start_backup_verifier() -> None:
+    global backup_manager
+    backup_manager = create_backup_manager(BACKUP_DIR, archiver=wal_archiver)
+    backup_manager.verifier.start()
+
+@app.on_event("shutdown")
+def stop_backup_verification():
+    if backup_manager is not None:
+        backup_manager.verifier.stop()
+
+# JSON-only bodies outside the upload routes, capped at MAX_REQUEST_BODY_BYTES
+# even when chunked
+app.add_middleware(RequestValidationMiddleware)
+
+# Per-client token buckets (RATE_LIMIT_*), shared by all workers in
+# multi-worker mode. Inside CORS so a 429 still reaches browser clients.
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -18,10 +106,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for clients on slow links, negotiated via Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency histograms and counters (/metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Per-request SQL stats (Server-Timing header and /metrics/queries)
+if SQL_INSTRUMENTATION:
+    app.add_middleware(QueryStatsMiddleware)
+
+# Access log (LOG_SUCCESS_SAMPLE_RATE); outermost so 429s and other
+# rejections by the middlewares above are logged too
+app.add_middleware(RequestLoggingMiddleware)
+
 # Include routers
-app.include_router(auth_router, prefix="/auth", tags=["auth"])
+app.include_router(auth.router)
 app.include_router(patients.router, prefix="/patients", tags=["patients"])
 app.include_router(diagnoses.router, prefix="/diagnoses", tags=["diagnoses"])
+app.include_router(diagnose.router)
+app.include_router(energy.router)
+app.include_router(metrics.router)
+app.include_router(analytics.router)
+app.include_router(health_router, tags=["health"])
+
+@app.on_event("shutdown")
+def flush_logs():
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -1,103 +1,368 @@
-from fastapi import Request, Response
-from fastapi.middleware.base import BaseHTTPMiddleware
+"""Pure ASGI middleware.
+
+Each class wraps the ASGI ``receive``/``send`` callables directly instead of
+going through ``BaseHTTPMiddleware``, so requests don't pay for an extra task
+and memory stream, streaming responses (SSE, file downloads) pass straight
+through, and context variables set here are visible to the endpoint.
+"""
+from fastapi import HTTPException
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from datetime import datetime
+import math
+import os
+import random
 import time
 import logging
-from typing import Callable
+import uuid
+from typing import Callable, Dict, Optional, Sequence, Tuple
 import json
 from functools import wraps
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
+import anyio
+
+from app.db.instrumentation import start_request, route_query_stats
+from app.core.compression import (
+    COMPRESSION_EXCLUDED_ROUTES,
+    COMPRESSION_MINIMUM_SIZE,
+    COMPRESSION_THREAD_THRESHOLD,
+    ENCODERS,
+    is_compressible,
+    negotiate,
 )
+from app.core.logging_config import LOG_SUCCESS_SAMPLE_RATE
+from app.core.metrics import registry
+from app.core.rate_limit import (
+    RATE_LIMIT_MAX_CLIENTS,
+    RATE_LIMIT_REQUESTS,
+    RATE_LIMIT_WINDOW,
+    create_limiter,
+)
+
+# Handlers are installed by app.core.logging_config.configure_logging
 logger = logging.getLogger(__name__)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, limit: int = 100, window: int = 60):
-        super().__init__(app)
-        self.limit = limit
-        self.window = window
-        self.requests = {}
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        client_ip = request.client.host
-        current_time = time.time()
-
-        # Clean up old entries
-        self.requests = {
-            ip: times for ip, times in self.requests.items()
-            if current_time - times[-1] < self.window
-        }
+MAX_REQUEST_BODY_BYTES = int(os.getenv("MAX_REQUEST_BODY_BYTES", str(10 * 1024 * 1024)))
+# Path prefixes that accept multipart / form bodies (file and voice uploads)
+MULTIPART_ROUTES = tuple(
+    prefix.strip()
+    for prefix in os.getenv("MULTIPART_ROUTES", "/api/diagnose,/diagnoses/upload,/api/diagnoses/upload").split(",")
+    if prefix.strip()
+)
+FORM_CONTENT_TYPES = ("multipart/form-data", "application/x-www-form-urlencoded")
 
-        if client_ip not in self.requests:
-            self.requests[client_ip] = []
 
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.limit:
-            return JSONResponse(
+def _route_path(scope: Scope) -> Optional[str]:
+    """Route template chosen by the router (set in the scope once routing ran)"""
+    return getattr(scope.get("route"), "path", None)
+
+
+class RateLimitMiddleware:
+    """Reject clients that exhaust their token bucket with 429 and Retry-After"""
+
+    def __init__(self, app: ASGIApp, limit: int = RATE_LIMIT_REQUESTS, window: float = RATE_LIMIT_WINDOW,
+                 routes: Optional[Dict[str, Tuple[int, float]]] = None,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.app = app
+        self.limiter = create_limiter(limit, window, routes=routes, max_clients=max_clients)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        allowed, retry_after = await self.limiter.hit_async(client_ip, scope["path"])
+
+        if not allowed:
+            response = JSONResponse(
                 status_code=429,
-                content={"detail": "Too many requests"}
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(math.ceil(retry_after))}
             )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
 
-        self.requests[client_ip].append(current_time)
-        response = await call_next(request)
-        return response
+class RequestLoggingMiddleware:
+    def __init__(self, app: ASGIApp, success_sample_rate: float = LOG_SUCCESS_SAMPLE_RATE):
+        self.app = app
+        self.success_sample_rate = success_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
         start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            process_time = time.time() - start_time
+            # Errors are always logged; successful requests can be sampled
+            if status_code >= 400 or random.random() < self.success_sample_rate:
+                self._log(scope, status_code, process_time)
+
+    @staticmethod
+    def _log(scope: Scope, status_code: int, process_time: float) -> None:
+        headers = Headers(scope=scope)
+        query = scope.get("query_string", b"").decode("latin-1")
+        client = scope.get("client")
         log_data = {
             "timestamp": datetime.now().isoformat(),
-            "method": request.method,
-            "url": str(request.url),
-            "status_code": response.status_code,
+            "method": scope["method"],
+            "url": scope["path"] + (f"?{query}" if query else ""),
+            "status_code": status_code,
             "process_time": process_time,
-            "client_ip": request.client.host,
-            "user_agent": request.headers.get("user-agent")
+            "client_ip": client[0] if client else None,
+            "user_agent": headers.get("user-agent")
         }
 
         logger.info(json.dumps(log_data))
-        return response
 
-class RequestValidationMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+class QueryStatsMiddleware:
+    """Collect per-request SQL stats and report them in Server-Timing"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+        stats = start_request(request_id)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers["Server-Timing"] = stats.server_timing()
+            await send(message)
+
         try:
-            # Validate content type
-            content_type = request.headers.get("content-type", "")
-            if request.method in ["POST", "PUT", "PATCH"]:
-                if not content_type.startswith("application/json"):
-                    return JSONResponse(
-                        status_code=415,
-                        content={"detail": "Unsupported media type"}
-                    )
-
-            # Validate request size
-            content_length = request.headers.get("content-length")
-            if content_length and int(content_length) > 10 * 1024 * 1024:  # 10MB
-                return JSONResponse(
-                    status_code=413,
-                    content={"detail": "Request entity too large"}
-                )
-
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stats.route = _route_path(scope)
+            route_query_stats.add(stats)
 
-        except Exception as e:
-            logger.error(f"Request validation error: {str(e)}")
-            return JSONResponse(
-                status_code=400,
-                content={"detail": "Invalid request"}
+class MetricsMiddleware:
+    """Record per-route latency histograms, request counts and in-flight requests"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry.inc("solarmed_http_requests_in_flight")
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            registry.dec("solarmed_http_requests_in_flight")
+            # Label by route template, never the raw path, to keep cardinality bounded
+            route = _route_path(scope) or "unmatched"
+            registry.observe(
+                "solarmed_http_request_duration_seconds",
+                {"method": scope["method"], "route": route},
+                elapsed,
+            )
+            registry.inc(
+                "solarmed_http_requests_total",
+                {"method": scope["method"], "route": route, "status": str(status_code)},
+            )
+
+class RequestValidationMiddleware:
+    """Check content type and body size before and while the body is read.
+
+    JSON is required for request bodies except on ``multipart_routes``, which
+    also accept form and multipart uploads. The size limit is checked against
+    Content-Length up front and again on every received chunk, so chunked
+    uploads without a Content-Length are cut off as soon as they exceed it.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int = MAX_REQUEST_BODY_BYTES,
+                 multipart_routes: Sequence[str] = MULTIPART_ROUTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.multipart_routes = tuple(multipart_routes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        try:
+            content_length = int(headers.get("content-length") or 0)
+        except ValueError:
+            await self._reject(scope, receive, send, 400, "Invalid request")
+            return
+        has_body = content_length > 0 or "transfer-encoding" in headers
+
+        # Validate content type
+        if scope["method"] in ("POST", "PUT", "PATCH") and has_body:
+            content_type = headers.get("content-type", "")
+            allowed = content_type.startswith("application/json") or (
+                content_type.startswith(FORM_CONTENT_TYPES) and scope["path"].startswith(self.multipart_routes)
             )
+            if not allowed:
+                await self._reject(scope, receive, send, 415, "Unsupported media type")
+                return
+
+        # Validate request size
+        if content_length > self.max_body_bytes:
+            await self._reject(scope, receive, send, 413, "Request entity too large")
+            return
+
+        received = 0
+        response_started = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI re-raises HTTPException from body parsing, so this
+                    # becomes a 413 response rather than a generic parse error
+                    raise HTTPException(status_code=413, detail="Request entity too large")
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except HTTPException as e:
+            # Raised by receive_wrapper outside of FastAPI's body parsing
+            if e.status_code != 413 or response_started:
+                raise
+            await self._reject(scope, receive, send, 413, e.detail)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, status_code: int, detail: str) -> None:
+        response = JSONResponse(status_code=status_code, content={"detail": detail})
+        await response(scope, receive, send)
+
+class CompressionMiddleware:
+    """Compress response bodies with the best encoding the client accepts.
+
+    Bodies under ``minimum_size``, already-encoded responses, incompressible
+    media and ``exclude_routes`` are sent as-is. Streaming responses are
+    compressed chunk by chunk with a sync flush per chunk. Bodies or chunks
+    of at least ``thread_threshold`` bytes are compressed in a worker thread
+    so a large patient export doesn't stall the event loop.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+                 thread_threshold: int = COMPRESSION_THREAD_THRESHOLD,
+                 exclude_routes: Sequence[str] = COMPRESSION_EXCLUDED_ROUTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_threshold = thread_threshold
+        self.exclude_routes = tuple(exclude_routes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (self.exclude_routes and scope["path"].startswith(self.exclude_routes)):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        encoder = None
+        passthrough = False
+        raw_bytes = wire_bytes = 0
+
+        def encoded_start(content_length: Optional[int]) -> Message:
+            headers = MutableHeaders(scope=start_message)
+            headers["Content-Encoding"] = encoding
+            if content_length is None:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(content_length)
+            headers.add_vary_header("Accept-Encoding")
+            return start_message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, encoder, passthrough, raw_bytes, wire_bytes
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not is_compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether to compress
+                    start_message = message
+                return
+            if message_type != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            raw_bytes += len(body)
+
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                encoder = ENCODERS[encoding]()
+                if not more_body:
+                    data = await self._compress(encoder.finish, body)
+                    await send(encoded_start(len(data)))
+                else:
+                    await send(encoded_start(None))
+                    data = await self._compress(encoder.chunk, body)
+            else:
+                data = await self._compress(encoder.finish if not more_body else encoder.chunk, body)
+
+            wire_bytes += len(data)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+            if not more_body:
+                registry.inc("solarmed_http_compression_input_bytes_total", {"encoding": encoding}, raw_bytes)
+                registry.inc("solarmed_http_compression_output_bytes_total", {"encoding": encoding}, wire_bytes)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _compress(self, compress: Callable[[bytes], bytes], data: bytes) -> bytes:
+        if len(data) >= self.thread_threshold:
+            return await anyio.to_thread.run_sync(compress, data)
+        return compress(data)
 
 def validate_request(func):
     @wraps(func)
@@ -110,4 +375,4 @@ def validate_request(func):
                 status_code=400,
                 content={"detail": str(e)}
             )
-    return wrapper 
\ No newline at end of file
+    return wrapper
@@ -1,6 +1,5 @@
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
 from enum import Enum
 
 class DiagnosisStatus(str, Enum):
@@ -25,17 +24,7 @@ class DiagnosisBase(BaseModel):
 class DiagnosisCreate(DiagnosisBase):
     pass
 
-class Diagnosis(DiagnosisBase):
-    id: int
-    status: DiagnosisStatus
-    prediction: Optional[dict] = None
-    confidence: Optional[float] = None
-    created_at: datetime
-    updated_at: datetime
-    is_synced: bool = False
-
-    class Config:
-        orm_mode = True
+# Responses use app.schemas.schemas.Diagnosis
 
 class DiagnosisUpdate(BaseModel):
     status: Optional[DiagnosisStatus] = None
@@ -1,14 +1,18 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 
 class PatientBase(BaseModel):
-    name: str
-    age: int
+    first_name: str
+    last_name: str
+    date_of_birth: Optional[datetime] = None
     gender: str
-    location: str
-    contact: Optional[str] = None
+    phone_number: Optional[str] = None
+    address: Optional[str] = None
+    village: Optional[str] = None
+    district: Optional[str] = None
+    qr_code: Optional[str] = None
 
 
 class PatientCreate(PatientBase):
@@ -19,6 +23,7 @@ class Patient(PatientBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    is_synced: bool = False
 
     class Config:
         from_attributes = True
@@ -26,9 +31,9 @@ class Patient(PatientBase):
 
 class DiagnosisBase(BaseModel):
     patient_id: int
-    symptoms: str
-    diagnosis: Optional[str] = None
-    confidence: Optional[float] = None
+    diagnosis_type: Optional[str] = None
+    symptoms: List[str]
+    notes: Optional[str] = None
     image_path: Optional[str] = None
     voice_path: Optional[str] = None
 
@@ -38,9 +43,15 @@ class DiagnosisCreate(DiagnosisBase):
 
 
 class Diagnosis(DiagnosisBase):
+    """A diagnosis as every endpoint returns it, whichever endpoint created it"""
     id: int
+    status: Optional[str] = None
+    diagnosis: Optional[str] = None
+    prediction: Optional[dict] = None
+    confidence: Optional[float] = None
     created_at: datetime
-    synced: bool
+    updated_at: Optional[datetime] = None
+    synced: bool = False
 
     class Config:
         from_attributes = True
@@ -65,6 +76,30 @@ class EnergyLog(EnergyLogBase):
         from_attributes = True
 
 
+class SurveillanceCount(BaseModel):
+    week_start: date
+    district: Optional[str] = None
+    disease: str
+    # Omitted when counts are summed per district
+    village: Optional[str] = None
+    count: int
+
+
+class OutbreakAlert(BaseModel):
+    id: int
+    district: Optional[str] = None
+    disease: str
+    window_start: datetime
+    window_end: datetime
+    cases: int
+    expected: float
+    z_score: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
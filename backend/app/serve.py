@@ -0,0 +1,69 @@
+"""Run the API, optionally as several worker processes.
+
+With one worker this is plain ``uvicorn app.main:app``. With more, uvicorn
+starts that many processes on the same socket and this sets
+``SHARED_STATE_DIR`` (default: ``<database>.shared`` next to the SQLite
+file) before they import the app, which turns on cross-process write
+serialization, shared cache invalidation, shared rate limits, merged
+metrics, one log file per worker and a single scheduler worker (see
+``app.core.workers``):
+
+    cd backend
+    python -m app.serve --workers 4
+
+``WEB_CONCURRENCY`` sets the default worker count. Each worker has its own
+database pools and caches, so memory use grows with the count; on a 2GB Pi
+one worker per core is plenty.
+"""
+import argparse
+import glob
+import os
+
+DEFAULT_DATABASE_URL = "sqlite:///./solarmed.db"
+
+
+def default_shared_dir(database_url: str) -> str:
+    """Shared state lives next to the database it coordinates access to"""
+    from sqlalchemy.engine import make_url
+
+    database = make_url(database_url).database or "solarmed.db"
+    return os.path.abspath(database) + ".shared"
+
+
+def prepare_shared_dir(path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+    # Metrics from a previous run would be merged into this one's counters
+    for stale in glob.glob(os.path.join(path, "metrics", "metrics_*.db")):
+        os.remove(stale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--shared-dir", default=os.getenv("SHARED_STATE_DIR", ""),
+                        help="shared state directory for multi-worker mode (default: next to the database)")
+    parser.add_argument("--app", default="app.main:app", help="import string of the ASGI app")
+    parser.add_argument("--factory", action="store_true", help="--app names a factory returning the app")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1:
+        shared_dir = args.shared_dir or default_shared_dir(os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL))
+        prepare_shared_dir(shared_dir)
+        # Workers are spawned fresh and read these at import
+        os.environ["SHARED_STATE_DIR"] = shared_dir
+    elif args.shared_dir:
+        os.environ["SHARED_STATE_DIR"] = args.shared_dir
+
+    import uvicorn
+
+    uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers, factory=args.factory,
+                log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
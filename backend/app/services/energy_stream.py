@@ -0,0 +1,7 @@
+from operator import attrgetter
+
+from app.services.latest_value_stream import LatestValueStream
+
+# Latest energy reading, served from memory and pushed to /energy/stream
+# subscribers; ingest paths publish after committing a reading
+energy_stream = LatestValueStream("Energy", order_key=attrgetter("timestamp"))
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LatestValueStream:
+    """In-memory holder for the latest value of a feed with pub/sub fan-out.
+
+    Writers call ``publish`` after committing a value; the latest one is then
+    served from memory and pushed to every live subscriber. Publishers may
+    run in the threadpool or on background threads, so delivery onto each
+    subscriber's event loop goes through ``call_soon_threadsafe``.
+    ``order_key`` orders values, so a late publish of an older value never
+    replaces a newer one.
+    """
+
+    def __init__(self, name: str, order_key: Callable[[Any], Any], queue_size: int = 8):
+        self.name = name
+        self.order_key = order_key
+        self.queue_size = queue_size
+        self._latest: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    @property
+    def latest(self) -> Optional[Any]:
+        """Most recently published value, or None before the first one"""
+        return self._latest
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def prime(self, value: Any) -> None:
+        """Seed the latest value without notifying subscribers"""
+        with self._lock:
+            if self._latest is None:
+                self._latest = value
+
+    def publish(self, value: Any) -> None:
+        """Fan a new value out to all subscribers, keeping it as latest unless a newer one is held.
+
+        Concurrent writers can publish out of commit order, so an older
+        value never replaces a newer one.
+        """
+        with self._lock:
+            if self._latest is None or self.order_key(value) >= self.order_key(self._latest):
+                self._latest = value
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, value)
+            except RuntimeError:
+                # Subscriber's loop already closed; it will be dropped on unsubscribe
+                pass
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, value: Any) -> None:
+        # Slow clients only need the freshest values, so drop the oldest
+        # queued value instead of blocking the publisher
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(value)
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue]:
+        """Register a queue on the running loop that receives new values"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(entry)
+        logger.debug(f"{self.name} stream subscriber added ({len(self._subscribers)} active)")
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+            logger.debug(f"{self.name} stream subscriber removed ({len(self._subscribers)} active)")
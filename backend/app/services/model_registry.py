@@ -0,0 +1,423 @@
+"""Memory-mapped, int8-quantized diagnosis models under a memory budget.
+
+Full float32 torch/transformers checkpoints don't fit next to the API and
+SQLite on a 2-4GB Pi. Models are instead exported to a small ``.smq``
+artifact: dense layers with int8 weights, a float32 scale per output row
+and a float32 bias, described by a JSON header. Artifacts are opened with
+``mmap``, so loading costs no copy: weight pages are read from disk on
+first use, are clean page cache the kernel can drop under memory pressure
+instead of swapping, and are shared by every worker process.
+
+``ModelRegistry`` keeps one artifact per ``DiagnosisType``
+(``<MODEL_DIR>/<type>.smq``) and loads it on first use. The mapped size of
+loaded models is kept under ``MODEL_MEMORY_BUDGET_MB`` by unloading the
+least recently used idle ones, and a sweeper unloads models idle for
+``MODEL_IDLE_SECONDS``. Inference runs on numpy views of the mapping when
+numpy is installed, otherwise in pure Python.
+
+Artifact layout (little-endian)::
+
+    b"SMQ1" | u32 header length | header JSON | padding | tensors (64-byte aligned)
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from operator import mul
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import importlib.util
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import logging
+
+from app.core.lazy_imports import lazy_module
+
+logger = logging.getLogger(__name__)
+
+np = lazy_module("numpy")
+HAVE_NUMPY = importlib.util.find_spec("numpy") is not None
+
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "256"))
+MODEL_IDLE_SECONDS = float(os.getenv("MODEL_IDLE_SECONDS", "600"))
+
+ARTIFACT_MAGIC = b"SMQ1"
+ARTIFACT_SUFFIX = ".smq"
+_ALIGN = 64
+_HEADER_LEN = struct.Struct("<I")
+
+
+class ModelBudgetError(RuntimeError):
+    """A model doesn't fit in the memory budget, even after unloading idle ones"""
+
+
+# Export
+
+def quantize_rows(weights: Sequence[Sequence[float]]) -> Tuple[bytes, List[float]]:
+    """Symmetric per-row int8 quantization: returns the int8 matrix and row scales"""
+    data = bytearray()
+    scales = []
+    for row in weights:
+        scale = max((abs(value) for value in row), default=0.0) / 127 or 1.0
+        data.extend(struct.pack(f"<{len(row)}b", *(max(-127, min(127, round(value / scale))) for value in row)))
+        scales.append(scale)
+    return bytes(data), scales
+
+
+def write_artifact(path: str, inputs: Sequence[str], labels: Sequence[str],
+                   layers: Sequence[Tuple[Sequence[Sequence[float]], Sequence[float]]],
+                   metadata: Optional[Dict[str, Any]] = None) -> int:
+    """Quantize float layers ``[(weights[out][in], bias[out]), ...]`` into an artifact.
+
+    Hidden layers use ReLU and the last one softmax over ``labels``; the
+    first layer's inputs are ``inputs`` (symptom names). Returns the file size.
+    """
+    blobs: List[bytes] = []
+    layer_specs = []
+    offset = 0
+
+    def place(blob: bytes) -> int:
+        nonlocal offset
+        position = offset
+        padded = blob + bytes(-len(blob) % _ALIGN)
+        blobs.append(padded)
+        offset += len(padded)
+        return position
+
+    for index, (weights, bias) in enumerate(layers):
+        quantized, scales = quantize_rows(weights)
+        rows, cols = len(weights), len(weights[0])
+        layer_specs.append({
+            "rows": rows,
+            "cols": cols,
+            "weight": place(quantized),
+            "scale": place(struct.pack(f"<{rows}f", *scales)),
+            "bias": place(struct.pack(f"<{rows}f", *bias)),
+            "activation": "softmax" if index == len(layers) - 1 else "relu",
+        })
+
+    header = {"format": 1, "inputs": list(inputs), "labels": list(labels), "layers": layer_specs,
+              "metadata": metadata or {}}
+    encoded = json.dumps(header).encode("utf-8")
+    data_start = math.ceil((len(ARTIFACT_MAGIC) + _HEADER_LEN.size + len(encoded)) / _ALIGN) * _ALIGN
+    header["data_offset"] = data_start
+    encoded = json.dumps(header).encode("utf-8")
+    # Recording the offset can push the header past the next boundary
+    data_start = math.ceil((len(ARTIFACT_MAGIC) + _HEADER_LEN.size + len(encoded)) / _ALIGN) * _ALIGN
+    header["data_offset"] = data_start
+    encoded = json.dumps(header).encode("utf-8")
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(ARTIFACT_MAGIC + _HEADER_LEN.pack(len(encoded)) + encoded)
+        f.write(bytes(data_start - f.tell()))
+        for blob in blobs:
+            f.write(blob)
+        size = f.tell()
+    os.replace(temp_path, path)
+    return size
+
+
+# Loading and inference
+
+def _process_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class QuantizedModel:
+    """One memory-mapped artifact; weights stay in the mapping"""
+
+    def __init__(self, path: str, diagnosis_type: str):
+        self.path = path
+        self.diagnosis_type = diagnosis_type
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(ARTIFACT_MAGIC)] != ARTIFACT_MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a model artifact")
+        header_len = _HEADER_LEN.unpack_from(self._map, len(ARTIFACT_MAGIC))[0]
+        header_start = len(ARTIFACT_MAGIC) + _HEADER_LEN.size
+        header = json.loads(self._map[header_start:header_start + header_len])
+        self.inputs: List[str] = header["inputs"]
+        self.labels: List[str] = header["labels"]
+        self.metadata: Dict[str, Any] = header.get("metadata", {})
+        self._input_index = {name: i for i, name in enumerate(self.inputs)}
+        self._layers = [self._view_layer(spec, header["data_offset"]) for spec in header["layers"]]
+        self.size_bytes = len(self._map)
+        self.load_seconds = time.perf_counter() - start
+        self.first_inference_seconds: Optional[float] = None
+        self.inferences = 0
+        self.last_used = time.monotonic()
+
+    def _view_layer(self, spec: Dict[str, Any], data_offset: int) -> Dict[str, Any]:
+        rows, cols = spec["rows"], spec["cols"]
+        weight, scale, bias = (data_offset + spec[name] for name in ("weight", "scale", "bias"))
+        if HAVE_NUMPY:
+            # Zero-copy views; pages are faulted in on first use
+            return {
+                "rows": rows, "cols": cols, "activation": spec["activation"],
+                "weight": np.frombuffer(self._map, dtype=np.int8, count=rows * cols, offset=weight).reshape(rows, cols),
+                "scale": np.frombuffer(self._map, dtype="<f4", count=rows, offset=scale),
+                "bias": np.frombuffer(self._map, dtype="<f4", count=rows, offset=bias),
+            }
+        view = memoryview(self._map)
+        return {
+            "rows": rows, "cols": cols, "activation": spec["activation"],
+            "weight": view[weight:weight + rows * cols].cast("b"),
+            "scale": view[scale:scale + rows * 4].cast("f"),
+            "bias": view[bias:bias + rows * 4].cast("f"),
+        }
+
+    def features(self, symptoms: Sequence[str]) -> List[int]:
+        """Indices of known symptoms (the active inputs of a multi-hot vector)"""
+        return sorted({self._input_index[s] for s in symptoms if s in self._input_index})
+
+    def predict(self, symptoms: Sequence[str]) -> Dict[str, float]:
+        """Probability per label for a list of symptom names"""
+        start = time.perf_counter()
+        active = self.features(symptoms)
+        values = self._forward_numpy(active) if HAVE_NUMPY else self._forward_python(active)
+        elapsed = time.perf_counter() - start
+        if self.first_inference_seconds is None:
+            self.first_inference_seconds = elapsed
+        self.inferences += 1
+        self.last_used = time.monotonic()
+        return dict(zip(self.labels, values))
+
+    def _forward_numpy(self, active: List[int]) -> List[float]:
+        x = None
+        for index, layer in enumerate(self._layers):
+            if index == 0:
+                # Multi-hot input: sum the active columns instead of a full matmul
+                acc = layer["weight"][:, active].sum(axis=1, dtype=np.int32).astype(np.float32)
+            else:
+                acc = layer["weight"].astype(np.float32) @ x
+            x = acc * layer["scale"] + layer["bias"]
+            if layer["activation"] == "relu":
+                x = np.maximum(x, 0.0)
+        x = np.exp(x - x.max())
+        return (x / x.sum()).tolist()
+
+    def _forward_python(self, active: List[int]) -> List[float]:
+        x: List[float] = []
+        for index, layer in enumerate(self._layers):
+            weight, scale, bias, cols = layer["weight"], layer["scale"], layer["bias"], layer["cols"]
+            out = []
+            for row in range(layer["rows"]):
+                base = row * cols
+                if index == 0:
+                    acc = sum(weight[base + i] for i in active)
+                else:
+                    acc = sum(map(mul, weight[base:base + cols], x))
+                value = acc * scale[row] + bias[row]
+                out.append(value if layer["activation"] != "relu" or value > 0 else 0.0)
+            x = out
+        peak = max(x)
+        exps = [math.exp(value - peak) for value in x]
+        total = sum(exps)
+        return [value / total for value in exps]
+
+    def resident_bytes(self) -> Optional[int]:
+        """Bytes of the mapping currently in memory (Linux; None elsewhere)"""
+        path = os.path.realpath(self.path)
+        resident = None
+        try:
+            with open("/proc/self/smaps", "r") as f:
+                in_mapping = False
+                for line in f:
+                    if not line[:1].isupper():
+                        # Mapping header: "start-end perms offset dev inode path"
+                        in_mapping = line.rstrip("\n").endswith(" " + path)
+                    elif in_mapping and line.startswith("Rss:"):
+                        resident = (resident or 0) + int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return resident
+
+    def close(self) -> None:
+        for layer in self._layers:
+            for name in ("weight", "scale", "bias"):
+                if isinstance(layer[name], memoryview):
+                    layer[name].release()
+        self._layers = []
+        try:
+            self._map.close()
+        except BufferError:
+            # A numpy view is still referenced somewhere; the mapping goes with it
+            logger.debug(f"Model {self.path} still referenced at unload")
+
+
+class ModelRegistry:
+    """Loads one model per diagnosis type on demand, within a memory budget"""
+
+    def __init__(self, model_dir: str = MODEL_DIR, budget_mb: float = MODEL_MEMORY_BUDGET_MB,
+                 idle_seconds: float = MODEL_IDLE_SECONDS):
+        self.model_dir = model_dir
+        self.budget_bytes = int(budget_mb * 2**20)
+        self.idle_seconds = idle_seconds
+        self._models: "OrderedDict[str, QuantizedModel]" = OrderedDict()
+        self._in_use: Dict[str, int] = {}
+        self._reports: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.evictions = 0
+
+    def path_for(self, diagnosis_type: str) -> Optional[str]:
+        path = os.path.join(self.model_dir, diagnosis_type + ARTIFACT_SUFFIX)
+        return path if os.path.exists(path) else None
+
+    def available(self) -> List[str]:
+        if not os.path.isdir(self.model_dir):
+            return []
+        return sorted(name[:-len(ARTIFACT_SUFFIX)] for name in os.listdir(self.model_dir)
+                      if name.endswith(ARTIFACT_SUFFIX))
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(model.size_bytes for model in self._models.values())
+
+    @contextmanager
+    def use(self, diagnosis_type: str) -> Iterator[Optional[QuantizedModel]]:
+        """The loaded model for ``diagnosis_type`` (None without an artifact); not evicted while in use"""
+        model = self._acquire(diagnosis_type)
+        try:
+            yield model
+        finally:
+            if model is not None:
+                with self._lock:
+                    self._in_use[diagnosis_type] -= 1
+                    self._record(diagnosis_type, model)
+
+    def predict(self, diagnosis_type: str, symptoms: Sequence[str]) -> Optional[Dict[str, float]]:
+        """Label probabilities, or None when no model can serve this type"""
+        try:
+            with self.use(diagnosis_type) as model:
+                return model.predict(symptoms) if model is not None else None
+        except (ModelBudgetError, ValueError, OSError) as e:
+            logger.warning(f"No {diagnosis_type} model available: {str(e)}")
+            return None
+
+    def _acquire(self, diagnosis_type: str) -> Optional[QuantizedModel]:
+        with self._lock:
+            model = self._models.get(diagnosis_type)
+            if model is not None:
+                self._models.move_to_end(diagnosis_type)
+                self._in_use[diagnosis_type] = self._in_use.get(diagnosis_type, 0) + 1
+                return model
+            path = self.path_for(diagnosis_type)
+            if path is None:
+                return None
+            size = os.path.getsize(path)
+            if size > self.budget_bytes:
+                raise ModelBudgetError(f"{path} is {size / 2**20:.1f} MiB, over the "
+                                       f"{self.budget_bytes / 2**20:.0f} MiB model budget")
+            # Unload least recently used idle models until the new one fits
+            for loaded_type in list(self._models):
+                if self.used_bytes + size <= self.budget_bytes:
+                    break
+                if not self._in_use.get(loaded_type):
+                    self._unload(loaded_type)
+            if self.used_bytes + size > self.budget_bytes:
+                raise ModelBudgetError(f"no room for {diagnosis_type} model: "
+                                       f"{self.used_bytes / 2**20:.1f} MiB of models in use")
+            rss_before = _process_rss()
+            model = QuantizedModel(path, diagnosis_type)
+            self._models[diagnosis_type] = model
+            self._in_use[diagnosis_type] = 1
+            rss_after = _process_rss()
+            report = self._reports.setdefault(diagnosis_type, {"loads": 0})
+            report["loads"] += 1
+            report["load_rss_delta_bytes"] = (rss_after - rss_before) if rss_before and rss_after else None
+            logger.info(f"Loaded {diagnosis_type} model ({size / 2**20:.1f} MiB mapped) "
+                        f"in {model.load_seconds * 1000:.1f}ms")
+            return model
+
+    def _unload(self, diagnosis_type: str) -> None:
+        """Caller holds self._lock"""
+        model = self._models.pop(diagnosis_type)
+        self._record(diagnosis_type, model)
+        model.close()
+        self.evictions += 1
+        logger.info(f"Unloaded {diagnosis_type} model")
+
+    def _record(self, diagnosis_type: str, model: QuantizedModel) -> None:
+        report = self._reports.setdefault(diagnosis_type, {"loads": 0})
+        report.update({
+            "size_bytes": model.size_bytes,
+            "load_ms": round(model.load_seconds * 1000, 3),
+            "first_inference_ms": (round(model.first_inference_seconds * 1000, 3)
+                                   if model.first_inference_seconds is not None else None),
+            "inferences": model.inferences,
+        })
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Unload models unused for ``idle_seconds``; returns how many were unloaded"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [diagnosis_type for diagnosis_type, model in self._models.items()
+                    if not self._in_use.get(diagnosis_type) and now - model.last_used >= self.idle_seconds]
+            for diagnosis_type in idle:
+                self._unload(diagnosis_type)
+        return len(idle)
+
+    def unload_all(self) -> None:
+        with self._lock:
+            for diagnosis_type in list(self._models):
+                self._unload(diagnosis_type)
+
+    def stats(self) -> Dict[str, Any]:
+        """Budget use and, per diagnosis type, residency and latency of its model"""
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for diagnosis_type in sorted(set(self.available()) | set(self._reports)):
+                report = dict(self._reports.get(diagnosis_type, {"loads": 0}))
+                model = self._models.get(diagnosis_type)
+                report["loaded"] = model is not None
+                if model is not None:
+                    report["resident_bytes"] = model.resident_bytes()
+                    report["idle_seconds"] = round(now - model.last_used, 1)
+                models[diagnosis_type] = report
+            return {
+                "model_dir": self.model_dir,
+                "budget_bytes": self.budget_bytes,
+                "mapped_bytes": self.used_bytes,
+                "evictions": self.evictions,
+                "backend": "numpy" if HAVE_NUMPY else "python",
+                "process_rss_bytes": _process_rss(),
+                "models": models,
+            }
+
+    # Idle sweeper
+
+    def _run(self) -> None:
+        while not self._stop.wait(min(60.0, max(1.0, self.idle_seconds / 4))):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Model idle sweep failed: {str(e)}")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="solarmed-model-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,511 @@
+"""Streaming outbreak detection over incoming diagnoses.
+
+``OutbreakDetector`` keeps, per (district, disease), the counts of the last
+``OUTBREAK_WINDOW_BUCKETS`` time buckets in a small ring buffer and an
+exponentially weighted mean and variance of the per-bucket count. Buckets
+feed the baseline as they leave the window, so a spike never inflates its
+own baseline; until a series has seen ``OUTBREAK_BASELINE_DAYS`` of buckets
+the baseline is their plain average, and no alert is raised before it has
+seen a quarter of that span. A diagnosis raises an alert when its window holds at least
+``OUTBREAK_MIN_CASES`` cases and sits ``OUTBREAK_Z_THRESHOLD`` standard
+deviations above the baseline's expectation (with a Poisson floor on the
+deviation, so sparse series don't alert on a single case); a series then
+stays quiet for one window. State is O(window) per series and the number
+of series is capped, least recently active ones first out.
+
+``OutbreakMonitor`` wires it into the app:
+
+- committed diagnoses are fed from the session's commit hook, in commit
+  order, so alerts are raised as soon as the write that crosses the
+  threshold commits
+- alerts are written to ``outbreak_alerts`` and pushed to ``alert_stream``
+  subscribers by a background thread, never inside the writer's transaction
+- detector state and the last processed diagnosis id are checkpointed to
+  ``OUTBREAK_CHECKPOINT``; on start the checkpoint is loaded and only
+  diagnoses after it are read back. Without a checkpoint only the baseline
+  horizon of history is replayed, and replayed alerts older than one
+  window are not re-raised
+- with several workers, the worker holding the scheduler lease runs the
+  detector and tails the diagnoses other workers commit; the rest relay
+  new alerts to their own stream subscribers
+"""
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Optional, Tuple
+import json
+import math
+import os
+import queue
+import threading
+import time
+import logging
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm.util import identity_key
+
+from app.core.cache import cache
+from app.core.workers import scheduler_lease
+from app.db import models
+from app.db.database import ReadSessionLocal, SessionLocal
+from app.schemas import schemas
+from app.services.latest_value_stream import LatestValueStream
+
+logger = logging.getLogger(__name__)
+
+OUTBREAK_DETECTION = os.getenv("OUTBREAK_DETECTION", "true").lower() == "true"
+OUTBREAK_BUCKET_MINUTES = float(os.getenv("OUTBREAK_BUCKET_MINUTES", "60"))
+OUTBREAK_WINDOW_BUCKETS = int(os.getenv("OUTBREAK_WINDOW_BUCKETS", "24"))
+OUTBREAK_BASELINE_DAYS = float(os.getenv("OUTBREAK_BASELINE_DAYS", "28"))
+OUTBREAK_MIN_CASES = int(os.getenv("OUTBREAK_MIN_CASES", "5"))
+OUTBREAK_Z_THRESHOLD = float(os.getenv("OUTBREAK_Z_THRESHOLD", "4.0"))
+OUTBREAK_MAX_SERIES = int(os.getenv("OUTBREAK_MAX_SERIES", "4096"))
+# Comma-separated diseases to watch; empty watches all of them
+OUTBREAK_DISEASES = os.getenv("OUTBREAK_DISEASES", "")
+OUTBREAK_CHECKPOINT = os.getenv("OUTBREAK_CHECKPOINT", "outbreak_checkpoint.json")
+OUTBREAK_CHECKPOINT_SECONDS = float(os.getenv("OUTBREAK_CHECKPOINT_SECONDS", "60"))
+# Multi-worker mode: how often to look for diagnoses or alerts from other workers
+OUTBREAK_FOLLOW_INTERVAL = 1.0
+
+# 2: series keyed by models.disease_key, so covid19 and covid are one series
+CHECKPOINT_VERSION = 2
+_EPOCH = datetime(1970, 1, 1)
+_REPLAY_BATCH = 5000
+
+
+class _Series:
+    """Window and baseline of one (district, disease)"""
+
+    __slots__ = ("head", "ring", "total", "mean", "var", "seen", "quiet_until")
+
+    def __init__(self, head: int, window: int, seen: int = 0):
+        self.head = head
+        self.ring = array("I", bytes(4 * window))
+        self.total = 0
+        self.mean = 0.0
+        self.var = 0.0
+        # Buckets the baseline has learned from
+        self.seen = seen
+        self.quiet_until = head
+
+
+class OutbreakDetector:
+    """Sliding-window counts against EWMA baselines; not thread-safe on its own"""
+
+    def __init__(self, bucket_minutes: float = OUTBREAK_BUCKET_MINUTES, window_buckets: int = OUTBREAK_WINDOW_BUCKETS,
+                 baseline_days: float = OUTBREAK_BASELINE_DAYS, min_cases: int = OUTBREAK_MIN_CASES,
+                 z_threshold: float = OUTBREAK_Z_THRESHOLD, max_series: int = OUTBREAK_MAX_SERIES,
+                 diseases: Iterable[str] = tuple(d.strip() for d in OUTBREAK_DISEASES.split(",") if d.strip())):
+        self.bucket_seconds = bucket_minutes * 60
+        self.window = window_buckets
+        self.baseline_buckets = max(1, int(baseline_days * 86400 / self.bucket_seconds))
+        self.alpha = 2 / (self.baseline_buckets + 1)
+        # A quarter of the baseline span (at least a window) before a series may alert
+        self.warmup_buckets = max(self.window, self.baseline_buckets // 4)
+        self.min_cases = min_cases
+        self.z_threshold = z_threshold
+        self.max_series = max_series
+        self.diseases = frozenset(models.DISEASE_ALIASES.get(disease, disease) for disease in diseases)
+        self._series: "OrderedDict[Tuple[str, str], _Series]" = OrderedDict()
+        # Past this many empty buckets the baseline has decayed to nothing
+        self._decay_limit = 8 * self.baseline_buckets
+        # Bucket of the first event seen; series that appear later had no cases before
+        self.origin: Optional[int] = None
+        self.last_id = 0
+        self.events = 0
+        self.late = 0
+        self.alerts = 0
+        self.evictions = 0
+
+    @property
+    def window_seconds(self) -> float:
+        return self.window * self.bucket_seconds
+
+    def _bucket(self, when: datetime) -> int:
+        return int((when - _EPOCH).total_seconds() // self.bucket_seconds)
+
+    def _bucket_start(self, bucket: int) -> datetime:
+        return _EPOCH + timedelta(seconds=bucket * self.bucket_seconds)
+
+    def _learn(self, series: _Series, count: int) -> None:
+        seen = series.seen + 1
+        # Plain running average while warming up, so early buckets aren't underweighted
+        alpha = max(self.alpha, 1 / seen)
+        diff = count - series.mean
+        increment = alpha * diff
+        series.mean += increment
+        series.var = (1 - alpha) * (series.var + diff * increment)
+        series.seen = min(seen, self.baseline_buckets)
+
+    def _advance(self, series: _Series, bucket: int) -> None:
+        """Move the window head to ``bucket``, feeding expiring buckets to the baseline"""
+        steps = bucket - series.head
+        ring = series.ring
+        for entering in range(series.head + 1, series.head + 1 + min(steps, self.window)):
+            slot = entering % self.window
+            count = ring[slot]
+            # The slot held bucket entering - window; nothing is known from before the origin
+            if entering - self.window >= self.origin:
+                self._learn(series, count)
+            series.total -= count
+            ring[slot] = 0
+        # Empty buckets that entered and left the window between two events
+        for _ in range(min(steps - self.window, self._decay_limit)):
+            self._learn(series, 0)
+        series.head = bucket
+
+    def process(self, district: Optional[str], disease: Optional[str], when: datetime,
+                event_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Count one diagnosis; returns an alert when its series crosses the threshold.
+
+        Events with an id at or below the last one processed are ignored, so
+        replaying diagnoses that were already seen is harmless.
+        """
+        if event_id is not None:
+            if event_id <= self.last_id:
+                return None
+            self.last_id = event_id
+        if disease is None or when is None or (self.diseases and disease not in self.diseases):
+            return None
+        key = (district or "", disease)
+        bucket = self._bucket(when)
+        series = self._series.get(key)
+        if self.origin is None:
+            self.origin = bucket
+        if series is None:
+            # Every bucket that left the window since the detector started was empty
+            empty = min(max(0, bucket - self.window + 1 - self.origin), self.baseline_buckets)
+            series = self._series[key] = _Series(bucket, self.window, empty)
+            if len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._series.move_to_end(key)
+            if bucket > series.head:
+                self._advance(series, bucket)
+            elif bucket <= series.head - self.window:
+                self.late += 1
+                return None
+        series.ring[bucket % self.window] += 1
+        series.total += 1
+        self.events += 1
+
+        if series.total < self.min_cases or series.seen < self.warmup_buckets or series.head < series.quiet_until:
+            return None
+        expected = series.mean * self.window
+        deviation = math.sqrt(max(series.var * self.window, expected, 1.0))
+        score = (series.total - expected) / deviation
+        if score < self.z_threshold:
+            return None
+        series.quiet_until = series.head + self.window
+        self.alerts += 1
+        return {
+            "district": key[0],
+            "disease": disease,
+            "window_start": self._bucket_start(series.head - self.window + 1),
+            "window_end": self._bucket_start(series.head + 1),
+            "cases": series.total,
+            "expected": round(expected, 3),
+            "z_score": round(score, 3),
+        }
+
+    def _params(self) -> Dict[str, Any]:
+        return {"bucket_seconds": self.bucket_seconds, "window": self.window, "alpha": self.alpha}
+
+    def state(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot of every series"""
+        return {
+            "version": CHECKPOINT_VERSION,
+            "params": self._params(),
+            "last_id": self.last_id,
+            "origin": self.origin,
+            "series": [
+                [district, disease, s.head, s.total, s.mean, s.var, s.seen, s.quiet_until, s.ring.tolist()]
+                for (district, disease), s in self._series.items()
+            ],
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> bool:
+        """Restore a snapshot taken with the same bucket and window settings"""
+        if state.get("version") != CHECKPOINT_VERSION or state.get("params") != self._params():
+            return False
+        self._series.clear()
+        for district, disease, head, total, mean, var, seen, quiet_until, ring in state["series"][-self.max_series:]:
+            series = _Series(head, self.window, seen)
+            series.ring = array("I", ring)
+            series.total, series.mean, series.var, series.quiet_until = total, mean, var, quiet_until
+            self._series[(district, disease)] = series
+        self.last_id = state["last_id"]
+        self.origin = state["origin"]
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "series": len(self._series),
+            "max_series": self.max_series,
+            "last_diagnosis_id": self.last_id,
+            "events": self.events,
+            "late_events": self.late,
+            "alerts": self.alerts,
+            "evictions": self.evictions,
+            "window_hours": self.window_seconds / 3600,
+        }
+
+
+def _disease(diagnosis: models.Diagnosis) -> Optional[str]:
+    # Same rule as the surveillance counts: prediction, else the filed type
+    return models.disease_key(diagnosis.diagnosis, diagnosis.diagnosis_type)
+
+
+class OutbreakMonitor:
+    """Feeds committed diagnoses to a detector; stores, streams and checkpoints its alerts"""
+
+    def __init__(self, detector: OutbreakDetector, stream: LatestValueStream,
+                 checkpoint_path: Optional[str] = OUTBREAK_CHECKPOINT,
+                 checkpoint_seconds: float = OUTBREAK_CHECKPOINT_SECONDS):
+        self.detector = detector
+        self.stream = stream
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_seconds = checkpoint_seconds
+        self.mode: Optional[str] = None
+        self._lock = threading.Lock()
+        self._alerts: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watched = set()
+        self._checkpointed_id = 0
+        self._last_alert_id = 0
+        self.checkpoint_seconds_taken: Optional[float] = None
+
+    @property
+    def detecting(self) -> bool:
+        return self.mode in ("hook", "tail")
+
+    def watch(self, session_factory) -> None:
+        """Feed diagnoses inserted through ``session_factory`` sessions once they commit"""
+        if session_factory in self._watched:
+            return
+        self._watched.add(session_factory)
+
+        @event.listens_for(session_factory, "after_flush")
+        def _collect(session, flush_context):
+            if self.mode != "hook":
+                return
+            new = [obj for obj in session.new if isinstance(obj, models.Diagnosis)]
+            if not new:
+                return
+            connection = session.connection()
+            events = session.info.setdefault("outbreak_events", [])
+            for diagnosis in new:
+                district = None
+                if diagnosis.patient_id is not None:
+                    # Handlers usually loaded the patient already
+                    patient = session.identity_map.get(identity_key(models.Patient, diagnosis.patient_id))
+                    if patient is not None and "district" in patient.__dict__:
+                        district = patient.district
+                    else:
+                        district = connection.execute(
+                            select(models.Patient.district).where(models.Patient.id == diagnosis.patient_id)
+                        ).scalar()
+                events.append((district, _disease(diagnosis), diagnosis.created_at, diagnosis.id))
+
+        @event.listens_for(session_factory, "after_commit")
+        def _feed(session):
+            events = session.info.pop("outbreak_events", None)
+            if events:
+                self.feed(events)
+
+        @event.listens_for(session_factory, "after_soft_rollback")
+        def _discard(session, previous_transaction):
+            session.info.pop("outbreak_events", None)
+
+    def feed(self, events: Iterable[Tuple[Optional[str], Optional[str], datetime, Optional[int]]],
+             alert_after: Optional[datetime] = None) -> int:
+        """Process (district, disease, created_at, id) events; returns the number of alerts queued"""
+        raised = 0
+        with self._lock:
+            for district, disease, when, event_id in events:
+                alert = self.detector.process(district, disease, when, event_id)
+                if alert is not None and (alert_after is None or alert["window_end"] >= alert_after):
+                    self._alerts.put(alert)
+                    raised += 1
+        return raised
+
+    def catch_up(self, alert_after: Optional[datetime] = None) -> int:
+        """Feed diagnoses committed after the last one processed; returns how many were read"""
+        read = 0
+        with ReadSessionLocal() as db:
+            while True:
+                rows = db.execute(
+                    select(models.Patient.district, models.Diagnosis.diagnosis, models.Diagnosis.diagnosis_type,
+                           models.Diagnosis.created_at, models.Diagnosis.id)
+                    .outerjoin(models.Patient, models.Patient.id == models.Diagnosis.patient_id)
+                    .where(models.Diagnosis.id > self.detector.last_id)
+                    .order_by(models.Diagnosis.id)
+                    .limit(_REPLAY_BATCH)
+                ).all()
+                if not rows:
+                    return read
+                self.feed(((district, models.disease_key(diagnosis, diagnosis_type), created_at, diagnosis_id)
+                           for district, diagnosis, diagnosis_type, created_at, diagnosis_id in rows), alert_after)
+                read += len(rows)
+
+    def _cold_start(self) -> None:
+        """Without a checkpoint, replay only the history the baseline still remembers"""
+        horizon = datetime.utcnow() - timedelta(seconds=(self.detector.baseline_buckets + self.detector.window)
+                                                * self.detector.bucket_seconds)
+        with ReadSessionLocal() as db:
+            first = db.execute(
+                select(func.min(models.Diagnosis.id)).where(models.Diagnosis.created_at >= horizon)
+            ).scalar()
+            last = db.execute(select(func.max(models.Diagnosis.id))).scalar()
+        self.detector.last_id = (first - 1) if first is not None else (last or 0)
+
+    def load_checkpoint(self) -> bool:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable outbreak checkpoint {self.checkpoint_path}: {str(e)}")
+            return False
+        with self._lock:
+            loaded = self.detector.load_state(state)
+        if not loaded:
+            logger.warning("Outbreak checkpoint was taken with different window settings; starting over")
+            return False
+        self._checkpointed_id = self.detector.last_id
+        return True
+
+    def checkpoint(self) -> None:
+        """Write the detector state atomically, if anything changed since the last one"""
+        if not self.checkpoint_path or self.detector.last_id == self._checkpointed_id:
+            return
+        start = time.perf_counter()
+        with self._lock:
+            state = self.detector.state()
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+        self._checkpointed_id = state["last_id"]
+        self.checkpoint_seconds_taken = time.perf_counter() - start
+
+    def _store(self, alert: Dict[str, Any]) -> None:
+        with SessionLocal() as db:
+            db_alert = models.OutbreakAlert(**alert)
+            db.add(db_alert)
+            db.commit()
+            db.refresh(db_alert)
+            reading = schemas.OutbreakAlert.model_validate(db_alert)
+        self._last_alert_id = reading.id
+        logger.warning(f"Outbreak alert: {reading.cases} {reading.disease} cases in "
+                       f"{reading.district or 'unknown district'} (expected {reading.expected:.1f})")
+        self.stream.publish(reading)
+
+    def _relay(self) -> None:
+        """Publish alerts stored by the detecting worker to this worker's subscribers"""
+        with ReadSessionLocal() as db:
+            alerts = db.query(models.OutbreakAlert).filter(models.OutbreakAlert.id > self._last_alert_id) \
+                .order_by(models.OutbreakAlert.id).all()
+            for db_alert in alerts:
+                self._last_alert_id = db_alert.id
+                self.stream.publish(schemas.OutbreakAlert.model_validate(db_alert))
+
+    def _run(self) -> None:
+        shared = cache.shared_versions
+        table = "diagnoses" if self.mode == "tail" else "outbreak_alerts"
+        seen = shared.version(table) if shared is not None else None
+        interval = OUTBREAK_FOLLOW_INTERVAL if shared is not None else self.checkpoint_seconds
+        next_checkpoint = time.monotonic() + self.checkpoint_seconds
+        while not self._stop.is_set():
+            try:
+                alert = self._alerts.get(timeout=interval)
+            except queue.Empty:
+                alert = None
+            try:
+                if alert is not None:
+                    self._store(alert)
+                if shared is not None and shared.version(table) != seen:
+                    seen = shared.version(table)
+                    if self.mode == "tail":
+                        self.catch_up()
+                    else:
+                        self._relay()
+                if self.detecting and time.monotonic() >= next_checkpoint:
+                    self.checkpoint()
+                    next_checkpoint = time.monotonic() + self.checkpoint_seconds
+            except Exception as e:
+                logger.error(f"Outbreak monitor step failed: {str(e)}")
+
+    def start(self) -> None:
+        """Pick this worker's role, restore state and start the background thread"""
+        if not OUTBREAK_DETECTION or (self._thread is not None and self._thread.is_alive()):
+            return
+        if scheduler_lease.acquire():
+            self.mode = "hook" if cache.shared_versions is None else "tail"
+        elif cache.shared_versions is not None:
+            self.mode = "relay"
+            scheduler_lease.on_takeover(self._take_over)
+        else:
+            return
+        with ReadSessionLocal() as db:
+            self._last_alert_id = db.execute(select(func.max(models.OutbreakAlert.id))).scalar() or 0
+        if self.detecting:
+            self.watch(SessionLocal)
+            began = time.perf_counter()
+            restored = self.load_checkpoint()
+            if not restored:
+                self._cold_start()
+            # Alerts older than a window were missed while down; don't raise them late
+            read = self.catch_up(alert_after=datetime.utcnow() - timedelta(seconds=self.detector.window_seconds))
+            logger.info(f"Outbreak detector {'restored' if restored else 'started'}: replayed {read} diagnoses "
+                        f"in {time.perf_counter() - began:.2f}s")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="solarmed-outbreak", daemon=True)
+        self._thread.start()
+
+    def _take_over(self) -> None:
+        # The detecting worker died and this one holds the lease now
+        if self.mode == "relay":
+            self.stop()
+            self.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            # Wake the thread if it is waiting for an alert
+            self._alerts.put(None)
+            self._thread.join()
+            self._thread = None
+        # Alerts raised just before shutdown are still stored
+        while self.detecting and not self._alerts.empty():
+            alert = self._alerts.get_nowait()
+            if alert is not None:
+                self._store(alert)
+        if self.detecting:
+            self.checkpoint()
+        self.mode = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = self.detector.stats()
+        stats.update({
+            "mode": self.mode,
+            "pending_alerts": self._alerts.qsize(),
+            "checkpoint_path": self.checkpoint_path,
+            "checkpointed_diagnosis_id": self._checkpointed_id,
+            "last_checkpoint_ms": (round(self.checkpoint_seconds_taken * 1000, 3)
+                                   if self.checkpoint_seconds_taken is not None else None),
+            "stream_subscribers": self.stream.subscriber_count,
+        })
+        return stats
+
+
+# Same latest-value holder and fan-out as the energy stream
+alert_stream = LatestValueStream("Outbreak alert", order_key=attrgetter("id"), queue_size=64)
+outbreak_monitor = OutbreakMonitor(OutbreakDetector(), alert_stream)
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import psutil
+from sqlalchemy import text
+
+from app.db.database import engine
+from app.services.energy_stream import energy_stream
+
+logger = logging.getLogger(__name__)
+
+HEALTH_SAMPLE_INTERVAL = float(os.getenv("HEALTH_SAMPLE_INTERVAL", "10"))
+HEALTH_HISTORY_SIZE = int(os.getenv("HEALTH_HISTORY_SIZE", "60"))
+HEALTH_DISK_PATH = os.getenv("HEALTH_DISK_PATH", "/")
+
+# Fields summarised over the trend window
+TREND_FIELDS = ("cpu_percent", "memory_percent", "disk_percent", "battery_level")
+
+
+class SystemSampler:
+    """Periodically samples system health into a fixed-size ring buffer.
+
+    Health probes used to measure CPU with ``psutil.cpu_percent(interval=1)``
+    and open a new sqlite3 connection per request, blocking the event loop
+    for a second each time. The sampler does that work on an executor thread
+    every ``interval`` seconds instead; handlers only read the buffer.
+    ``cpu_percent(interval=None)`` reports usage since the previous sample,
+    so each reading covers the whole interval rather than a one-second peek.
+    """
+
+    def __init__(self, interval: float = HEALTH_SAMPLE_INTERVAL, history: int = HEALTH_HISTORY_SIZE,
+                 disk_path: str = HEALTH_DISK_PATH, db_engine=engine):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.engine = db_engine
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._task: Optional[asyncio.Task] = None
+        # Prime the CPU counter so the first real sample has a baseline
+        psutil.cpu_percent(interval=None)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sample)
+            except Exception as e:
+                logger.error(f"Health sample failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def sample(self) -> Dict[str, Any]:
+        """Collect one snapshot (blocking; call from a worker thread)"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        snapshot = {
+            "timestamp": time.time(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": memory.percent,
+            "memory_available": memory.available,
+            "disk_percent": disk.percent,
+            "disk_free": disk.free,
+            "database": self._check_database(),
+            "battery_level": None,
+            "solar_input": None,
+        }
+        reading = energy_stream.latest
+        if reading is not None:
+            snapshot["battery_level"] = reading.battery_level
+            snapshot["solar_input"] = reading.solar_input
+        self._samples.append(snapshot)
+        return snapshot
+
+    def _check_database(self) -> str:
+        # Goes through the engine's pool, so no new connection per check
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return "healthy"
+        except Exception as e:
+            logger.error(f"Database health check failed: {str(e)}")
+            return "unreachable"
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self._samples[-1] if self._samples else None
+
+    def history(self) -> List[Dict[str, Any]]:
+        return list(self._samples)
+
+    def trends(self, window: Optional[int] = None) -> Dict[str, Any]:
+        """Min/avg/max and change of each trend field over the last ``window`` samples"""
+        samples = list(self._samples)[-window:] if window else list(self._samples)
+        trends: Dict[str, Any] = {
+            "samples": len(samples),
+            "window_seconds": samples[-1]["timestamp"] - samples[0]["timestamp"] if samples else 0.0,
+        }
+        for field in TREND_FIELDS:
+            values = [sample[field] for sample in samples if sample[field] is not None]
+            if not values:
+                continue
+            trends[field] = {
+                "min": min(values),
+                "avg": round(sum(values) / len(values), 2),
+                "max": max(values),
+                "change": round(values[-1] - values[0], 2),
+            }
+        return trends
+
+
+system_sampler = SystemSampler()
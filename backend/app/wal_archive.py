@@ -0,0 +1,341 @@
+"""Continuous WAL archiving for point-in-time recovery.
+
+SQLite in WAL mode appends every committed page to ``<db>-wal`` and copies
+them into the database at checkpoints. ``WalArchiver`` takes over
+checkpointing: every ``WAL_ARCHIVE_INTERVAL`` seconds it copies the pages
+committed since the last run into a compressed segment in
+``WAL_ARCHIVE_DIR`` (a second directory, ideally a USB drive), then runs
+the checkpoint itself. Automatic checkpoints are switched off on the
+writer engine so no frame is checkpointed before it's archived.
+
+SQLite also checkpoints and deletes the WAL when the last connection to the
+database closes. While archiving, the archiver keeps a connection of its own
+open so that never happens behind its back, and on start it archives
+whatever an earlier run (or a crash) left in the WAL before anything else.
+
+A segment holds the newest image of each page changed in its interval, so
+replaying segments in order over a base backup taken before them rebuilds
+the database as it was at the end of any later segment. Recovery is
+therefore precise to the archive interval.
+
+Segments and backups are both stamped while holding the application's
+write lock, so every segment is unambiguously before or after a backup.
+Recovery needs a base backup taken after archiving was first started (and
+the app must keep archiving from then on); the archive is capped at
+``WAL_ARCHIVE_MAX_BYTES``, the oldest segments go first, and recovery
+refuses a base backup older than what was pruned.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+import datetime
+import json
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+WAL_ARCHIVE_DIR = os.getenv("WAL_ARCHIVE_DIR", "")
+WAL_ARCHIVE_INTERVAL = float(os.getenv("WAL_ARCHIVE_INTERVAL", "60"))
+WAL_ARCHIVE_MAX_BYTES = int(os.getenv("WAL_ARCHIVE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S_%f"
+WAL_HEADER = struct.Struct(">IIIIIIII")
+FRAME_HEADER = struct.Struct(">IIIIII")
+SEGMENT_HEADER = struct.Struct(">III")
+PAGE_NUMBER = struct.Struct(">I")
+WAL_MAGIC = (0x377F0682, 0x377F0683)
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def read_committed_frames(wal_path: str, start_frame: int = 0,
+                          salts: Optional[Tuple[int, int]] = None) -> Tuple[dict, int, int, Tuple[int, int], int]:
+    """Pages committed in a WAL file from frame ``start_frame`` on.
+
+    Returns ``(pages, db_size, page_size, salts, next_frame)`` where
+    ``pages`` maps page number to its newest committed image. Frames are
+    read until one carries different salts (left over from before the WAL
+    was reset) or the file ends, and only up to the last commit frame.
+    Archiving holds the application's write lock, so there is no torn frame
+    to detect and the frame checksums aren't recomputed.
+    """
+    empty = ({}, 0, 0, salts or (0, 0), start_frame)
+    try:
+        with open(wal_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return empty
+    if len(data) < WAL_HEADER.size:
+        return empty
+    magic, _, page_size, _, salt1, salt2, _, _ = WAL_HEADER.unpack_from(data, 0)
+    if magic not in WAL_MAGIC:
+        raise ValueError(f"{wal_path} is not a WAL file")
+    if salts != (salt1, salt2):
+        # The WAL was reset since the last run; everything in it is new
+        start_frame = 0
+
+    frame_size = FRAME_HEADER.size + page_size
+    pages: Dict[int, bytes] = {}
+    pending: Dict[int, bytes] = {}
+    db_size = 0
+    next_frame = frame = start_frame
+    offset = WAL_HEADER.size + frame * frame_size
+    while offset + frame_size <= len(data):
+        page_number, commit_size, frame_salt1, frame_salt2, _, _ = FRAME_HEADER.unpack_from(data, offset)
+        if (frame_salt1, frame_salt2) != (salt1, salt2):
+            break
+        pending[page_number] = data[offset + FRAME_HEADER.size:offset + frame_size]
+        frame += 1
+        offset += frame_size
+        if commit_size:
+            pages.update(pending)
+            pending = {}
+            db_size = commit_size
+            next_frame = frame
+    return pages, db_size, page_size, (salt1, salt2), next_frame
+
+
+class WalArchiver:
+    """Archives committed WAL pages into segments and replays them for recovery"""
+
+    def __init__(self, db_path: str, archive_dir: str = WAL_ARCHIVE_DIR, engine: Optional[Engine] = None,
+                 write_lock: Optional[threading.Lock] = None, interval: float = WAL_ARCHIVE_INTERVAL,
+                 max_bytes: int = WAL_ARCHIVE_MAX_BYTES, lock_timeout: float = 30):
+        self.db_path = db_path
+        self.wal_path = f"{db_path}-wal"
+        self.archive_dir = archive_dir
+        self.engine = engine
+        self.write_lock = write_lock
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self.state_path = os.path.join(archive_dir, "archive_state.json")
+        os.makedirs(archive_dir, exist_ok=True)
+        self.state = self._load_state()
+        self._archive_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._keepalive: Optional[sqlite3.Connection] = None
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                "salts": [0, 0],
+                "next_frame": 0,
+                "next_segment": 1,
+                "started_at": None,
+                "pruned_until": None,
+            }
+
+    def _save_state(self) -> None:
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def disable_autocheckpoint(self) -> None:
+        """Leave checkpoints to the archiver on every connection the engine hands out"""
+
+        # On checkout rather than connect so connections already in the pool
+        # are covered too. Closing them instead (engine.dispose) could close
+        # the last connection, which checkpoints frames that aren't archived.
+        @event.listens_for(self.engine, "checkout")
+        def _no_autocheckpoint(dbapi_connection, connection_record, connection_proxy):
+            if not connection_record.info.get("wal_autocheckpoint_off"):
+                dbapi_connection.execute("PRAGMA wal_autocheckpoint=0")
+                connection_record.info["wal_autocheckpoint_off"] = True
+
+    def _open_keepalive(self) -> None:
+        if self._keepalive is None:
+            self._keepalive = sqlite3.connect(self.db_path, check_same_thread=False)
+            # A new database isn't in WAL mode until the engine first connects.
+            # Reading opens the WAL; the connection holds no transaction afterwards.
+            self._keepalive.execute("PRAGMA journal_mode=WAL").fetchone()
+            self._keepalive.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+    def _close_keepalive(self) -> None:
+        if self._keepalive is not None:
+            self._keepalive.close()
+            self._keepalive = None
+
+    # Archiving
+
+    def archive_once(self) -> Optional[str]:
+        """Archive newly committed pages, then checkpoint; returns the segment path, if one was written"""
+        with self._archive_lock:
+            if self.write_lock is not None and not self.write_lock.acquire(timeout=self.lock_timeout):
+                logger.warning("WAL archiving skipped: timed out waiting for the database writer")
+                return None
+            try:
+                # Stamped under the write lock, like backups (see BackupManager._copy_online)
+                archived_at = datetime.datetime.now()
+                pages, db_size, page_size, salts, next_frame = read_committed_frames(
+                    self.wal_path, self.state["next_frame"], tuple(self.state["salts"])
+                )
+                segment_path = None
+                if pages:
+                    segment_path = self._write_segment(pages, db_size, page_size, archived_at)
+                self.state.update({"salts": list(salts), "next_frame": next_frame})
+                self._save_state()
+                self._checkpoint()
+            finally:
+                if self.write_lock is not None:
+                    self.write_lock.release()
+            self._enforce_limit()
+            return segment_path
+
+    def _write_segment(self, pages: Dict[int, bytes], db_size: int, page_size: int,
+                       archived_at: datetime.datetime) -> str:
+        timestamp = archived_at.strftime(TIMESTAMP_FORMAT)
+        sequence = self.state["next_segment"]
+        parts = [SEGMENT_HEADER.pack(page_size, db_size, len(pages))]
+        for page_number in sorted(pages):
+            parts.append(PAGE_NUMBER.pack(page_number))
+            parts.append(pages[page_number])
+        path = os.path.join(self.archive_dir, f"{sequence:08d}_{timestamp}.wal.z")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(b"".join(parts), 6))
+        os.replace(tmp_path, path)
+        self.state["next_segment"] = sequence + 1
+        logger.info(f"Archived {len(pages)} WAL pages to {path}")
+        return path
+
+    def _checkpoint(self) -> None:
+        # PASSIVE never waits on readers, so the write lock is held only for
+        # the page copy. It has to stay held: once every frame is copied, the
+        # next writer restarts the WAL from the top, and a frame committed
+        # after our read would be overwritten before it was archived.
+        if self.engine is None:
+            return
+        with self.engine.connect() as conn:
+            busy, log_frames, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        if checkpointed < log_frames:
+            # A reader still holds an old snapshot; frames already archived
+            # are skipped next time because the WAL keeps its salts
+            logger.debug(f"WAL checkpoint incomplete: {checkpointed}/{log_frames} frames")
+
+    def _enforce_limit(self) -> None:
+        segments = self.segments()
+        total = sum(os.path.getsize(path) for _, path in segments)
+        pruned_until = None
+        for timestamp, path in segments:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+            pruned_until = timestamp
+        if pruned_until is not None:
+            self.state["pruned_until"] = pruned_until.strftime(TIMESTAMP_FORMAT)
+            self._save_state()
+            logger.info(f"Pruned WAL archive up to {self.state['pruned_until']}")
+
+    def segments(self) -> List[Tuple[datetime.datetime, str]]:
+        """(archived_at, path) of every segment, oldest first"""
+        result = []
+        for name in sorted(os.listdir(self.archive_dir)):
+            if name.endswith(".wal.z"):
+                result.append((parse_timestamp(name[9:-6]), os.path.join(self.archive_dir, name)))
+        return result
+
+    def archive_bytes(self) -> int:
+        return sum(os.path.getsize(path) for _, path in self.segments())
+
+    # Recovery
+
+    def covers(self, base_time: datetime.datetime) -> bool:
+        """Whether the archive holds every change committed after ``base_time``"""
+        # Another instance (the running app) may have pruned since we loaded it
+        self.state = self._load_state()
+        started_at, pruned_until = self.state.get("started_at"), self.state.get("pruned_until")
+        if started_at is None or parse_timestamp(started_at) > base_time:
+            return False
+        return pruned_until is None or parse_timestamp(pruned_until) <= base_time
+
+    @staticmethod
+    def read_segment(path: str) -> Iterator[Tuple[int, int, int, bytes]]:
+        """Yield (page_size, db_size, page_number, image) for each page in a segment"""
+        with open(path, "rb") as f:
+            data = zlib.decompress(f.read())
+        page_size, db_size, count = SEGMENT_HEADER.unpack_from(data, 0)
+        offset = SEGMENT_HEADER.size
+        for _ in range(count):
+            page_number, = PAGE_NUMBER.unpack_from(data, offset)
+            offset += PAGE_NUMBER.size
+            yield page_size, db_size, page_number, data[offset:offset + page_size]
+            offset += page_size
+
+    def replay(self, db_file: str, after: datetime.datetime, until: datetime.datetime) -> Optional[datetime.datetime]:
+        """Apply segments archived after ``after`` and no later than ``until`` to ``db_file``.
+
+        ``db_file`` must be a copy of the database taken at ``after``.
+        Returns the archive time of the last segment applied (the moment the
+        result corresponds to), or None if there was nothing to apply.
+        """
+        if not self.covers(after):
+            raise ValueError(f"WAL archive doesn't cover everything since {after}; pick a newer base backup")
+        applied = None
+        page_size = db_size = 0
+        with open(db_file, "r+b") as f:
+            for archived_at, path in self.segments():
+                if archived_at <= after or archived_at > until:
+                    continue
+                for page_size, db_size, page_number, image in self.read_segment(path):
+                    f.seek((page_number - 1) * page_size)
+                    f.write(image)
+                applied = archived_at
+            if applied is not None:
+                f.truncate(db_size * page_size)
+        return applied
+
+    # Background loop
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.archive_once()
+            except Exception as e:
+                logger.error(f"WAL archiving failed: {str(e)}")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.engine is not None:
+            self.disable_autocheckpoint()
+        self._open_keepalive()
+        if self.state.get("started_at") is None:
+            self.state["started_at"] = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+            self._save_state()
+        # Frames committed after the last run of a previous process (which
+        # may have crashed) are still in the WAL
+        self.archive_once()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="solarmed-wal-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the loop and archive whatever was committed since the last run"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.archive_once()
+        self._close_keepalive()
+
+
+def create_wal_archiver(archive_dir: str = WAL_ARCHIVE_DIR) -> WalArchiver:
+    """WalArchiver for the application's database, engine and write lock"""
+    from app.db.database import engine, write_lock
+
+    return WalArchiver(engine.url.database, archive_dir, engine=engine, write_lock=write_lock)
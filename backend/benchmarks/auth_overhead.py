@@ -0,0 +1,101 @@
+"""Auth cost per request and login throughput under concurrency.
+
+Part one times ``get_current_user`` for a valid token with the verified-token
+cache disabled (full JWT decode every call) and enabled.
+
+Part two fires ``--logins`` concurrent logins at an app whose login verifies
+bcrypt inline on the event loop and at the real login route, which verifies
+on the bcrypt executor. While the logins run, a ticker coroutine measures
+the worst event-loop stall, which is what every other request would see:
+
+    cd backend
+    python -m benchmarks.auth_overhead --iterations 20000 --logins 8
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from app.api import auth as auth_api
+from app.core import auth
+
+
+async def token_check_cost(token: str, iterations: int, cached: bool) -> float:
+    auth.token_cache.clear()
+    if not cached:
+        auth.token_cache.max_size = 0
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await auth.get_current_user(token)
+        return (time.perf_counter() - start) / iterations
+    finally:
+        auth.token_cache.max_size = auth.TOKEN_CACHE_SIZE
+
+
+def inline_login_app() -> FastAPI:
+    """Login that runs bcrypt on the event loop, as a synchronous call would"""
+    app = FastAPI()
+
+    @app.post("/auth/token")
+    async def login(username: str, password: str):
+        user = auth_api.USERS.get(username)
+        if user is None or not auth.verify_password(password, user["hashed_password"]):
+            raise HTTPException(status_code=401)
+        return {"access_token": auth.create_access_token({"sub": username}), "token_type": "bearer"}
+
+    return app
+
+
+def executor_login_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth_api.router)
+    return app
+
+
+async def login_burst(app: FastAPI, logins: int):
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        interval = 0.01
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            max_lag = max(max_lag, time.perf_counter() - start - interval)
+
+    params = {"username": "healthworker", "password": "secret"}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        tick = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/auth/token", params=params) for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await tick
+    assert all(response.status_code == 200 for response in responses)
+    return logins / elapsed, max_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--logins", type=int, default=8)
+    args = parser.parse_args()
+
+    token = auth.create_access_token({"sub": "healthworker"}, expires_delta=timedelta(minutes=30))
+    uncached = asyncio.run(token_check_cost(token, args.iterations, cached=False))
+    cached = asyncio.run(token_check_cost(token, args.iterations, cached=True))
+    print(f"get_current_user: decode every call={uncached * 1e6:.1f}us cached={cached * 1e6:.1f}us")
+
+    for name, app in (("bcrypt on event loop", inline_login_app()), ("bcrypt on executor", executor_login_app())):
+        rate, lag = asyncio.run(login_burst(app, args.logins))
+        print(f"{name}: {rate:.2f} logins/s, worst event-loop stall {lag * 1000:.0f}ms")
+    print(f"(bcrypt executor workers: {auth.PASSWORD_HASH_WORKERS})")
+
+
+if __name__ == "__main__":
+    main()
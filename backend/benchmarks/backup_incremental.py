@@ -0,0 +1,111 @@
+"""Storage and time of incremental backups against full copies.
+
+Seeds a clinic database, then simulates ``--days`` of activity: each day
+registers patients, records diagnoses, marks some of them synced and logs an
+energy reading every five minutes. After each day it takes both a full
+backup (``create_backup``) and an incremental one
+(``create_incremental_backup``), keeping every restore point, and finally
+restores the oldest snapshot to check it reassembles:
+
+    cd backend
+    python -m benchmarks.backup_incremental --days 30
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def simulate_day(engine, day: datetime, patients: int, diagnoses: int, rng: random.Random) -> None:
+    from sqlalchemy import func, select, update
+
+    from app.db.models import Diagnosis, EnergyLog, Patient
+
+    with engine.begin() as conn:
+        first_id = (conn.execute(select(func.max(Patient.id))).scalar() or 0) + 1
+        conn.execute(Patient.__table__.insert(), [{
+            "first_name": f"Patient{first_id + i}",
+            "last_name": rng.choice(["Okello", "Namuli", "Achieng", "Mwangi", "Banda", "Phiri"]),
+            "gender": rng.choice(["male", "female"]),
+            "village": f"Village {rng.randrange(40)}",
+            "district": f"District {rng.randrange(8)}",
+            "created_at": day,
+            "updated_at": day,
+        } for i in range(patients)])
+        last_id = first_id + patients - 1
+        conn.execute(Diagnosis.__table__.insert(), [{
+            "patient_id": rng.randint(1, last_id),
+            "diagnosis_type": rng.choice(["malaria", "covid", "maternal", "general"]),
+            "symptoms": rng.sample(["fever", "headache", "chills", "cough", "fatigue", "nausea"], 3),
+            "notes": "Seen at clinic; follow up in one week.",
+            "status": "completed",
+            "confidence": rng.random(),
+            "created_at": day,
+            "updated_at": day,
+        } for _ in range(diagnoses)])
+        conn.execute(EnergyLog.__table__.insert(), [{
+            "battery_level": 50 + 40 * rng.random(),
+            "solar_input": max(0.0, 300 * (1 - abs(step - 144) / 72)),
+            "power_consumption": 80 + 20 * rng.random(),
+            "timestamp": day + timedelta(minutes=5 * step),
+        } for step in range(288)])
+        # Yesterday's records get synced once the uplink comes back
+        conn.execute(
+            update(Diagnosis).where(Diagnosis.created_at < day, Diagnosis.is_synced == False).values(is_synced=True)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed-patients", type=int, default=20000)
+    parser.add_argument("--patients-per-day", type=int, default=40)
+    parser.add_argument("--diagnoses-per-day", type=int, default=60)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-incremental-")
+    db_path = os.path.join(workdir, "clinic.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from app.backup import BackupManager
+    from app.db.database import engine
+    from app.db.migrations import migrate
+
+    migrate(engine)
+    rng = random.Random(42)
+    start_day = datetime(2024, 1, 1)
+    simulate_day(engine, start_day - timedelta(days=1), args.seed_patients, args.seed_patients * 2, rng)
+    manager = BackupManager(db_path, os.path.join(workdir, "backups"), step_sleep=0)
+
+    full_seconds = incremental_seconds = 0.0
+    try:
+        for day in range(args.days):
+            simulate_day(engine, start_day + timedelta(days=day), args.patients_per_day, args.diagnoses_per_day, rng)
+            start = time.perf_counter()
+            manager.create_backup()
+            full_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            manager.create_incremental_backup()
+            incremental_seconds += time.perf_counter() - start
+
+        full_bytes = sum(backup["size"] for backup in manager.list_backups())
+        incremental_bytes = manager.chunk_store.stored_bytes()
+        print(f"database after {args.days} days: {os.path.getsize(db_path) / 2**20:.1f} MiB")
+        print(f"full copies:  {full_bytes / 2**20:8.1f} MiB, {full_seconds / args.days * 1000:6.0f}ms per backup")
+        print(f"incremental:  {incremental_bytes / 2**20:8.1f} MiB, "
+              f"{incremental_seconds / args.days * 1000:6.0f}ms per backup")
+        print(f"storage ratio (full / incremental): {full_bytes / incremental_bytes:.1f}x")
+
+        oldest = manager.list_snapshots()[-1]["id"]
+        start = time.perf_counter()
+        manager.restore_snapshot(oldest)
+        print(f"restored oldest snapshot {oldest} in {time.perf_counter() - start:.2f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Backup duration and its effect on request latency.
+
+Builds a database of ``--size-mb`` (patients plus a filler table of random
+blobs), then runs a request-like workload, a small indexed read followed by
+a one-row insert through the app's sessions, in three phases:
+
+- idle: no backup running
+- file copy: the old ``shutil.copy2`` backup
+- online: ``BackupManager.create_backup_async`` (sqlite3 backup API in steps)
+
+and prints p50/p95/max latency of the workload in each phase along with the
+backup's duration:
+
+    cd backend
+    python -m benchmarks.backup_online --size-mb 2048
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+
+def build_database(path: str, size_mb: int) -> None:
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS backup_filler (id INTEGER PRIMARY KEY, payload BLOB)")
+    # 64 KiB rows, inserted 16 MiB per transaction
+    rows = size_mb * 16
+    for start in range(0, rows, 256):
+        count = min(256, rows - start)
+        with conn:
+            conn.execute(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+                "INSERT INTO backup_filler (payload) SELECT randomblob(65536) FROM n",
+                (count,),
+            )
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def run_workload(duration: float, backup=None):
+    """Run requests for ``duration`` seconds (or until ``backup`` finishes); returns latencies and backup time"""
+    from app.db.database import ReadSessionLocal, SessionLocal
+    from app.db.models import Patient
+
+    latencies = []
+    backup_seconds = None
+    done = threading.Event()
+
+    def run_backup():
+        nonlocal backup_seconds
+        start = time.perf_counter()
+        backup()
+        backup_seconds = time.perf_counter() - start
+        done.set()
+
+    if backup is not None:
+        threading.Thread(target=run_backup, daemon=True).start()
+    deadline = time.perf_counter() + duration
+    while (not done.is_set()) if backup is not None else time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with ReadSessionLocal() as session:
+            session.query(Patient).filter(Patient.id == 1).first()
+        with SessionLocal() as session:
+            session.add(Patient(first_name="Bench", last_name="Latency", district="Kampala"))
+            session.commit()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.005)
+    return latencies, backup_seconds
+
+
+def report(name: str, latencies, backup_seconds=None) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) >= 20 else ordered[-1]
+    line = (f"{name:10s} requests={len(ordered):6d} p50={statistics.median(ordered) * 1000:7.2f}ms "
+            f"p95={p95 * 1000:7.2f}ms max={ordered[-1] * 1000:8.2f}ms")
+    if backup_seconds is not None:
+        line += f" backup={backup_seconds:.1f}s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--workdir", default=None, help="directory for the database and backups (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="solarmed-backup-")
+    db_path = os.path.join(workdir, "bench.db")
+    backup_dir = os.path.join(workdir, "backups")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    start = time.perf_counter()
+    build_database(db_path, args.size_mb)
+    from app.db.database import engine
+    from app.db.migrations import migrate
+    migrate(engine)
+    print(f"built {os.path.getsize(db_path) / 2**20:.0f} MiB database in {time.perf_counter() - start:.1f}s")
+
+    from app.backup import create_backup_manager
+    manager = create_backup_manager(backup_dir)
+    copy_path = os.path.join(workdir, "copy.db")
+
+    try:
+        report("idle", *run_workload(args.idle_seconds))
+        report("file copy", *run_workload(0, backup=lambda: shutil.copy2(db_path, copy_path)))
+        os.remove(copy_path)
+        report("online", *run_workload(0, backup=lambda: manager.create_backup_async().result()))
+        print(f"online backup: {manager.pages_per_step} pages/step, {manager.step_sleep * 1000:.0f}ms between steps")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Bytes on the wire and CPU cost of response compression per size class.
+
+Builds realistic JSON payloads (patient lists, diagnosis histories, energy
+series) at several sizes and compresses each with every available encoder.
+Reports the compressed size, the ratio, CPU time per response and the
+transfer time saved on a 2G-class link:
+
+    cd backend
+    python -m benchmarks.compression --link-kbps 40
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.core.compression import COMPRESSION_MINIMUM_SIZE, ENCODERS
+
+SIZE_CLASSES = [("1KB", 1024), ("10KB", 10 * 1024), ("100KB", 100 * 1024), ("1MB", 1024 * 1024)]
+VILLAGES = ["Gulu", "Lira", "Kitgum", "Arua", "Moroto", "Soroti", "Mbale", "Kabale"]
+SYMPTOMS = ["fever", "chills", "headache", "nausea", "cough", "fatigue", "chest pain", "dizziness"]
+
+
+def patient(rng: random.Random, i: int) -> dict:
+    village = rng.choice(VILLAGES)
+    return {
+        "id": i,
+        "first_name": rng.choice(["Amina", "Okello", "Grace", "Moses", "Sarah", "Joseph"]),
+        "last_name": rng.choice(["Achieng", "Odongo", "Nakato", "Mugisha", "Atim", "Okot"]),
+        "date_of_birth": (datetime(1950, 1, 1) + timedelta(days=rng.randint(0, 25000))).isoformat(),
+        "gender": rng.choice(["male", "female"]),
+        "phone_number": f"+2567{rng.randint(10000000, 99999999)}",
+        "village": village,
+        "district": village,
+        "qr_code": f"SM-{i:06d}",
+        "created_at": datetime(2024, 1, 1).isoformat(),
+        "is_synced": rng.random() < 0.5,
+    }
+
+
+def diagnosis(rng: random.Random, i: int) -> dict:
+    return {
+        "id": i,
+        "patient_id": rng.randint(1, 500),
+        "symptoms": rng.sample(SYMPTOMS, 3),
+        "diagnosis": rng.choice(["malaria", "pneumonia", "tuberculosis", "hypertension"]),
+        "confidence": round(rng.uniform(0.5, 0.99), 2),
+        "status": "completed",
+        "created_at": (datetime(2024, 1, 1) + timedelta(minutes=i * 17)).isoformat(),
+    }
+
+
+def energy(rng: random.Random, i: int) -> dict:
+    return {
+        "id": i,
+        "battery_level": round(rng.uniform(20, 100), 1),
+        "solar_input": round(rng.uniform(0, 250), 1),
+        "power_consumption": round(rng.uniform(20, 120), 1),
+        "timestamp": (datetime(2024, 1, 1) + timedelta(minutes=i * 5)).isoformat(),
+        "synced": False,
+    }
+
+
+def payload(kind, size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    items, length = [], 2
+    while length < size:
+        item = kind(rng, len(items) + 1)
+        items.append(item)
+        length += len(json.dumps(item)) + 2
+    return json.dumps(items).encode()
+
+
+def cpu_seconds(encoding: str, body: bytes, repeats: int) -> float:
+    start = time.process_time()
+    for _ in range(repeats):
+        ENCODERS[encoding]().finish(body)
+    return (time.process_time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--link-kbps", type=float, default=40.0, help="link speed used for transfer estimates")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    bytes_per_second = args.link_kbps * 1000 / 8
+    print(f"encoders: {', '.join(ENCODERS)}; minimum size {COMPRESSION_MINIMUM_SIZE} bytes; "
+          f"link {args.link_kbps:g} kbit/s")
+    print(f"{'payload':<12}{'class':>7}{'enc':>6}{'wire bytes':>12}{'ratio':>8}{'cpu ms':>9}{'saved s':>9}")
+    for kind in (patient, diagnosis, energy):
+        for label, size in SIZE_CLASSES:
+            body = payload(kind, size, args.seed)
+            repeats = max(3, 2_000_000 // len(body))
+            print(f"{kind.__name__:<12}{label:>7}{'-':>6}{len(body):>12}{1.0:>8.2f}{0.0:>9.3f}{0.0:>9.2f}")
+            for encoding in ENCODERS:
+                wire = len(ENCODERS[encoding]().finish(body))
+                cpu_ms = cpu_seconds(encoding, body, repeats) * 1000
+                saved = (len(body) - wire) / bytes_per_second
+                print(f"{'':<12}{'':>7}{encoding:>6}{wire:>12}{len(body) / wire:>8.2f}{cpu_ms:>9.3f}{saved:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
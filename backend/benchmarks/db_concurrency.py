@@ -0,0 +1,168 @@
+"""Mixed read/write concurrency benchmark for the SQLite storage profiles.
+
+Runs reader and writer threads against a scratch database and reports
+p50/p99 latency per operation for each profile. Outside the legacy profile
+write sessions go through the same serialized writer as the app, so a
+"database is locked" error there is a failure, not contention:
+
+    cd backend
+    python -m benchmarks.db_concurrency --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import sys
+import time
+from typing import Dict, List
+
+from sqlalchemy import column, create_engine, insert, table, text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+
+from app.db import storage
+
+bench_diagnoses = table("bench_diagnoses", column("patient_id"), column("symptoms"),
+                        column("confidence"), column("created_at"))
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _seed(engine, rows: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE bench_diagnoses (id INTEGER PRIMARY KEY, patient_id INTEGER, "
+            "symptoms TEXT, confidence REAL, created_at REAL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_bench_patient ON bench_diagnoses (patient_id)"))
+        conn.execute(
+            text("INSERT INTO bench_diagnoses (patient_id, symptoms, confidence, created_at) "
+                 "VALUES (:p, :s, :c, :t)"),
+            [{"p": i % 500, "s": "fever, chills", "c": 0.5, "t": time.time()} for i in range(rows)],
+        )
+
+
+def run_profile(profile: str, readers: int, writers: int, seconds: float, rows: int) -> Dict[str, Dict[str, float]]:
+    workdir = tempfile.mkdtemp(prefix="solarmed-bench-")
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    if profile == "legacy":
+        # Previous setup: one default engine shared by reads and writes
+        writer = reader = create_engine(url, connect_args={"check_same_thread": False})
+        _seed(writer, rows)
+    else:
+        writer = storage.create_writer_engine(url, profile)
+        _seed(writer, rows)
+        reader = storage.create_reader_engine(url, writer, profile)
+    WriteSession = sessionmaker(bind=writer)
+    ReadSession = sessionmaker(bind=reader)
+    serialized = profile != "legacy"
+    if serialized:
+        # Same write path as app.db.database
+        storage.serialize_writes(WriteSession, write_lock=storage.create_write_lock())
+
+    latencies: Dict[str, List[float]] = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    failures = {"read": 0, "write": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def read_loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with ReadSession() as session:
+                    session.execute(
+                        text("SELECT * FROM bench_diagnoses WHERE patient_id = :p"),
+                        {"p": random.randrange(500)},
+                    ).fetchall()
+                elapsed = time.perf_counter() - start
+            except OperationalError:
+                with lock:
+                    (failures if serialized else errors)["read"] += 1
+                continue
+            with lock:
+                latencies["read"].append(elapsed)
+
+    def write_loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with WriteSession() as session:
+                    # A Core insert, not text(), so serialize_writes sees the DML
+                    session.execute(insert(bench_diagnoses).values(
+                        patient_id=random.randrange(500), symptoms="cough", confidence=0.7,
+                        created_at=time.time(),
+                    ))
+                    session.commit()
+                elapsed = time.perf_counter() - start
+            except PoolTimeoutError:
+                # Waited longer than WRITE_LOCK_TIMEOUT for the writer
+                with lock:
+                    errors["write"] += 1
+                continue
+            except OperationalError:
+                with lock:
+                    (failures if serialized else errors)["write"] += 1
+                continue
+            with lock:
+                latencies["write"].append(elapsed)
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads += [threading.Thread(target=write_loop) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    writer.dispose()
+    if reader is not writer:
+        reader.dispose()
+
+    results = {}
+    for kind, samples in latencies.items():
+        results[kind] = {
+            "ops": len(samples),
+            "ops_per_sec": len(samples) / seconds,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+            "mean_ms": (statistics.mean(samples) * 1000) if samples else 0.0,
+            "errors": errors[kind],
+            "failures": failures[kind],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="legacy,balanced,durable")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'op':<6} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'failures':>9}")
+    failed = []
+    for profile in args.profiles.split(","):
+        results = run_profile(profile, args.readers, args.writers, args.seconds, args.rows)
+        for kind, stats in results.items():
+            print(f"{profile:<10} {kind:<6} {stats['ops_per_sec']:>9.1f} {stats['p50_ms']:>9.2f} "
+                  f"{stats['p99_ms']:>9.2f} {stats['errors']:>7} {stats['failures']:>9}")
+            if stats["failures"]:
+                failed.append(f"{profile} {kind}")
+    if failed:
+        print(f"FAILED: OperationalError on the serialized write path ({', '.join(failed)})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Deterministic synthetic clinic data for scale testing.
+
+Bulk-writes patients, diagnoses and energy readings straight into a SQLite
+database (created and migrated if needed), reproducibly from ``--seed``:
+
+- patients with East African names, districts and villages, registered
+  evenly over the time span
+- diagnoses for random earlier-registered patients, each drawn from a
+  disease in ``app.api.diagnose.DIAGNOSES`` with a subset of its symptom set
+  (plus the occasional unrelated symptom) and a matching prediction
+- energy readings every ``--energy-interval`` minutes following an
+  equatorial day/night solar curve with per-day cloud cover, clinic-hours
+  load and a battery that charges and drains accordingly
+
+Every table has its own random stream, so changing one row count doesn't
+change the rows generated for the others. Rows are appended; ids continue
+from what is already in the database. Secondary indexes are dropped during
+the load and rebuilt at the end, which is much faster than maintaining them
+row by row:
+
+    cd backend
+    python -m benchmarks.generate_data --database clinic.db --patients 200000 \\
+        --diagnoses 600000 --days 365 --seed 7
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+FIRST_NAMES = ["Aisha", "Amina", "Akello", "Apio", "Babirye", "Nakato", "Namubiru", "Nansubuga", "Atim",
+               "Grace", "Joy", "Mercy", "Sarah", "Esther", "Brian", "Isaac", "Joseph", "Moses", "Okello",
+               "Opio", "Mugisha", "Kato", "Wasswa", "Ssemakula", "Tumusiime", "David", "Peter", "Samuel"]
+LAST_NAMES = ["Okello", "Namuli", "Achieng", "Mugisha", "Auma", "Ssempa", "Nabukenya", "Ochieng", "Byaruhanga",
+              "Tumwine", "Kiggundu", "Odongo", "Akena", "Nankya", "Wamala", "Lubega", "Mutebi", "Atuhaire"]
+DISTRICTS = ["Kampala", "Gulu", "Mbarara", "Jinja", "Lira", "Arua", "Mbale", "Kasese", "Soroti", "Hoima",
+             "Masaka", "Kabale", "Tororo", "Moroto", "Fort Portal", "Kitgum"]
+VILLAGES_PER_DISTRICT = 25
+# Relative frequency of each DIAGNOSES entry among clinic visits
+DISEASE_WEIGHTS = {"malaria": 35, "pneumonia": 14, "covid19": 8, "tuberculosis": 5,
+                   "maternal_complication": 12, "diabetes": 9, "hypertension": 17}
+DIAGNOSIS_TYPES = {"malaria": "malaria", "covid19": "covid", "maternal_complication": "maternal"}
+NOTES = [None, "Follow up in one week.", "Referred to district hospital.", "Prescribed first-line treatment.",
+         "Advised rest and fluids.", "Lab confirmation requested."]
+DEFAULT_END = "2025-01-01"
+TABLES = ("patients", "diagnoses", "energy_logs")
+
+# Solar system on a clinic roof: panel peak (W), battery capacity (Wh),
+# sunrise/sunset hours (near the equator, roughly constant year round)
+PANEL_PEAK_W = 60.0
+BATTERY_WH = 300.0
+SUNRISE, SUNSET = 6.5, 18.75
+
+
+def sqlite_datetime(value: datetime) -> str:
+    """The text SQLAlchemy's SQLite DateTime type stores"""
+    return value.isoformat(" ", "microseconds")
+
+
+def write_attachments(upload_dir: str, count: int, rng: random.Random) -> Tuple[List[str], List[str]]:
+    """Small fake JPEG and WAV files that generated diagnoses can point at"""
+    images, voices = [], []
+    os.makedirs(os.path.join(upload_dir, "images"), exist_ok=True)
+    os.makedirs(os.path.join(upload_dir, "voice"), exist_ok=True)
+    for i in range(count):
+        image = os.path.join(upload_dir, "images", f"seed_{i}.jpg")
+        with open(image, "wb") as f:
+            f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(48 * 1024) + b"\xff\xd9")
+        voice = os.path.join(upload_dir, "voice", f"seed_{i}.wav")
+        with open(voice, "wb") as f:
+            f.write(b"RIFF" + rng.randbytes(96 * 1024))
+        images.append(image)
+        voices.append(voice)
+    return images, voices
+
+
+# Row generators. Each yields tuples in the column order of its INSERT.
+
+PATIENT_COLUMNS = ("id", "first_name", "last_name", "date_of_birth", "gender", "phone_number", "address",
+                   "village", "district", "qr_code", "created_at", "updated_at", "is_synced")
+DIAGNOSIS_COLUMNS = ("id", "patient_id", "diagnosis_type", "symptoms", "diagnosis", "notes", "image_path",
+                     "voice_path", "status", "prediction", "confidence", "created_at", "updated_at", "is_synced")
+ENERGY_COLUMNS = ("id", "battery_level", "solar_input", "power_consumption", "timestamp", "synced")
+
+
+def patient_rows(rng: random.Random, first_id: int, count: int, start: datetime,
+                 span_seconds: float) -> Iterator[tuple]:
+    villages = [(district, f"{district} Village {v + 1}") for district in DISTRICTS
+                for v in range(VILLAGES_PER_DISTRICT)]
+    random_, choice = rng.random, rng.choice
+    step = span_seconds / max(1, count)
+    for i in range(count):
+        patient_id = first_id + i
+        district, village = choice(villages)
+        registered = start + timedelta(seconds=i * step + random_() * step)
+        birth = registered - timedelta(days=365 * (1 + 79 * random_() ** 1.6))
+        created = sqlite_datetime(registered)
+        yield (
+            patient_id, choice(FIRST_NAMES), choice(LAST_NAMES), sqlite_datetime(birth),
+            "female" if random_() < 0.54 else "male",
+            f"+2567{int(random_() * 1e8):08d}" if random_() < 0.7 else None,
+            None, village, district, f"SM{patient_id:09d}", created, created,
+            1 if random_() < 0.8 else 0,
+        )
+
+
+def diagnosis_rows(rng: random.Random, first_id: int, count: int, first_patient: int, patients: int,
+                   start: datetime, span_seconds: float, attachments: Optional[Tuple[List[str], List[str]]],
+                   symptom_sets: Dict[str, List[str]]) -> Iterator[tuple]:
+    diseases = [disease for disease in DISEASE_WEIGHTS if disease in symptom_sets]
+    weights = [DISEASE_WEIGHTS[disease] for disease in diseases]
+    # Pre-draw diseases in bulk; choices() with weights is far cheaper per row this way
+    drawn = rng.choices(diseases, weights, k=count)
+    all_symptoms = sorted({symptom for symptoms in symptom_sets.values() for symptom in symptoms})
+    random_, choice, sample = rng.random, rng.choice, rng.sample
+    patient_step = span_seconds / max(1, patients)
+    for i in range(count):
+        disease = drawn[i]
+        # Patients registered in order, so a patient index fixes the earliest visit time
+        index = int(random_() * patients)
+        registered = index * patient_step
+        visit = start + timedelta(seconds=registered + random_() * (span_seconds - registered))
+        disease_symptoms = symptom_sets[disease]
+        symptoms = sample(disease_symptoms, 1 + int(random_() * len(disease_symptoms)))
+        if random_() < 0.15:
+            symptoms.append(choice(all_symptoms))
+        confidence = round(0.45 + 0.5 * random_(), 3)
+        image = voice = None
+        if attachments is not None:
+            if random_() < 0.2:
+                image = choice(attachments[0])
+            if random_() < 0.1:
+                voice = choice(attachments[1])
+        when = sqlite_datetime(visit)
+        yield (
+            first_id + i, first_patient + index, DIAGNOSIS_TYPES.get(disease, "general"), json.dumps(symptoms),
+            disease, choice(NOTES), image, voice, "completed" if random_() < 0.95 else "pending",
+            json.dumps({disease: confidence}), confidence, when, when, 1 if random_() < 0.8 else 0,
+        )
+
+
+def solar_output(hour: float, cloud: float) -> float:
+    """Panel output (W) at a fractional hour of the day, scaled by cloud cover"""
+    if not SUNRISE < hour < SUNSET:
+        return 0.0
+    return PANEL_PEAK_W * math.sin(math.pi * (hour - SUNRISE) / (SUNSET - SUNRISE)) * cloud
+
+
+def energy_rows(rng: random.Random, first_id: int, start: datetime, days: int,
+                interval_minutes: float) -> Iterator[tuple]:
+    random_, gauss = rng.random, rng.gauss
+    per_day = int(24 * 60 / interval_minutes)
+    step_hours = interval_minutes / 60
+    battery = 80.0
+    row_id = first_id
+    for day in range(days):
+        # Some days are overcast; cloud also drifts within the day
+        cloud = 0.35 + 0.65 * random_() ** 0.5
+        for step in range(per_day):
+            hour = step * step_hours
+            cloud = min(1.0, max(0.1, cloud + gauss(0, 0.03)))
+            solar = solar_output(hour, cloud)
+            # Lights, fridge and devices: busiest during clinic hours
+            load = 6.0 + (6.0 if 8 <= hour < 17 else 0.0) + 2.0 * random_()
+            battery = min(100.0, max(5.0, battery + (solar - load) * step_hours / BATTERY_WH * 100))
+            when = start + timedelta(days=day, hours=hour)
+            yield (row_id, round(battery, 2), round(solar, 2), round(load, 2), sqlite_datetime(when), 1)
+            row_id += 1
+
+
+# Bulk loading
+
+def _batches(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _drop_indexes(conn: sqlite3.Connection, tables: Sequence[str]) -> List[str]:
+    placeholders = ", ".join("?" for _ in tables)
+    indexes = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND tbl_name IN ({placeholders})", tuple(tables)
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def _next_id(conn: sqlite3.Connection, table: str) -> int:
+    return (conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0) + 1
+
+
+def generate(db_path: str, patients: int, diagnoses: int, days: int, end: datetime, seed: int,
+             energy_interval: float = 5.0, attachments_dir: Optional[str] = None, batch_size: int = 50000,
+             rebuild_indexes: bool = True) -> Dict[str, Dict[str, float]]:
+    """Append generated rows to ``db_path``; returns rows and seconds per table"""
+    from app.api.diagnose import DIAGNOSES
+    from app.db.surveillance import REBUILD_STATEMENTS
+
+    start = end - timedelta(days=days)
+    span_seconds = days * 86400.0
+    attachments = None
+    if attachments_dir:
+        attachments = write_attachments(attachments_dir, 20, random.Random(f"{seed}:attachments"))
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    stats: Dict[str, Dict[str, float]] = {}
+    try:
+        # Bulk-load settings for this connection only; a crash mid-load means
+        # regenerating, which is fine for test data
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-131072")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        first_patient = _next_id(conn, "patients")
+        plans = {
+            "patients": (PATIENT_COLUMNS, patient_rows(
+                random.Random(f"{seed}:patients"), first_patient, patients, start, span_seconds)),
+            "diagnoses": (DIAGNOSIS_COLUMNS, diagnosis_rows(
+                random.Random(f"{seed}:diagnoses"), _next_id(conn, "diagnoses"), diagnoses if patients else 0,
+                first_patient, patients, start, span_seconds, attachments, DIAGNOSES)),
+            "energy_logs": (ENERGY_COLUMNS, energy_rows(
+                random.Random(f"{seed}:energy"), _next_id(conn, "energy_logs"), start, days, energy_interval)),
+        }
+        index_sql = _drop_indexes(conn, TABLES) if rebuild_indexes else []
+        for table, (columns, rows) in plans.items():
+            began = time.perf_counter()
+            insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+            count = 0
+            for batch in _batches(rows, batch_size):
+                conn.execute("BEGIN")
+                conn.executemany(insert, batch)
+                conn.execute("COMMIT")
+                count += len(batch)
+            stats[table] = {"rows": count, "seconds": time.perf_counter() - began}
+        if index_sql:
+            began = time.perf_counter()
+            for sql in index_sql:
+                conn.execute(sql)
+            stats["indexes"] = {"rows": len(index_sql), "seconds": time.perf_counter() - began}
+        # Raw inserts bypass the ORM events that maintain the surveillance counts
+        began = time.perf_counter()
+        conn.execute("BEGIN")
+        for sql in REBUILD_STATEMENTS:
+            conn.execute(sql)
+        conn.execute("COMMIT")
+        stats["surveillance_weekly"] = {"rows": conn.execute("SELECT count(*) FROM surveillance_weekly").fetchone()[0],
+                                        "seconds": time.perf_counter() - began}
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=None,
+                        help="SQLite file to write (default: the DATABASE_URL file, else ./solarmed.db)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--patients", type=int, default=100000)
+    parser.add_argument("--diagnoses", type=int, default=300000)
+    parser.add_argument("--days", type=int, default=365, help="time span covered by the data")
+    parser.add_argument("--end", default=DEFAULT_END, help="end of the time span, YYYY-MM-DD (fixed for reproducibility)")
+    parser.add_argument("--energy-interval", type=float, default=5.0, help="minutes between energy readings")
+    parser.add_argument("--attachments-dir", default=None,
+                        help="write fake image/voice files here and attach them to some diagnoses")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--keep-indexes", action="store_true", help="maintain indexes during the load")
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    from app.db.database import engine
+    from app.db.migrations import migrate
+
+    migrate(engine)
+    db_path = engine.url.database
+    engine.dispose()
+
+    began = time.perf_counter()
+    stats = generate(db_path, args.patients, args.diagnoses, args.days, datetime.fromisoformat(args.end),
+                     args.seed, args.energy_interval, args.attachments_dir, args.batch_size,
+                     rebuild_indexes=not args.keep_indexes)
+    elapsed = time.perf_counter() - began
+    total = sum(stats[table]["rows"] for table in TABLES)
+    for table, result in stats.items():
+        unit = "indexes" if table == "indexes" else "rows"
+        print(f"{table:19s} {int(result['rows']):9d} {unit:7s} in {result['seconds']:6.2f}s")
+    print(f"{total} rows into {db_path} in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""List endpoint serialization: response_model vs the fast JSON path.
+
+Seeds a synthetic clinic, then for each list endpoint measures:
+
+- the full request in-process (routing, auth, query, serialization) with
+  the default ``response_model`` path and with ``FAST_JSON_RESPONSES``,
+  paging through the data with random offsets so the patient page cache
+  rarely hits
+- serialization alone for one ``--limit`` row page: ORM objects through
+  FastAPI's ``serialize_response`` and ``json.dumps``, versus tuples
+  through ``RowEncoder`` (validated and trusted)
+
+and checks that both paths return the same JSON:
+
+    cd backend
+    python -m benchmarks.json_lists --limit 100 --requests 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+# endpoint -> (router module, ORM model, RowEncoder attribute in the router, path)
+ENDPOINTS = {
+    "patients.list": ("app.api.patients", "Patient", "patient_rows", "/patients/api/patients/"),
+    "diagnoses.list": ("app.api.diagnoses", "Diagnosis", "diagnosis_rows", "/diagnoses/"),
+    "energy.list": ("app.api.energy", "EnergyLog", "energy_log_rows", "/api/energy/"),
+}
+
+
+def set_fast_json(enabled: bool) -> None:
+    """Flip the flag each router read at import"""
+    import importlib
+
+    for module, _, _, _ in ENDPOINTS.values():
+        importlib.import_module(module).FAST_JSON_RESPONSES = enabled
+
+
+def time_calls(fn, repeat: int) -> float:
+    """Median seconds per call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+async def time_requests(client: httpx.AsyncClient, path: str, total: int, limit: int, requests: int, seed: int):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(requests):
+        params = {"skip": rng.randrange(0, max(1, total - limit)), "limit": limit}
+        start = time.perf_counter()
+        response = await client.get(path, params=params)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def serialization_only(name: str, limit: int, repeat: int):
+    """Median seconds to turn one page into JSON bytes, per path"""
+    import importlib
+
+    from fastapi.routing import serialize_response
+
+    from app.db import models
+    from app.db.database import ReadSessionLocal
+
+    module_name, model_name, encoder_name, _ = ENDPOINTS[name]
+    module = importlib.import_module(module_name)
+    model = getattr(models, model_name)
+    encoder = getattr(module, encoder_name)
+    route = next(route for route in module.router.routes if route.path.rstrip("/") == module.router.prefix
+                 and "GET" in route.methods)
+    with ReadSessionLocal() as db:
+        objects = db.query(model).limit(limit).all()
+        rows = db.query(*encoder.columns(model)).limit(limit).all()
+
+        def default_path():
+            content = asyncio.run(serialize_response(field=route.response_field, response_content=objects,
+                                                     is_coroutine=False))
+            return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        validated = type(encoder)(encoder.schema)
+        trusted = type(encoder)(encoder.schema, trusted=True)
+        default_body = default_path()
+        same = json.loads(default_body) == json.loads(validated.encode(rows)) == json.loads(trusted.encode(rows))
+        return {
+            "default": time_calls(default_path, repeat),
+            "validated": time_calls(lambda: validated.encode(rows), repeat),
+            "trusted": time_calls(lambda: trusted.encode(rows), repeat),
+            "same_json": same,
+        }
+
+
+async def run_requests(app, args, sizes):
+    from benchmarks.load_test import authenticate
+
+    totals = {"patients.list": sizes["patients"], "diagnoses.list": sizes["diagnoses"],
+              "energy.list": sizes["energy_readings"]}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        await authenticate(client)
+        for name, (_, _, _, path) in ENDPOINTS.items():
+            bodies = {}
+            for mode in ("default", "fast"):
+                set_fast_json(mode == "fast")
+                # Same page in both modes to compare output, then the timed run
+                response = await client.get(path, params={"skip": 0, "limit": args.limit})
+                bodies[mode] = response.json()
+                results[(name, mode)] = await time_requests(client, path, totals[name], args.limit,
+                                                            args.requests, args.seed)
+            results[(name, "same_json")] = bodies["default"] == bodies["fast"]
+    set_fast_json(False)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=100, help="rows per page")
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint and mode")
+    parser.add_argument("--repeat", type=int, default=200, help="serialization-only repetitions")
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--diagnoses", type=int, default=60000)
+    parser.add_argument("--energy-days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-json-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'clinic.db')}"
+    os.environ["LOG_FILE"] = os.path.join(workdir, "app.log")
+    os.environ["RATE_LIMIT_REQUESTS"] = str(10 ** 9)
+    try:
+        from app.db.database import engine
+        from app.db.migrations import migrate
+        from benchmarks.generate_data import generate
+        from benchmarks.load_test import create_app
+
+        migrate(engine)
+        stats = generate(engine.url.database, args.patients, args.diagnoses, args.energy_days,
+                         datetime(2025, 1, 1), args.seed)
+        sizes = {"patients": args.patients, "diagnoses": args.diagnoses,
+                 "energy_readings": int(stats["energy_logs"]["rows"])}
+        engine.dispose()
+
+        print(f"serialization only, {args.limit} rows (median per page):")
+        print(f"  {'endpoint':16s} {'default':>9s} {'validated':>16s} {'trusted':>16s}  same JSON")
+        for name in ENDPOINTS:
+            result = serialization_only(name, args.limit, args.repeat)
+            print(f"  {name:16s} {result['default'] * 1e3:7.2f}ms "
+                  f"{result['validated'] * 1e3:7.2f}ms ({result['default'] / result['validated']:4.1f}x) "
+                  f"{result['trusted'] * 1e3:7.2f}ms ({result['default'] / result['trusted']:4.1f}x)  "
+                  f"{result['same_json']}")
+
+        app = create_app()
+        results = asyncio.run(run_requests(app, args, sizes))
+        print(f"\nfull request, {args.limit} rows, {args.requests} requests (median / p95):")
+        print(f"  {'endpoint':16s} {'default':>19s} {'fast':>19s} {'speedup':>8s}  same JSON")
+        for name in ENDPOINTS:
+            default, fast = results[(name, "default")], results[(name, "fast")]
+            print(f"  {name:16s} {default[0] * 1e3:7.2f} / {default[1] * 1e3:7.2f}ms "
+                  f"{fast[0] * 1e3:7.2f} / {fast[1] * 1e3:7.2f}ms {default[0] / fast[0]:7.1f}x  "
+                  f"{results[(name, 'same_json')]}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
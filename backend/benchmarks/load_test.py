@@ -0,0 +1,432 @@
+"""Endpoint load test against a seeded synthetic clinic.
+
+Seeds a fresh database with patients, diagnoses (some with image and voice
+attachments on disk) and a year of five-minute energy readings, then drives
+the app with ``--concurrency`` closed-loop clients for ``--duration``
+seconds. Each client picks endpoints by weight from ``SCENARIOS``, and the
+test reports p50/p95/p99 latency, throughput and errors per endpoint.
+
+The app is the one ``app.main`` serves (see ``create_app``). It runs
+in-process through httpx's ASGI transport (``--mode inprocess``) or as a
+local uvicorn server with ``--workers`` processes (``--mode uvicorn``),
+which is what ``--profile`` is meant for. A profile pins the server to the CPUs of a Raspberry Pi model
+and, where cgroup v2 is writable (root, or a delegated cgroup), caps its CPU
+time and memory to match. Limits that couldn't be applied are listed in the
+output.
+
+Results are written as JSON with ``--output``. ``--compare`` checks a run
+against an earlier results file and exits 1 if any endpoint's p95 grew by
+more than ``--max-regression``:
+
+    cd backend
+    python -m benchmarks.load_test --mode uvicorn --profile pi4-2gb --output pi4.json
+    python -m benchmarks.load_test --mode uvicorn --profile pi4-2gb --compare pi4.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Raspberry Pi models as CPU count, per-core speed relative to one core of
+# the machine running the test, and RAM. The speed factors are rough (a Pi 4
+# core is about a third of a current x86 core); pass --cpu-speed to calibrate.
+PROFILES: Dict[str, Dict[str, float]] = {
+    "pi-zero-2w": {"cpus": 4, "cpu_speed": 0.15, "memory_mb": 512},
+    "pi3b": {"cpus": 4, "cpu_speed": 0.2, "memory_mb": 1024},
+    "pi4-2gb": {"cpus": 4, "cpu_speed": 0.3, "memory_mb": 2048},
+    "pi4-4gb": {"cpus": 4, "cpu_speed": 0.3, "memory_mb": 4096},
+    "pi5-4gb": {"cpus": 4, "cpu_speed": 0.5, "memory_mb": 4096},
+}
+CGROUP_ROOT = "/sys/fs/cgroup"
+CPU_PERIOD_US = 100000
+
+SYMPTOMS = ["fever", "chills", "headache", "nausea", "body aches", "cough", "fatigue", "chest pain",
+            "loss of taste", "abdominal pain", "swelling", "dizziness", "night sweats"]
+DIAGNOSIS_TYPES = ["malaria", "covid", "maternal", "general"]
+DISTRICTS = ["Kampala", "Gulu", "Mbarara", "Jinja", "Lira", "Arua", "Mbale", "Kasese"]
+
+
+def create_app():
+    """The app ``app.main`` serves, imported once the benchmark environment is set"""
+    from app.main import app
+
+    return app
+
+
+# Seeding
+
+def seed_clinic(engine, upload_dir: str, patients: int, diagnoses_per_patient: float, energy_days: int,
+                seed: int) -> Dict[str, int]:
+    """Fill the database with ``benchmarks.generate_data``, ending now so recent-window endpoints have data"""
+    from benchmarks.generate_data import generate
+
+    diagnoses = int(patients * diagnoses_per_patient)
+    stats = generate(engine.url.database, patients, diagnoses, energy_days,
+                     datetime.utcnow().replace(second=0, microsecond=0), seed, attachments_dir=upload_dir)
+    return {"patients": patients, "diagnoses": diagnoses, "energy_readings": int(stats["energy_logs"]["rows"])}
+
+
+# Scenarios: name -> (weight, request builder). Builders return
+# (method, path, keyword arguments for httpx) given an rng and the seed sizes.
+
+Builder = Callable[[random.Random, Dict[str, int]], Tuple[str, str, Dict[str, Any]]]
+
+SMALL_IMAGE = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 64 + b"\xff\xd9"
+
+
+def _patient_id(rng, sizes):
+    return rng.randint(1, sizes["patients"])
+
+
+def _diagnosis_id(rng, sizes):
+    return rng.randint(1, max(1, sizes["diagnoses"]))
+
+
+SCENARIOS: Dict[str, Tuple[int, Builder]] = {
+    "patients.list": (8, lambda rng, s: (
+        "GET", "/patients/api/patients/", {"params": {"skip": rng.randrange(0, max(1, s["patients"] - 100)),
+                                                       "limit": 100}})),
+    "patients.get": (15, lambda rng, s: ("GET", f"/patients/api/patients/{_patient_id(rng, s)}", {})),
+    "patients.qr": (5, lambda rng, s: ("GET", f"/patients/api/patients/qr/SM{_patient_id(rng, s):09d}", {})),
+    "patients.diagnoses": (10, lambda rng, s: ("GET", f"/patients/api/patients/{_patient_id(rng, s)}/diagnoses", {})),
+    "patients.create": (3, lambda rng, s: ("POST", "/patients/api/patients/", {"json": {
+        "first_name": "Load", "last_name": "Test", "gender": rng.choice(["male", "female"]),
+        "village": f"Village {rng.randrange(200)}", "district": rng.choice(DISTRICTS)}})),
+    "diagnoses.list": (5, lambda rng, s: (
+        "GET", "/diagnoses/", {"params": {"skip": rng.randrange(0, max(1, s["diagnoses"] - 100)), "limit": 100}})),
+    "diagnoses.get": (10, lambda rng, s: ("GET", f"/diagnoses/{_diagnosis_id(rng, s)}", {})),
+    "diagnoses.create": (3, lambda rng, s: ("POST", "/diagnoses/", {"json": {
+        "patient_id": _patient_id(rng, s), "diagnosis_type": rng.choice(DIAGNOSIS_TYPES),
+        "symptoms": rng.sample(SYMPTOMS, 3)}})),
+    "diagnoses.update": (2, lambda rng, s: ("PUT", f"/diagnoses/{_diagnosis_id(rng, s)}", {"json": {
+        "status": "completed", "notes": "Reviewed"}})),
+    "diagnose.upload": (1, lambda rng, s: ("POST", "/api/diagnose/", {
+        "data": {"patient_id": str(_patient_id(rng, s)), "symptoms": ", ".join(rng.sample(SYMPTOMS, 3))},
+        "files": {"image": ("photo.jpg", SMALL_IMAGE, "image/jpeg")}})),
+    "energy.latest": (10, lambda rng, s: ("GET", "/api/energy/latest", {})),
+    "energy.stats": (4, lambda rng, s: ("GET", "/api/energy/stats", {"params": {"days": rng.choice([1, 7, 30])}})),
+    "energy.list": (3, lambda rng, s: ("GET", "/api/energy/", {"params": {"limit": 100}})),
+    "energy.ingest": (5, lambda rng, s: ("POST", "/api/energy/", {"json": {
+        "battery_level": 60 + 30 * rng.random(), "solar_input": 25 * rng.random(),
+        "power_consumption": 5 + 10 * rng.random()}})),
+    "health": (5, lambda rng, s: ("GET", "/health", {})),
+    "health.detailed": (2, lambda rng, s: ("GET", "/health/detailed", {})),
+}
+
+
+# Resource profiles
+
+def apply_profile(pid: int, profile: Dict[str, float]) -> Dict[str, Any]:
+    """Pin ``pid`` and its worker processes to the profile's CPUs and cap CPU time and memory via cgroup v2.
+
+    Returns what was applied; a limit that couldn't be set is reported
+    under ``skipped`` rather than failing the run.
+    """
+    import psutil
+
+    applied: Dict[str, Any] = {"skipped": []}
+    available = sorted(os.sched_getaffinity(0))
+    cpus = available[:int(profile["cpus"])]
+    pids = [pid] + [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    try:
+        for target in pids:
+            os.sched_setaffinity(target, cpus)
+        applied["cpus"] = cpus
+    except OSError as e:
+        applied["skipped"].append(f"cpu affinity: {e}")
+
+    group = os.path.join(CGROUP_ROOT, f"solarmed-loadtest-{pid}")
+    quota = int(len(cpus) * profile["cpu_speed"] * CPU_PERIOD_US)
+    memory = int(profile["memory_mb"] * 2**20)
+    try:
+        os.makedirs(group, exist_ok=True)
+        with open(os.path.join(group, "cpu.max"), "w") as f:
+            f.write(f"{quota} {CPU_PERIOD_US}")
+        with open(os.path.join(group, "memory.max"), "w") as f:
+            f.write(str(memory))
+        for target in pids:
+            with open(os.path.join(group, "cgroup.procs"), "w") as f:
+                f.write(str(target))
+        applied.update({"cgroup": group, "cpu_max": f"{quota} {CPU_PERIOD_US}", "memory_max": memory})
+    except OSError as e:
+        applied["skipped"].append(f"cgroup limits ({group}): {e}")
+    return applied
+
+
+def release_profile(applied: Dict[str, Any]) -> None:
+    group = applied.get("cgroup")
+    if group:
+        try:
+            os.rmdir(group)
+        except OSError:
+            pass
+
+
+# Load generation
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+async def run_load(client: httpx.AsyncClient, scenarios: Dict[str, Tuple[int, Builder]], sizes: Dict[str, int],
+                   concurrency: int, duration: float, warmup: float, seed: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    names = list(scenarios)
+    weights = [scenarios[name][0] for name in names]
+    samples: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, Dict[str, int]] = {name: {} for name in names}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            name = rng.choices(names, weights)[0]
+            method, path, kwargs = scenarios[name][1](rng, sizes)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                outcome = None if response.status_code < 400 else str(response.status_code)
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if start < measure_from:
+                continue
+            samples[name].append(elapsed)
+            if outcome is not None:
+                errors[name][outcome] = errors[name].get(outcome, 0) + 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+
+    def summarize(latencies: List[float], error_counts: Dict[str, int]) -> Dict[str, Any]:
+        ordered = sorted(latencies)
+        return {
+            "requests": len(ordered),
+            "errors": error_counts,
+            "throughput_rps": round(len(ordered) / elapsed, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+    endpoints = {name: summarize(samples[name], errors[name]) for name in names if samples[name]}
+    total_errors: Dict[str, int] = {}
+    for counts in errors.values():
+        for outcome, count in counts.items():
+            total_errors[outcome] = total_errors.get(outcome, 0) + count
+    total = summarize([latency for name in names for latency in samples[name]], total_errors)
+    return endpoints, total
+
+
+async def authenticate(client: httpx.AsyncClient) -> None:
+    response = await client.post("/auth/token", params={"username": "healthworker", "password": "secret"})
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+async def drive(base_url: Optional[str], app, args, scenarios, sizes) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if base_url is None:
+        # Unhandled exceptions become 500s and are counted, as they would be over HTTP
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits)
+    async with client:
+        await authenticate(client)
+        return await run_load(client, scenarios, sizes, args.concurrency, args.duration, args.warmup, args.seed)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: dict, workdir: str, timeout: float = 60, workers: int = 1,
+                 cpus: Optional[List[int]] = None) -> Tuple[subprocess.Popen, str]:
+    """Serve ``create_app`` with uvicorn through ``app.serve``, optionally pinned to ``cpus``"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--app", "benchmarks.load_test:create_app", "--factory",
+         "--port", str(port), "--log-level", "warning", "--workers", str(workers)],
+        env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        # Set before uvicorn spawns its workers, so they inherit it
+        preexec_fn=(lambda: os.sched_setaffinity(0, cpus)) if cpus else None,
+    )
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return server, url
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"server did not answer within {timeout}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"{'endpoint':20s} {'req':>7s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  errors")
+    for name, stats in results["endpoints"].items():
+        errors = ", ".join(f"{code}x{count}" for code, count in stats["errors"].items()) or "-"
+        print(f"{name:20s} {stats['requests']:7d} {stats['throughput_rps']:8.1f} {stats['p50_ms']:7.1f}ms "
+              f"{stats['p95_ms']:7.1f}ms {stats['p99_ms']:7.1f}ms {stats['max_ms']:7.1f}ms  {errors}")
+    total = results["total"]
+    errors = sum(total["errors"].values())
+    print(f"{'total':20s} {total['requests']:7d} {total['throughput_rps']:8.1f} {total['p50_ms']:7.1f}ms "
+          f"{total['p95_ms']:7.1f}ms {total['p99_ms']:7.1f}ms {total['max_ms']:7.1f}ms  {errors or '-'}")
+
+
+def compare(results: Dict[str, Any], baseline_path: str, max_regression: float) -> List[str]:
+    """p95 regressions beyond ``max_regression`` (a fraction) against a previous results file"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nagainst {baseline_path} ({baseline.get('commit')}, {baseline.get('timestamp')}):")
+    for name, stats in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None or not before["p95_ms"]:
+            continue
+        change = stats["p95_ms"] / before["p95_ms"] - 1
+        flag = ""
+        if change > max_regression:
+            flag = "  REGRESSION"
+            regressions.append(f"{name} p95 {before['p95_ms']:.1f}ms -> {stats['p95_ms']:.1f}ms")
+        print(f"  {name:20s} p95 {before['p95_ms']:7.1f}ms -> {stats['p95_ms']:7.1f}ms ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None)
+    parser.add_argument("--cpu-speed", type=float, default=None, help="override the profile's per-core speed factor")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (uvicorn mode)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--endpoints", default="", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--diagnoses-per-patient", type=float, default=3.0)
+    parser.add_argument("--energy-days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to check p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # In-process runs chdir into the scratch directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    scenarios = SCENARIOS
+    if args.endpoints:
+        unknown = set(args.endpoints.split(",")) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+        scenarios = {name: SCENARIOS[name] for name in args.endpoints.split(",")}
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-loadtest-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'clinic.db')}",
+               LOG_FILE=os.path.join(workdir, "app.log"), PYTHONPATH=BACKEND_DIR,
+               # Every client comes from one address; measure the endpoints, not the rate limiter
+               RATE_LIMIT_REQUESTS=str(10 ** 9))
+    os.environ.update(env)
+    profile = None
+    if args.profile:
+        profile = dict(PROFILES[args.profile])
+        if args.cpu_speed is not None:
+            profile["cpu_speed"] = args.cpu_speed
+
+    server = None
+    applied: Dict[str, Any] = {}
+    try:
+        from app.db.database import engine
+        from app.db.migrations import migrate
+
+        start = time.perf_counter()
+        migrate(engine)
+        sizes = seed_clinic(engine, os.path.join(workdir, "uploads"), args.patients, args.diagnoses_per_patient,
+                            args.energy_days, args.seed)
+        engine.dispose()
+        print(f"seeded {sizes} in {time.perf_counter() - start:.1f}s")
+
+        app = None
+        base_url = None
+        if args.mode == "uvicorn":
+            server, base_url = start_server(env, workdir, workers=args.workers)
+            if profile:
+                applied = apply_profile(server.pid, profile)
+        else:
+            # Uploads go to ./uploads relative to the working directory
+            os.chdir(workdir)
+            app = create_app()
+            if profile:
+                applied = apply_profile(os.getpid(), profile)
+        for reason in applied.get("skipped", []):
+            print(f"profile limit not applied: {reason}")
+
+        endpoints, total = asyncio.run(drive(base_url, app, args, scenarios, sizes))
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "host": {"python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": os.cpu_count()},
+            "config": {"mode": args.mode, "workers": args.workers, "profile": args.profile, "profile_limits": profile,
+                       "applied_limits": applied, "concurrency": args.concurrency, "duration": args.duration,
+                       "seed": args.seed, "dataset": sizes},
+            "endpoints": endpoints,
+            "total": total,
+        }
+        print_report(results)
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"results written to {output}")
+        regressions = compare(results, baseline, args.max_regression) if baseline else []
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        release_profile(applied)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
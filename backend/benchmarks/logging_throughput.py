@@ -0,0 +1,130 @@
+"""Requests per second with request logging off, synchronous and queued.
+
+Drives a trivial route through RequestLoggingMiddleware with:
+
+- request logging sampled to zero (same middleware, nothing written)
+- the previous setup (FileHandler + StreamHandler written on the event loop)
+- the queued, batched setup from app.core.logging_config
+- the queued setup with successful requests sampled at --sample-rate
+
+Log output goes to a temporary directory; console output is discarded.
+``--disk-latency-ms`` adds a stall to every flush of the log file to
+approximate SD-card writes (page-cache writes hide the difference):
+
+    cd backend
+    python -m benchmarks.logging_throughput --requests 3000 --disk-latency-ms 2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import logging_config
+from app.middleware import RequestLoggingMiddleware
+
+
+class SlowStream:
+    """File wrapper whose flush stalls like a slow storage device"""
+
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+        time.sleep(self.latency)
+
+    def close(self):
+        self.stream.close()
+
+
+def slow_open(handler: logging.FileHandler, latency: float) -> None:
+    original_open = handler._open
+    handler._open = lambda: SlowStream(original_open(), latency)
+
+
+def build_app(sample_rate: float = 1.0) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(RequestLoggingMiddleware, success_sample_rate=sample_rate)
+    return app
+
+
+async def requests_per_second(app: FastAPI, requests: int, repeats: int = 3) -> float:
+    """Best of ``repeats`` runs, to keep scheduler noise out of the comparison"""
+    best = 0.0
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get("/ping")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(requests):
+                await client.get("/ping")
+            best = max(best, requests / (time.perf_counter() - start))
+    return best
+
+
+def reset_root(handlers):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--disk-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    latency = args.disk_latency_ms / 1000
+    log_dir = tempfile.mkdtemp(prefix="solarmed-logs-")
+    devnull = open(os.devnull, "w")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = {}
+
+    reset_root([])
+    results["off"] = asyncio.run(requests_per_second(build_app(0.0), args.requests))
+
+    formatter = logging.Formatter(logging_config.LOG_FORMAT)
+    file_handler = logging.FileHandler(os.path.join(log_dir, "sync.log"), delay=True)
+    console_handler = logging.StreamHandler(devnull)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+    slow_open(file_handler, latency)
+    reset_root([file_handler, console_handler])
+    results["sync FileHandler"] = asyncio.run(requests_per_second(build_app(), args.requests))
+
+    reset_root([])
+    listener = logging_config.configure_logging(os.path.join(log_dir, "queued.log"), console=False)
+    slow_open(listener.handlers[0], latency)
+    listener.handlers = listener.handlers + (logging.StreamHandler(devnull),)
+    results["queued"] = asyncio.run(requests_per_second(build_app(), args.requests))
+    results[f"queued, sampled {args.sample_rate:g}"] = asyncio.run(
+        requests_per_second(build_app(args.sample_rate), args.requests)
+    )
+    logging_config.shutdown_logging()
+
+    for name, rps in results.items():
+        print(f"{name:>22}: {rps:8.0f} req/s ({rps / results['off'] * 100:5.1f}% of logging off)")
+    print(f"logs written to {log_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-request cost of the metrics registry and MetricsMiddleware.
+
+Reports the registry bookkeeping a request does (in-flight inc/dec, one
+histogram observation, one counter) in memory and mmap mode, then the
+end-to-end latency of a trivial route with and without the middleware:
+
+    cd backend
+    python -m benchmarks.metrics_overhead --iterations 100000 --requests 2000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.metrics import MetricsRegistry
+from app.middleware import MetricsMiddleware
+
+
+def registry_cost(registry: MetricsRegistry, iterations: int) -> float:
+    registry.histogram("bench_duration_seconds", "bench")
+    registry.counter("bench_requests_total", "bench")
+    registry.gauge("bench_in_flight", "bench")
+    labels = {"method": "GET", "route": "/api/patients/"}
+    status_labels = dict(labels, status="200")
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        registry.inc("bench_in_flight")
+        registry.dec("bench_in_flight")
+        registry.observe("bench_duration_seconds", labels, (i % 100) / 1000)
+        registry.inc("bench_requests_total", status_labels)
+    return (time.perf_counter() - start) / iterations
+
+
+async def request_latency(app: FastAPI, requests: int) -> float:
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get("/ping")
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/ping")
+        return (time.perf_counter() - start) / requests
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    memory = registry_cost(MetricsRegistry(directory=None), args.iterations)
+    mmapped = registry_cost(MetricsRegistry(directory=tempfile.mkdtemp(prefix="solarmed-metrics-")), args.iterations)
+    print(f"registry bookkeeping per request: memory={memory * 1e6:.2f}us mmap={mmapped * 1e6:.2f}us")
+
+    baseline = asyncio.run(request_latency(build_app(False), args.requests))
+    with_metrics = asyncio.run(request_latency(build_app(True), args.requests))
+    print(f"request latency: without={baseline * 1e6:.1f}us with={with_metrics * 1e6:.1f}us "
+          f"overhead={(with_metrics - baseline) * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
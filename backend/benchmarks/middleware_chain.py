@@ -0,0 +1,175 @@
+"""Latency of the middleware chain, BaseHTTPMiddleware versus pure ASGI.
+
+Runs the same trivial JSON route and a small JSON POST through the full
+chain (rate limiting, request logging, metrics, query stats, validation)
+built from the previous BaseHTTPMiddleware classes and from the pure ASGI
+classes in app.middleware, and through no middleware at all:
+
+    cd backend
+    python -m benchmarks.middleware_chain --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app import middleware
+from app.core.metrics import registry
+from app.core.rate_limit import TokenBucketLimiter
+from app.db.instrumentation import route_query_stats, start_request
+
+logger = logging.getLogger("benchmarks.middleware_chain")
+
+
+# The BaseHTTPMiddleware implementations app.middleware used before
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, limit: int = 10 ** 9, window: float = 60):
+        super().__init__(app)
+        self.limiter = TokenBucketLimiter(limit, window, routes={})
+
+    async def dispatch(self, request, call_next):
+        allowed, retry_after = self.limiter.hit(request.client.host, request.url.path)
+        if not allowed:
+            return JSONResponse(status_code=429, content={"detail": "Too many requests"},
+                                headers={"Retry-After": str(math.ceil(retry_after))})
+        return await call_next(request)
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        logger.info(json.dumps({
+            "timestamp": datetime.now().isoformat(),
+            "method": request.method,
+            "url": str(request.url),
+            "status_code": response.status_code,
+            "process_time": time.time() - start_time,
+            "client_ip": request.client.host,
+            "user_agent": request.headers.get("user-agent"),
+        }))
+        return response
+
+
+class LegacyQueryStatsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+        stats = start_request(request_id)
+        response = await call_next(request)
+        stats.route = getattr(request.scope.get("route"), "path", None)
+        route_query_stats.add(stats)
+        response.headers["X-Request-ID"] = request_id
+        response.headers["Server-Timing"] = stats.server_timing()
+        return response
+
+
+class LegacyMetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        registry.inc("solarmed_http_requests_in_flight")
+        start_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            registry.dec("solarmed_http_requests_in_flight")
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            registry.observe("solarmed_http_request_duration_seconds",
+                             {"method": request.method, "route": route}, time.perf_counter() - start_time)
+            registry.inc("solarmed_http_requests_total",
+                         {"method": request.method, "route": route, "status": str(status_code)})
+
+
+class LegacyRequestValidationMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if request.method in ["POST", "PUT", "PATCH"]:
+            if not request.headers.get("content-type", "").startswith("application/json"):
+                return JSONResponse(status_code=415, content={"detail": "Unsupported media type"})
+        content_length = request.headers.get("content-length")
+        if content_length and int(content_length) > 10 * 1024 * 1024:
+            return JSONResponse(status_code=413, content={"detail": "Request entity too large"})
+        return await call_next(request)
+
+
+LEGACY_CHAIN = [
+    (LegacyRequestValidationMiddleware, {}),
+    (LegacyQueryStatsMiddleware, {}),
+    (LegacyMetricsMiddleware, {}),
+    (LegacyRequestLoggingMiddleware, {}),
+    (LegacyRateLimitMiddleware, {}),
+]
+ASGI_CHAIN = [
+    (middleware.RequestValidationMiddleware, {}),
+    (middleware.QueryStatsMiddleware, {}),
+    (middleware.MetricsMiddleware, {}),
+    (middleware.RequestLoggingMiddleware, {}),
+    (middleware.RateLimitMiddleware, {"limit": 10 ** 9, "routes": {}}),
+]
+
+
+def build_app(chain) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return await request.json()
+
+    for cls, options in chain:
+        app.add_middleware(cls, **options)
+    return app
+
+
+async def latencies(app: FastAPI, requests: int):
+    timings = {"GET /ping": [], "POST /echo": []}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get("/ping")
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.get("/ping")
+            timings["GET /ping"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await client.post("/echo", json={"battery_level": 80.5, "solar_input": 120.0})
+            timings["POST /echo"].append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Measure middleware cost, not log I/O
+    logging.getLogger().handlers.clear()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for name, chain in (("none", []), ("BaseHTTPMiddleware", LEGACY_CHAIN), ("pure ASGI", ASGI_CHAIN)):
+        timings = asyncio.run(latencies(build_app(chain), args.requests))
+        for label, values in timings.items():
+            print(f"{name:>18} {label:<11} median={statistics.median(values) * 1e6:7.1f}us "
+                  f"p95={percentile(values, 0.95) * 1e6:7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
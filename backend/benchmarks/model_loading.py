@@ -0,0 +1,128 @@
+"""Memory and latency of the memory-mapped int8 diagnosis models.
+
+Writes one synthetic model artifact per diagnosis type (symptom vocabulary
+in, ReLU hidden layers, softmax over conditions out), drops them from the
+page cache, then for each type reports:
+
+- artifact size against the same weights in float32
+- process RSS growth from loading the model and from its first inference,
+  and how much of the mapping is resident afterwards
+- load time, first (cold) inference latency and steady-state latency
+
+Finally every type is served in turn under a budget that holds about two
+models at once, showing least-recently-used unloading:
+
+    cd backend
+    python -m benchmarks.model_loading --inputs 2000 --hidden 512,256
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from app.services import model_registry as registry_module
+from app.services.model_registry import ModelRegistry, _process_rss, write_artifact
+
+DIAGNOSIS_TYPES = ("malaria", "covid", "maternal", "general")
+LABELS = ("malaria", "pneumonia", "covid19", "tuberculosis", "maternal_complication", "diabetes",
+          "hypertension", "typhoid", "cholera", "measles")
+
+
+def synthetic_layers(sizes, rng):
+    """Float weights and biases for consecutive layer sizes"""
+    layers = []
+    for fan_in, fan_out in zip(sizes, sizes[1:]):
+        bound = (6 / (fan_in + fan_out)) ** 0.5
+        weights = [[rng.uniform(-bound, bound) for _ in range(fan_in)] for _ in range(fan_out)]
+        layers.append((weights, [rng.uniform(-0.1, 0.1) for _ in range(fan_out)]))
+    return layers
+
+
+def drop_from_page_cache(path: str) -> None:
+    """Evict the file's pages so the first inference reads from disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", type=int, default=2000, help="symptom vocabulary size")
+    parser.add_argument("--hidden", default="512,256", help="comma-separated hidden layer sizes")
+    parser.add_argument("--symptoms", type=int, default=6, help="symptoms per request")
+    parser.add_argument("--requests", type=int, default=200, help="steady-state inferences per model")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"symptom_{i}" for i in range(args.inputs)]
+    sizes = [args.inputs] + [int(size) for size in args.hidden.split(",")] + [len(LABELS)]
+    params = sum(fan_in * fan_out + fan_out for fan_in, fan_out in zip(sizes, sizes[1:]))
+    workdir = tempfile.mkdtemp(prefix="solarmed-models-")
+    try:
+        start = time.perf_counter()
+        for diagnosis_type in DIAGNOSIS_TYPES:
+            path = os.path.join(workdir, f"{diagnosis_type}.smq")
+            write_artifact(path, vocabulary, LABELS, synthetic_layers(sizes, rng),
+                           metadata={"diagnosis_type": diagnosis_type, "synthetic": True})
+            drop_from_page_cache(path)
+        artifact_bytes = os.path.getsize(os.path.join(workdir, "general.smq"))
+        print(f"layers {sizes}, {params:,} parameters, backend "
+              f"{'numpy' if registry_module.HAVE_NUMPY else 'python'} "
+              f"(artifacts written in {time.perf_counter() - start:.1f}s)")
+        print(f"artifact {artifact_bytes / 2**20:.2f} MiB vs {params * 4 / 2**20:.2f} MiB as float32\n")
+
+        requests = [rng.sample(vocabulary, args.symptoms) for _ in range(args.requests)]
+        registry = ModelRegistry(workdir, budget_mb=len(DIAGNOSIS_TYPES) * artifact_bytes / 2**20 + 1)
+        print(f"{'model':10s} {'load RSS':>9s} {'1st inf RSS':>11s} {'resident':>9s} {'load':>8s} "
+              f"{'1st inf':>9s} {'steady p50':>10s} {'p95':>8s}")
+        for diagnosis_type in DIAGNOSIS_TYPES:
+            rss_before = _process_rss()
+            with registry.use(diagnosis_type) as model:
+                rss_loaded = _process_rss()
+                model.predict(requests[0])
+                rss_inferred = _process_rss()
+                latencies = []
+                for symptoms in requests:
+                    begin = time.perf_counter()
+                    model.predict(symptoms)
+                    latencies.append(time.perf_counter() - begin)
+                resident = model.resident_bytes()
+                latencies.sort()
+                print(f"{diagnosis_type:10s} {(rss_loaded - rss_before) / 2**20:7.2f}MB "
+                      f"{(rss_inferred - rss_loaded) / 2**20:9.2f}MB "
+                      f"{(resident or 0) / 2**20:7.2f}MB {model.load_seconds * 1e3:6.2f}ms "
+                      f"{model.first_inference_seconds * 1e3:7.2f}ms "
+                      f"{statistics.median(latencies) * 1e3:8.2f}ms "
+                      f"{latencies[int(len(latencies) * 0.95) - 1] * 1e3:6.2f}ms")
+        registry.unload_all()
+
+        # About two models fit; cycling through all four unloads the coldest
+        budget_mb = 2.5 * artifact_bytes / 2**20
+        registry = ModelRegistry(workdir, budget_mb=budget_mb)
+        peak = 0
+        order = [rng.choice(DIAGNOSIS_TYPES) for _ in range(40)]
+        start = time.perf_counter()
+        for diagnosis_type, symptoms in zip(order, requests):
+            registry.predict(diagnosis_type, symptoms)
+            peak = max(peak, registry.used_bytes)
+        elapsed = time.perf_counter() - start
+        stats = registry.stats()
+        loaded = [name for name, report in stats["models"].items() if report["loaded"]]
+        print(f"\nbudget {budget_mb:.2f} MiB, {len(order)} requests across {len(DIAGNOSIS_TYPES)} types: "
+              f"{sum(report['loads'] for report in stats['models'].values())} loads, "
+              f"{stats['evictions']} unloads, peak mapped {peak / 2**20:.2f} MiB, "
+              f"{elapsed / len(order) * 1e3:.2f}ms per request; loaded now {loaded}")
+        registry.unload_all()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Outbreak detector throughput, detection and restart cost.
+
+Builds a synthetic diagnosis stream: Poisson background cases for every
+(district, disease) at rates spread over two orders of magnitude, plus
+injected outbreaks that multiply one series' rate for a few hours. Then:
+
+- feeds it straight into ``OutbreakDetector`` and reports events/second,
+  how many injected outbreaks were flagged (and how quickly) and how many
+  alerts fired outside any outbreak, plus the detector's memory and
+  checkpoint size
+- writes diagnoses through the ORM into a scratch database with the
+  monitor's commit hook on, reporting events/second through the real
+  write path
+- restarts the monitor from its checkpoint and from nothing, showing how
+  many diagnoses each has to read back
+
+    cd backend
+    python -m benchmarks.outbreak --events 1000000 --writes 2000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+DISEASES = ("malaria", "covid19", "pneumonia", "tuberculosis", "typhoid", "cholera", "measles", "diabetes")
+
+
+def synthetic_stream(events: int, days: int, outbreaks: int, districts, seed: int):
+    """Time-ordered (district, disease, created_at, id) events and the injected outbreaks"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    span = days * 86400.0
+    keys = [(district, disease) for district in districts for disease in DISEASES]
+    weights = [10 ** rng.uniform(-1, 1) for _ in keys]
+    total_weight = sum(weights)
+    cum_weights = []
+    running = 0.0
+    for weight in weights:
+        running += weight
+        cum_weights.append(running)
+
+    background = int(events * 0.97)
+    times = sorted(rng.random() * span for _ in range(background))
+    chosen = rng.choices(range(len(keys)), cum_weights=cum_weights, k=background)
+    stream = [(times[i], chosen[i]) for i in range(background)]
+
+    # Outbreaks start after the first week so baselines have formed
+    injected = []
+    per_outbreak = max(1, (events - background) // max(1, outbreaks))
+    for _ in range(outbreaks):
+        index = rng.randrange(len(keys))
+        began = rng.uniform(7 * 86400, span - 86400)
+        hours = rng.uniform(3, 12)
+        hourly = weights[index] / total_weight * background / (span / 3600)
+        cases = max(8, min(per_outbreak, int(hourly * hours * 4) + 8))
+        stream.extend((began + rng.random() * hours * 3600, index) for _ in range(cases))
+        injected.append({"key": keys[index], "start": start + timedelta(seconds=began),
+                         "end": start + timedelta(seconds=began + hours * 3600), "cases": cases})
+    stream.sort()
+    return [(keys[key][0], keys[key][1], start + timedelta(seconds=offset), i + 1)
+            for i, (offset, key) in enumerate(stream)], injected
+
+
+def score_alerts(alerts, injected, window: timedelta):
+    """Match alerts to outbreaks of the same series; returns (detected, delays, false alerts)"""
+    by_key = {}
+    for outbreak in injected:
+        by_key.setdefault(outbreak["key"], []).append(outbreak)
+    detected, delays, false_alerts = set(), [], 0
+    for when, alert in alerts:
+        matched = False
+        for outbreak in by_key.get((alert["district"], alert["disease"]), []):
+            if outbreak["start"] <= when <= outbreak["end"] + window:
+                matched = True
+                if id(outbreak) not in detected:
+                    detected.add(id(outbreak))
+                    delays.append((when - outbreak["start"]).total_seconds() / 3600)
+        false_alerts += not matched
+    return len(detected), delays, false_alerts
+
+
+def detector_only(args, stream, injected):
+    from app.services.outbreak import OutbreakDetector
+
+    detector = OutbreakDetector(max_series=args.max_series)
+    alerts = []
+    process = detector.process
+    start = time.perf_counter()
+    for district, disease, when, event_id in stream:
+        alert = process(district, disease, when, event_id)
+        if alert is not None:
+            alerts.append((when, alert))
+    elapsed = time.perf_counter() - start
+    detected, delays, false_alerts = score_alerts(alerts, injected, timedelta(seconds=detector.window_seconds))
+    print(f"detector: {len(stream):,} events in {elapsed:.2f}s = {len(stream) / elapsed:,.0f} events/s")
+    delays.sort()
+    print(f"  outbreaks flagged {detected}/{len(injected)}"
+          + (f", median delay {delays[len(delays) // 2]:.1f}h after onset" if delays else "")
+          + f"; {false_alerts} alerts outside outbreaks over {args.days} days "
+          f"({detector.stats()['series']} series)")
+
+    tracemalloc.start()
+    probe = OutbreakDetector(max_series=args.max_series)
+    for district, disease, when, event_id in stream[:200000]:
+        probe.process(district, disease, when, event_id)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    series = probe.stats()["series"]
+    print(f"  state: {current / 1024:.0f} KiB for {series} series ({current / max(1, series):.0f} bytes each)")
+
+    began = time.perf_counter()
+    encoded = json.dumps(detector.state(), separators=(",", ":"))
+    saved = time.perf_counter() - began
+    began = time.perf_counter()
+    OutbreakDetector(max_series=args.max_series).load_state(json.loads(encoded))
+    loaded = time.perf_counter() - began
+    print(f"  checkpoint: {len(encoded) / 1024:.0f} KiB, save {saved * 1000:.1f}ms, load {loaded * 1000:.1f}ms")
+
+
+def write_path(args, workdir):
+    from sqlalchemy import func, select
+
+    from app.db import models
+    from app.db.database import SessionLocal, engine
+    from app.db.migrations import migrate
+    from app.services.latest_value_stream import LatestValueStream
+    from app.services.outbreak import OutbreakDetector, OutbreakMonitor
+    from benchmarks.generate_data import generate
+
+    migrate(engine)
+    now = datetime.utcnow().replace(microsecond=0)
+    generate(engine.url.database, args.patients, args.history, 35, now - timedelta(hours=1), args.seed)
+    checkpoint = os.path.join(workdir, "outbreak_checkpoint.json")
+
+    def new_monitor(path):
+        stream = LatestValueStream("Outbreak alert", order_key=attrgetter("id"), queue_size=64)
+        return OutbreakMonitor(OutbreakDetector(max_series=args.max_series), stream, checkpoint_path=path)
+
+    began = time.perf_counter()
+    monitor = new_monitor(checkpoint)
+    monitor.start()
+    print(f"\nwrite path: cold start replayed {monitor.detector.events:,} diagnoses in "
+          f"{time.perf_counter() - began:.2f}s (mode {monitor.mode})")
+
+    rng = random.Random(args.seed)
+
+    def write(count, hook_on):
+        monitor.mode = "hook" if hook_on else None
+        began = time.perf_counter()
+        for i in range(count):
+            with SessionLocal() as db:
+                db.add(models.Diagnosis(patient_id=rng.randint(1, args.patients), symptoms="fever",
+                                        diagnosis=rng.choice(DISEASES), created_at=now))
+                db.commit()
+        monitor.mode = "hook"
+        return count / (time.perf_counter() - began)
+
+    # Alternate rounds so both sides see the same cache state (the detector
+    # misses the hook-off diagnoses; only the rate matters here)
+    write(args.writes // 10, True)
+    alerts = monitor.detector.alerts
+    rounds, with_hook, without_hook = 5, 0.0, 0.0
+    for _ in range(rounds):
+        with_hook += write(args.writes // rounds, True) / rounds
+        without_hook += write(args.writes // rounds, False) / rounds
+    alerts = monitor.detector.alerts - alerts
+    monitor.catch_up()
+    print(f"  ORM writes/s: {with_hook:,.0f} with the detector hook ({alerts} alerts stored), "
+          f"{without_hook:,.0f} without")
+    monitor.stop()
+
+    with SessionLocal() as db:
+        for _ in range(args.writes // 10):
+            db.add(models.Diagnosis(patient_id=rng.randint(1, args.patients), symptoms="fever",
+                                    diagnosis=rng.choice(DISEASES), created_at=now))
+        db.commit()
+        last_id = db.execute(select(func.max(models.Diagnosis.id))).scalar()
+
+    for label, path in (("from checkpoint", checkpoint), ("without checkpoint", None)):
+        monitor = new_monitor(path)
+        began = time.perf_counter()
+        monitor.start()
+        elapsed = time.perf_counter() - began
+        caught_up = monitor.detector.last_id == last_id
+        print(f"  restart {label}: processed {monitor.detector.events:,} diagnoses in {elapsed:.2f}s "
+              f"(caught up: {caught_up})")
+        monitor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1000000, help="synthetic stream length")
+    parser.add_argument("--days", type=int, default=90, help="stream span")
+    parser.add_argument("--outbreaks", type=int, default=40)
+    parser.add_argument("--max-series", type=int, default=4096)
+    parser.add_argument("--writes", type=int, default=2000, help="ORM inserts per write-path run")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=100000, help="diagnoses in the scratch database")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-outbreak-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'clinic.db')}"
+    os.environ["LOG_FILE"] = os.path.join(workdir, "app.log")
+    try:
+        from benchmarks.generate_data import DISTRICTS
+
+        began = time.perf_counter()
+        stream, injected = synthetic_stream(args.events, args.days, args.outbreaks, DISTRICTS, args.seed)
+        print(f"stream: {len(stream):,} diagnoses, {len(injected)} outbreaks, "
+              f"{len(DISTRICTS) * len(DISEASES)} series (built in {time.perf_counter() - began:.1f}s)")
+        detector_only(args, stream, injected)
+        del stream
+        write_path(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
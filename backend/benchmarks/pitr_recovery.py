@@ -0,0 +1,102 @@
+"""Point-in-time recovery time and WAL archiving cost.
+
+Seeds a clinic database, starts a ``WalArchiver`` and takes a base backup,
+then runs ``--segments`` archive intervals, each committing
+``--writes-per-segment`` small diagnosis and energy-log transactions. It
+reports:
+
+- how long each archive run holds the write lock (copy + checkpoint)
+- archive size, before and after the ``--max-archive-mb`` cap is applied
+- time to recover to the end of the first, middle and last segment, and
+  whether the recovered row counts match what was committed by then
+
+    cd backend
+    python -m benchmarks.pitr_recovery --segments 200
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed-patients", type=int, default=20000)
+    parser.add_argument("--segments", type=int, default=200)
+    parser.add_argument("--writes-per-segment", type=int, default=20)
+    parser.add_argument("--max-archive-mb", type=float, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-pitr-")
+    db_path = os.path.join(workdir, "clinic.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from app.backup import BackupManager
+    from app.db.database import SessionLocal, engine, write_lock
+    from app.db.migrations import migrate
+    from app.db.models import Diagnosis, EnergyLog, Patient
+    from app.wal_archive import WalArchiver
+
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(Patient.__table__.insert(), [
+            {"first_name": f"Patient{i}", "last_name": "Seed", "district": f"District {i % 8}"}
+            for i in range(args.seed_patients)
+        ])
+
+    archiver = WalArchiver(db_path, os.path.join(workdir, "wal"), engine=engine, write_lock=write_lock,
+                           interval=3600, max_bytes=1 << 62)
+    archiver.start()
+    manager = BackupManager(db_path, os.path.join(workdir, "backups"), write_lock=write_lock,
+                            archiver=archiver, step_sleep=0)
+    manager.create_backup()
+
+    points = []
+    archive_seconds = []
+    try:
+        for segment in range(args.segments):
+            for i in range(args.writes_per_segment):
+                with SessionLocal() as session:
+                    session.add(Diagnosis(patient_id=1 + (segment * 31 + i) % args.seed_patients,
+                                          symptoms=["fever", "chills"], diagnosis_type="malaria"))
+                    session.add(EnergyLog(battery_level=80.0, solar_input=120.0, power_consumption=90.0))
+                    session.commit()
+            start = time.perf_counter()
+            archiver.archive_once()
+            archive_seconds.append(time.perf_counter() - start)
+            points.append((datetime.now(), (segment + 1) * args.writes_per_segment))
+
+        print(f"archive run (write lock held): median {statistics.median(archive_seconds) * 1000:.1f}ms, "
+              f"max {max(archive_seconds) * 1000:.1f}ms")
+        print(f"archive: {len(archiver.segments())} segments, {archiver.archive_bytes() / 2**20:.2f} MiB")
+
+        target = os.path.join(workdir, "recovered.db")
+        for label, (until, expected) in (("first", points[0]), ("middle", points[len(points) // 2]),
+                                         ("last", points[-1])):
+            start = time.perf_counter()
+            manager.recover_to(target, until)
+            elapsed = time.perf_counter() - start
+            conn = sqlite3.connect(target)
+            try:
+                count = conn.execute("SELECT count(*) FROM diagnoses").fetchone()[0]
+                integrity = conn.execute("PRAGMA quick_check").fetchone()[0]
+            finally:
+                conn.close()
+            status = "ok" if count == expected and integrity == "ok" else f"MISMATCH ({count} rows, {integrity})"
+            print(f"recover to {label:6s} segment: {elapsed * 1000:7.1f}ms, {expected} diagnoses {status}")
+
+        archiver.max_bytes = int(args.max_archive_mb * 2**20)
+        archiver._enforce_limit()
+        print(f"after {args.max_archive_mb:g} MiB cap: {len(archiver.segments())} segments, "
+              f"{archiver.archive_bytes() / 2**20:.2f} MiB, recovery from the base backup "
+              f"{'still possible' if archiver.covers(points[0][0]) else 'needs a newer backup'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Rate limiter cost per request with many distinct clients.
+
+Replays a request stream over ``--clients`` distinct IPs through the
+previous dict-rebuilding limiter and the token-bucket limiter, and reports
+the time per check and the number of tracked entries:
+
+    cd backend
+    python -m benchmarks.rate_limit --clients 10000 --requests 50000
+"""
+import argparse
+import random
+import time
+
+from app.core.rate_limit import TokenBucketLimiter
+
+
+class LegacyLimiter:
+    """The limiter RateLimitMiddleware used before token buckets"""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.requests = {}
+
+    def hit(self, client_ip: str, path: str = "/"):
+        current_time = time.time()
+        self.requests = {
+            ip: times for ip, times in self.requests.items()
+            if current_time - times[-1] < self.window
+        }
+        if client_ip not in self.requests:
+            self.requests[client_ip] = []
+        if len(self.requests[client_ip]) >= self.limit:
+            return False, 0.0
+        self.requests[client_ip].append(current_time)
+        return True, 0.0
+
+
+def run(limiter, stream) -> float:
+    start = time.perf_counter()
+    for client, path in stream:
+        limiter.hit(client, path)
+    return (time.perf_counter() - start) / len(stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--legacy-requests", type=int, default=5000,
+                        help="requests replayed through the old limiter (it is O(clients) per request)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clients = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(args.clients)]
+    paths = ["/api/patients/", "/api/energy/latest", "/api/diagnose/"]
+    warmup = [(client, rng.choice(paths)) for client in clients]
+    stream = [(rng.choice(clients), rng.choice(paths)) for _ in range(args.requests)]
+
+    bucket = TokenBucketLimiter(100, 60, routes={"/api/diagnose": (20, 60)}, max_clients=args.clients * 3)
+    run(bucket, warmup)
+    bucket_cost = run(bucket, stream)
+    print(f"token bucket: {bucket_cost * 1e6:.2f}us/request, {len(bucket)} buckets")
+
+    small = TokenBucketLimiter(100, 60, routes={}, max_clients=args.clients // 10)
+    run(small, warmup)
+    small_cost = run(small, stream)
+    print(f"token bucket (max_clients={args.clients // 10}): {small_cost * 1e6:.2f}us/request, {len(small)} buckets")
+
+    legacy = LegacyLimiter(100, 60)
+    run(legacy, warmup)
+    legacy_cost = run(legacy, stream[:args.legacy_requests])
+    tracked = sum(len(times) for times in legacy.requests.values())
+    print(f"legacy dict rebuild: {legacy_cost * 1e6:.2f}us/request, "
+          f"{len(legacy.requests)} clients / {tracked} timestamps")
+
+
+if __name__ == "__main__":
+    main()
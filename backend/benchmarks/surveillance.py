@@ -0,0 +1,147 @@
+"""Surveillance report queries: joining diagnoses vs the weekly aggregate.
+
+Seeds a synthetic clinic (``benchmarks.generate_data``) and, for a few
+typical report shapes, times the query against ``surveillance_weekly``
+and the same report computed by joining ``diagnoses`` to ``patients``.
+Then it writes diagnoses, edits and patient moves through the ORM to
+measure what maintaining the aggregate adds to a write, checks that the
+incremental counts equal a full rebuild, and times the rebuild:
+
+    cd backend
+    python -m benchmarks.surveillance --patients 20000 --diagnoses 500000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+JOIN_REPORT = (
+    "SELECT date(d.created_at, '-' || ((strftime('%w', d.created_at) + 6) % 7) || ' days') AS week, "
+    "coalesce(p.district, '') AS district, coalesce(d.diagnosis, d.diagnosis_type){village}, count(*) "
+    "FROM diagnoses d LEFT JOIN patients p ON p.id = d.patient_id "
+    "WHERE coalesce(d.diagnosis, d.diagnosis_type) IS NOT NULL AND d.created_at >= :start AND d.created_at < :end {filters} "
+    "GROUP BY {groups} ORDER BY {groups}"
+)
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def snapshot(conn):
+    return (
+        conn.exec_driver_sql("SELECT * FROM surveillance_weekly ORDER BY 1, 2, 3, 4").fetchall(),
+        conn.exec_driver_sql("SELECT * FROM surveillance_district_weekly ORDER BY 1, 2, 3").fetchall(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--diagnoses", type=int, default=500000)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--writes", type=int, default=500, help="ORM diagnosis writes for the maintenance cost")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-surveillance-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'clinic.db')}"
+    os.environ["LOG_FILE"] = os.path.join(workdir, "app.log")
+    try:
+        from sqlalchemy import text
+
+        from app.db import models
+        from app.db.database import ReadSessionLocal, SessionLocal, engine
+        from app.db.migrations import migrate
+        from app.db.surveillance import rebuild, surveillance_query, week_start
+        from benchmarks.generate_data import DISTRICTS, generate
+
+        migrate(engine)
+        end = datetime(2025, 1, 1)
+        stats = generate(engine.url.database, args.patients, args.diagnoses, args.days, end, args.seed)
+        print(f"seeded {args.patients} patients, {args.diagnoses} diagnoses over {args.days} days; "
+              f"{stats['surveillance_weekly']['rows']} aggregate rows")
+
+        last_quarter = (end - timedelta(weeks=12)).date()
+        # report -> (surveillance_query filters, join WHERE clause, join parameters)
+        reports = {
+            "1 district by village, 12 weeks": ({"start": last_quarter, "district": DISTRICTS[0]},
+                                                "AND p.district = :district", {"district": DISTRICTS[0]}),
+            "malaria by district, 1 year": ({"start": (end - timedelta(days=365)).date(), "disease": "malaria",
+                                             "by_village": False},
+                                            "AND coalesce(d.diagnosis, d.diagnosis_type) = :disease", {"disease": "malaria"}),
+            "all by district, full history": ({"start": (end - timedelta(days=args.days + 7)).date(),
+                                               "by_village": False}, "", {}),
+        }
+        print(f"\n{'report':32s} {'rows':>7s} {'join':>10s} {'aggregate':>10s} {'speedup':>8s}")
+        with ReadSessionLocal() as db:
+            for name, (filters, join_filter, join_params) in reports.items():
+                start = filters["start"]
+                statement = surveillance_query(end=end.date(), **filters)
+                by_village = filters.get("by_village", True)
+                join_sql = text(JOIN_REPORT.format(
+                    filters=join_filter, village=", coalesce(p.village, '') AS village" if by_village else "",
+                    groups="1, 2, 3, 4" if by_village else "1, 2, 3"))
+                join_params = dict(join_params, start=datetime.combine(week_start(start), datetime.min.time()),
+                                   end=end + timedelta(days=7 - end.weekday()))
+                rows = db.execute(statement).all()
+                joined = db.execute(join_sql, join_params).all()
+                assert [tuple(map(str, row)) for row in rows] == [tuple(map(str, row)) for row in joined], name
+                join_ms = median_ms(lambda: db.execute(join_sql, join_params).all(), max(3, args.repeat // 5))
+                aggregate_ms = median_ms(lambda: db.execute(statement).all(), args.repeat)
+                print(f"{name:32s} {len(rows):7d} {join_ms:8.2f}ms {aggregate_ms:8.2f}ms "
+                      f"{join_ms / aggregate_ms:7.0f}x")
+
+        # Incremental maintenance through the ORM: inserts, edits and patient moves
+        rng = random.Random(args.seed)
+        diseases = ["malaria", "covid19", "pneumonia", "tuberculosis"]
+        first_diagnosis = args.diagnoses + 1
+        timings = {"insert": [], "update": [], "patient move": []}
+        for i in range(args.writes):
+            with SessionLocal() as db:
+                began = time.perf_counter()
+                db.add(models.Diagnosis(patient_id=rng.randint(1, args.patients), symptoms="fever",
+                                        diagnosis=rng.choice(diseases), created_at=end - timedelta(hours=i)))
+                db.commit()
+                timings["insert"].append(time.perf_counter() - began)
+            with SessionLocal() as db:
+                diagnosis = db.get(models.Diagnosis, first_diagnosis + rng.randrange(i + 1))
+                began = time.perf_counter()
+                diagnosis.diagnosis = rng.choice(diseases)
+                db.commit()
+                timings["update"].append(time.perf_counter() - began)
+            if i % 10 == 0:
+                with SessionLocal() as db:
+                    patient = db.get(models.Patient, rng.randint(1, args.patients))
+                    began = time.perf_counter()
+                    patient.district = rng.choice(DISTRICTS)
+                    patient.village = f"{patient.district} {rng.randint(1, 25)}"
+                    db.commit()
+                    timings["patient move"].append(time.perf_counter() - began)
+        print(f"\nORM writes with aggregate maintenance (median): " + ", ".join(
+            f"{name} {statistics.median(values) * 1000:.2f}ms" for name, values in timings.items()))
+
+        with engine.begin() as conn:
+            incremental = snapshot(conn)
+            began = time.perf_counter()
+            rows = rebuild(conn)
+            elapsed = time.perf_counter() - began
+            rebuilt = snapshot(conn)
+        print(f"incremental counts match a rebuild: {incremental == rebuilt}")
+        print(f"rebuild: {rows} rows in {elapsed:.2f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
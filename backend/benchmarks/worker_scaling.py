@@ -0,0 +1,104 @@
+"""Throughput scaling from 1 to N cores in multi-worker mode.
+
+Seeds one synthetic clinic (``benchmarks.generate_data``), then for each
+worker count serves it with ``app.serve --workers N`` pinned to N CPUs and
+drives it with the load test's closed-loop clients and endpoint mix. The
+load generator runs on the CPUs left over where there are any, otherwise it
+shares them with the server and the numbers understate scaling. Reports
+throughput and latency per step, speedup over one worker and per-core
+efficiency:
+
+    cd backend
+    python -m benchmarks.worker_scaling --workers 1,2,3,4 --duration 20
+
+Reads and writes are mixed as in ``load_test``; writes still go through one
+SQLite writer, so write-heavy mixes (``--endpoints``) scale less.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+from benchmarks.load_test import BACKEND_DIR, SCENARIOS, drive, seed_clinic, start_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,3,4", help="comma-separated worker counts (one core each)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--endpoints", default="", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--diagnoses-per-patient", type=float, default=3.0)
+    parser.add_argument("--energy-days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    args = parser.parse_args()
+
+    steps = [int(count) for count in args.workers.split(",")]
+    scenarios = SCENARIOS
+    if args.endpoints:
+        scenarios = {name: SCENARIOS[name] for name in args.endpoints.split(",")}
+    available = sorted(os.sched_getaffinity(0))
+    if max(steps) > len(available):
+        print(f"only {len(available)} CPUs available: steps above that share cores")
+
+    workdir = tempfile.mkdtemp(prefix="solarmed-scaling-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'clinic.db')}",
+               LOG_FILE=os.path.join(workdir, "app.log"), PYTHONPATH=BACKEND_DIR,
+               # Every client comes from one address; measure the endpoints, not the rate limiter
+               RATE_LIMIT_REQUESTS=str(10 ** 9))
+    os.environ.update(env)
+    results = []
+    try:
+        from app.db.database import engine
+        from app.db.migrations import migrate
+
+        migrate(engine)
+        sizes = seed_clinic(engine, os.path.join(workdir, "uploads"), args.patients, args.diagnoses_per_patient,
+                            args.energy_days, args.seed)
+        engine.dispose()
+        print(f"seeded {sizes}")
+
+        print(f"{'workers':>7s} {'cpus':>10s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'errors':>7s} "
+              f"{'speedup':>8s} {'per core':>8s}")
+        for workers in steps:
+            cpus = available[:workers] if workers <= len(available) else available
+            client_cpus = [cpu for cpu in available if cpu not in cpus] or available
+            os.sched_setaffinity(0, client_cpus)
+            server, base_url = start_server(env, workdir, workers=workers, cpus=cpus)
+            try:
+                load_args = SimpleNamespace(concurrency=args.concurrency, duration=args.duration,
+                                            warmup=args.warmup, timeout=args.timeout, seed=args.seed)
+                _, total = asyncio.run(drive(base_url, None, load_args, scenarios, sizes))
+            finally:
+                server.terminate()
+                server.wait()
+                os.sched_setaffinity(0, available)
+            baseline = results[0]["throughput_rps"] if results else total["throughput_rps"]
+            speedup = total["throughput_rps"] / baseline if baseline else 0.0
+            step = {"workers": workers, "cpus": cpus, "throughput_rps": total["throughput_rps"],
+                    "p50_ms": total["p50_ms"], "p95_ms": total["p95_ms"], "errors": sum(total["errors"].values()),
+                    "speedup": round(speedup, 2), "efficiency": round(speedup / workers, 2)}
+            results.append(step)
+            print(f"{workers:7d} {','.join(map(str, cpus)):>10s} {step['throughput_rps']:8.1f} "
+                  f"{step['p50_ms']:7.1f}ms {step['p95_ms']:7.1f}ms {step['errors']:7d} "
+                  f"{step['speedup']:7.2f}x {step['efficiency']:7.0%}")
+            # Let the previous server's sockets and files settle
+            time.sleep(1)
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"dataset": sizes, "concurrency": args.concurrency, "steps": results}, f, indent=2)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
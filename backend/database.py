@@ -1,24 +1,8 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
 from dotenv import load_dotenv
 
+# Load .env before app.db.database reads DATABASE_URL
 load_dotenv()
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./solarmed.db")
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-Base = declarative_base()
-
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
\ No newline at end of file
+# Engine, sessions and Base are shared with the app package so there is a
+# single schema and a single storage profile
+from app.db.database import SQLALCHEMY_DATABASE_URL, engine, SessionLocal, Base, get_db  # noqa: E402,F401
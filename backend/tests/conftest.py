@@ -0,0 +1,53 @@
+"""Shared test setup.
+
+Settings are read from the environment when ``app`` modules are imported,
+so everything the app writes to disk is pointed at a scratch directory
+here, before any test module imports the app.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="solarmed-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(TEST_DIR, 'solarmed.db')}")
+os.environ.setdefault("LOG_FILE", os.path.join(TEST_DIR, "app.log"))
+os.environ.setdefault("BACKUP_DIR", os.path.join(TEST_DIR, "backups"))
+os.environ.setdefault("OUTBREAK_CHECKPOINT", os.path.join(TEST_DIR, "outbreak_checkpoint.json"))
+# Tests send far more than a clinic's requests per minute from one address
+os.environ.setdefault("RATE_LIMIT_REQUESTS", str(10 ** 9))
+# Full fsync on every commit makes any write blocking the event loop obvious
+os.environ.setdefault("SQLITE_STORAGE_PROFILE", "durable")
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The app's engine with every migration applied"""
+    from app.db.database import engine
+    from app.db.migrations import migrate
+
+    migrate(engine)
+    return engine
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    """Test client for the served app, with its startup and shutdown hooks run once"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    response = client.post("/auth/token", params={"username": "healthworker", "password": "secret"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
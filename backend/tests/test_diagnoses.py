@@ -0,0 +1,81 @@
+"""Diagnoses written through either endpoint read back the same way"""
+import pytest
+from sqlalchemy import text
+
+from app.api import diagnoses as diagnoses_api
+from app.db.migrations import _diagnosis_symptom_lists
+from app.db.models import split_symptoms
+
+
+@pytest.fixture
+def patient_id(client, auth_headers):
+    response = client.post("/patients/api/patients/", headers=auth_headers, json={
+        "first_name": "Amina", "last_name": "Okello", "gender": "female", "village": "Laroo", "district": "Gulu"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("fever, chills ,headache", ["fever", "chills", "headache"]),
+    ('["fever", "cough"]', ["fever", "cough"]),
+    (["fever", " cough "], ["fever", "cough"]),
+    ("", []),
+    (None, []),
+])
+def test_split_symptoms(value, expected):
+    assert split_symptoms(value) == expected
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_both_write_paths_read_back(client, auth_headers, patient_id, monkeypatch, fast_json):
+    monkeypatch.setattr(diagnoses_api, "FAST_JSON_RESPONSES", fast_json)
+    form = client.post("/api/diagnose/", data={"patient_id": patient_id, "symptoms": "Fever, chills"})
+    assert form.status_code == 200, form.text
+    assert form.json()["symptoms"] == ["fever", "chills"]
+    created = client.post("/diagnoses/", headers=auth_headers, json={
+        "patient_id": patient_id, "diagnosis_type": "malaria", "symptoms": ["fever", "headache"]})
+    assert created.status_code == 200, created.text
+    assert created.json()["symptoms"] == ["fever", "headache"]
+    assert created.json().keys() == form.json().keys()
+
+    for path in ("/diagnoses/?limit=1000", f"/patients/api/patients/{patient_id}/diagnoses", "/api/diagnose/?limit=1000"):
+        response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200, f"{path}: {response.text}"
+        by_id = {row["id"]: row for row in response.json()}
+        assert by_id[form.json()["id"]]["symptoms"] == ["fever", "chills"]
+        assert by_id[created.json()["id"]]["symptoms"] == ["fever", "headache"]
+
+
+def test_migration_converts_string_symptoms(database, patient_id):
+    rows = {"plain": ("fever, chills", ["fever", "chills"]), "json-string": ('"cough, fatigue"', ["cough", "fatigue"]),
+            "list": ('["nausea"]', ["nausea"]), "null": (None, [])}
+    with database.begin() as conn:
+        ids = {}
+        for name, (stored, _) in rows.items():
+            ids[name] = conn.execute(text(
+                "INSERT INTO diagnoses (patient_id, symptoms, created_at) VALUES (:patient_id, :symptoms, "
+                "CURRENT_TIMESTAMP) RETURNING id"), {"patient_id": patient_id, "symptoms": stored}).scalar()
+        _diagnosis_symptom_lists(conn)
+        for name, (_, expected) in rows.items():
+            stored = conn.execute(text("SELECT symptoms FROM diagnoses WHERE id = :id"), {"id": ids[name]}).scalar()
+            assert stored is not None and split_symptoms(stored) == expected, name
+            assert conn.execute(text("SELECT json_type(symptoms) FROM diagnoses WHERE id = :id"),
+                                {"id": ids[name]}).scalar() == "array", name
+
+
+def test_uploads_are_saved(client, auth_headers, patient_id, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    image, voice = b"\xff\xd8" + bytes(range(256)) * 64, b"ID3" + bytes(4096)
+    form = client.post("/api/diagnose/", data={"patient_id": patient_id, "symptoms": "cough"},
+                       files={"image": ("photo.jpg", image, "image/jpeg"), "voice": ("note.mp3", voice, "audio/mpeg")})
+    assert form.status_code == 200, form.text
+    assert (tmp_path / form.json()["image_path"]).read_bytes() == image
+    assert (tmp_path / form.json()["voice_path"]).read_bytes() == voice
+
+    diagnosis_id = form.json()["id"]
+    for kind, name, content in (("image", "rash.jpg", image), ("voice", "cough.mp3", voice)):
+        response = client.post(f"/diagnoses/upload/{kind}/{diagnosis_id}", headers=auth_headers,
+                               files={"file": (name, content)})
+        assert response.status_code == 200, response.text
+        folder = "images" if kind == "image" else "voice"
+        assert (tmp_path / "uploads" / folder / f"{diagnosis_id}_{name}").read_bytes() == content
@@ -0,0 +1,16 @@
+"""Health endpoints"""
+import pytest
+
+from app.services.system_monitor import HEALTH_HISTORY_SIZE
+
+
+@pytest.mark.parametrize("window", [0, -1, HEALTH_HISTORY_SIZE + 1, "six"])
+def test_detailed_health_rejects_bad_window(client, window):
+    response = client.get("/health/detailed", params={"window": window})
+    assert response.status_code == 422, response.text
+
+
+def test_detailed_health_accepts_full_history_window(client):
+    response = client.get("/health/detailed", params={"window": HEALTH_HISTORY_SIZE})
+    assert response.status_code == 200, response.text
+    assert "trends" in response.json()
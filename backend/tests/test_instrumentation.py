@@ -0,0 +1,21 @@
+"""Per-request SQL timing listeners"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.instrumentation import instrument_engine, start_request
+
+
+def test_failed_statements_leave_no_start_times(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'instrumented.db'}")
+    instrument_engine(engine)
+    stats = start_request("failing")
+    with engine.connect() as conn:
+        for _ in range(5):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            conn.rollback()
+        assert conn.info["query_start_times"] == []
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert conn.info["query_start_times"] == []
+    assert stats.count == 1
@@ -0,0 +1,20 @@
+"""Latest-value streams behind /energy/stream and /analytics/alerts/stream"""
+import asyncio
+from types import SimpleNamespace
+
+from app.services.latest_value_stream import LatestValueStream
+
+
+def test_older_value_never_replaces_latest_but_still_fans_out():
+    stream = LatestValueStream("Test", order_key=lambda value: value.at)
+    newer, older = SimpleNamespace(at=2), SimpleNamespace(at=1)
+
+    async def scenario():
+        with stream.subscribe() as queue:
+            stream.publish(newer)
+            stream.publish(older)
+            return [await queue.get(), await queue.get()]
+
+    assert asyncio.run(scenario()) == [newer, older]
+    assert stream.latest is newer
+    assert stream.subscriber_count == 0
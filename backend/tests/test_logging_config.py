@@ -0,0 +1,52 @@
+"""Queue-based logging setup"""
+import logging
+import os
+import subprocess
+import sys
+
+from app.core import logging_config
+from app.core.logging_config import DroppingQueueHandler, configure_logging, shutdown_logging
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _queue_handlers():
+    return [handler for handler in logging.getLogger().handlers if isinstance(handler, DroppingQueueHandler)]
+
+
+def test_shutdown_detaches_queue_handler(tmp_path):
+    shutdown_logging()
+    try:
+        configure_logging(log_file=str(tmp_path / "app.log"), console=False)
+        assert len(_queue_handlers()) == 1
+        logging.getLogger("test").warning("before shutdown")
+        shutdown_logging()
+        assert _queue_handlers() == []
+        assert "before shutdown" in (tmp_path / "app.log").read_text()
+    finally:
+        shutdown_logging()
+        configure_logging(log_file=logging_config.LOG_FILE)
+
+
+WORKER = """
+import sys
+from app.core.logging_config import worker_log_file
+print(worker_log_file(sys.argv[1]), flush=True)
+sys.stdin.read()
+"""
+
+
+def test_workers_get_their_own_log_file(tmp_path):
+    env = dict(os.environ, SHARED_STATE_DIR=str(tmp_path / "shared"))
+    log_file = str(tmp_path / "app.log")
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, log_file], cwd=BACKEND_DIR, env=env,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(2)
+    ]
+    try:
+        files = sorted(worker.stdout.readline().strip() for worker in workers)
+    finally:
+        for worker in workers:
+            worker.communicate("")
+    assert files == [str(tmp_path / "app.1.log"), log_file]
@@ -0,0 +1,63 @@
+"""Merged metrics across worker files"""
+import json
+import os
+import subprocess
+import sys
+
+from app.core.metrics import MetricsRegistry, _SlotTable
+
+
+def _dead_pid() -> int:
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    return child.pid
+
+
+def _write_counter(directory, pid: int, name: str, value: float) -> str:
+    path = os.path.join(directory, f"metrics_{pid}.db")
+    table = _SlotTable(path)
+    table.add(table.offset(json.dumps([name, []], separators=(",", ":"))), value)
+    return path
+
+
+def test_dead_worker_files_are_pruned(tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.counter("requests_total", "Requests")
+    registry.inc("requests_total", amount=3)
+    stale = _write_counter(str(tmp_path), _dead_pid(), "requests_total", 40)
+
+    assert "requests_total 3\n" in registry.render()
+    assert not os.path.exists(stale)
+
+
+def test_live_worker_files_are_merged(tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.counter("requests_total", "Requests")
+    registry.inc("requests_total", amount=3)
+    # A running process other than this one
+    with subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]) as sibling:
+        try:
+            _write_counter(str(tmp_path), sibling.pid, "requests_total", 4)
+            assert "requests_total 7\n" in registry.render()
+        finally:
+            sibling.kill()
+
+
+def test_worker_removes_its_file_on_exit(tmp_path):
+    script = (
+        "from app.core.metrics import MetricsRegistry\n"
+        f"registry = MetricsRegistry(directory={str(tmp_path)!r})\n"
+        "registry.counter('requests_total', 'Requests')\n"
+        "registry.inc('requests_total')\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_reused_pid_starts_from_zero(tmp_path):
+    _write_counter(str(tmp_path), os.getpid(), "requests_total", 40)
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.counter("requests_total", "Requests")
+    registry.inc("requests_total")
+    assert "requests_total 1\n" in registry.render()
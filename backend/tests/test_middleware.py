@@ -0,0 +1,46 @@
+"""Middleware installed on the served app"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.middleware import RateLimitMiddleware, RequestLoggingMiddleware, RequestValidationMiddleware
+
+
+def _installed():
+    return [middleware.cls for middleware in app.user_middleware]
+
+
+def test_rate_limiting_is_installed():
+    assert RateLimitMiddleware in _installed()
+
+
+def test_rate_limit_rejects_with_retry_after():
+    limited = FastAPI()
+
+    @limited.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    limited.add_middleware(RateLimitMiddleware, limit=2, window=60, routes={})
+    client = TestClient(limited)
+    assert [client.get("/ping").status_code for _ in range(3)] == [200, 200, 429]
+    assert int(client.get("/ping").headers["Retry-After"]) >= 1
+
+
+def test_request_logging_is_outermost():
+    assert _installed()[0] is RequestLoggingMiddleware
+
+
+def test_request_validation_is_installed():
+    assert RequestValidationMiddleware in _installed()
+
+
+def test_request_validation_rejects_bad_bodies(client, auth_headers):
+    response = client.post("/patients/", content=b"name=x", headers={
+        **auth_headers, "Content-Type": "text/plain",
+    })
+    assert response.status_code == 415
+    response = client.post("/patients/", content=b"{}", headers={
+        **auth_headers, "Content-Type": "application/json", "Content-Length": str(10 ** 9),
+    })
+    assert response.status_code == 413
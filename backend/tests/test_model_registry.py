@@ -0,0 +1,130 @@
+"""Memory-mapped int8 model artifacts and the registry's memory budget"""
+import math
+import os
+import random
+import time
+
+import pytest
+
+from app.services import model_registry
+from app.services.model_registry import ModelBudgetError, ModelRegistry, QuantizedModel, write_artifact
+
+SYMPTOMS = ["fever", "chills", "headache", "cough", "rash", "fatigue"]
+LABELS = ["malaria", "typhoid", "influenza"]
+
+
+def _float_layers(seed: int, hidden: int = 8):
+    rng = random.Random(seed)
+    shapes = [(hidden, len(SYMPTOMS)), (len(LABELS), hidden)]
+    return [([[rng.uniform(-2, 2) for _ in range(cols)] for _ in range(rows)],
+             [rng.uniform(-0.5, 0.5) for _ in range(rows)])
+            for rows, cols in shapes]
+
+
+def _float_predict(layers, symptoms):
+    x = [1.0 if name in symptoms else 0.0 for name in SYMPTOMS]
+    for index, (weights, bias) in enumerate(layers):
+        x = [sum(w * v for w, v in zip(row, x)) + b for row, b in zip(weights, bias)]
+        if index < len(layers) - 1:
+            x = [max(value, 0.0) for value in x]
+    exps = [math.exp(value - max(x)) for value in x]
+    return dict(zip(LABELS, (value / sum(exps) for value in exps)))
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(model_registry, "HAVE_NUMPY", request.param == "numpy")
+    return request.param
+
+
+def test_artifact_round_trip_matches_float_model(tmp_path, backend):
+    layers = _float_layers(seed=1)
+    path = str(tmp_path / "symptom.smq")
+    size = write_artifact(path, SYMPTOMS, LABELS, layers, metadata={"source": "test"})
+    assert size == os.path.getsize(path)
+
+    model = QuantizedModel(path, "symptom")
+    try:
+        assert model.inputs == SYMPTOMS and model.labels == LABELS
+        assert model.metadata == {"source": "test"}
+        for symptoms in (["fever", "chills"], ["cough"], ["rash", "fatigue", "headache"], [], ["unknown"]):
+            expected = _float_predict(layers, symptoms)
+            predicted = model.predict(symptoms)
+            assert predicted.keys() == expected.keys()
+            assert sum(predicted.values()) == pytest.approx(1.0)
+            for label in LABELS:
+                assert predicted[label] == pytest.approx(expected[label], abs=0.03)
+    finally:
+        model.close()
+
+
+def test_not_an_artifact(tmp_path):
+    path = tmp_path / "symptom.smq"
+    path.write_bytes(b"not a model" * 10)
+    with pytest.raises(ValueError):
+        QuantizedModel(str(path), "symptom")
+
+
+def _registry_with(tmp_path, names, models_in_budget, **settings):
+    sizes = {name: write_artifact(str(tmp_path / f"{name}.smq"), SYMPTOMS, LABELS, _float_layers(seed=index))
+             for index, name in enumerate(names)}
+    budget = models_in_budget * max(sizes.values())
+    return ModelRegistry(model_dir=str(tmp_path), budget_mb=budget / 2**20, **settings)
+
+
+def test_least_recently_used_model_is_evicted_over_budget(tmp_path):
+    registry = _registry_with(tmp_path, ["symptom", "image", "voice"], models_in_budget=2)
+    try:
+        assert registry.predict("symptom", ["fever"]) is not None
+        assert registry.predict("image", ["fever"]) is not None
+        # Touch symptom so image is the least recently used
+        registry.predict("symptom", ["cough"])
+        assert registry.predict("voice", ["fever"]) is not None
+
+        loaded = registry.stats()["models"]
+        assert [name for name in ("image", "symptom", "voice") if loaded[name]["loaded"]] == ["symptom", "voice"]
+        assert registry.evictions == 1
+        assert registry.used_bytes <= registry.budget_bytes
+        # Reloaded on the next use
+        assert registry.predict("image", ["fever"]) is not None
+        assert registry.stats()["models"]["image"]["loads"] == 2
+    finally:
+        registry.unload_all()
+
+
+def test_model_in_use_is_never_evicted(tmp_path):
+    registry = _registry_with(tmp_path, ["symptom", "image"], models_in_budget=1)
+    try:
+        with registry.use("symptom") as model:
+            with pytest.raises(ModelBudgetError):
+                with registry.use("image"):
+                    pass
+            assert model.predict(["fever"])
+        assert registry.predict("image", ["fever"]) is not None
+        assert registry.evictions == 1
+    finally:
+        registry.unload_all()
+
+
+def test_idle_models_are_swept(tmp_path):
+    registry = _registry_with(tmp_path, ["symptom", "image"], models_in_budget=2, idle_seconds=60)
+    try:
+        registry.predict("symptom", ["fever"])
+        registry.predict("image", ["fever"])
+        assert registry.evict_idle() == 0
+        assert registry.evict_idle(now=time.monotonic() + 60) == 2
+        assert registry.used_bytes == 0
+
+        # The background sweeper does the same on its own
+        registry.idle_seconds = 0.0
+        registry.predict("symptom", ["fever"])
+        registry.start()
+        deadline = time.monotonic() + 5
+        while registry.used_bytes and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert registry.used_bytes == 0
+    finally:
+        registry.stop()
+        registry.unload_all()
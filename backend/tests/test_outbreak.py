@@ -0,0 +1,210 @@
+"""Streaming outbreak detection over weekly diagnosis counts"""
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models
+from app.db.migrations import migrate
+from app.services import outbreak
+from app.services.latest_value_stream import LatestValueStream
+from app.services.outbreak import OutbreakDetector, OutbreakMonitor
+
+WEEK_MINUTES = 7 * 24 * 60
+# Start of a weekly bucket (buckets count from the Unix epoch)
+WEEK_0 = datetime(1970, 1, 1) + timedelta(weeks=2900)
+
+
+def _detector(**settings) -> OutbreakDetector:
+    # One-week window, a 12-week baseline and 3 weeks of warm-up
+    defaults = dict(bucket_minutes=WEEK_MINUTES, window_buckets=1, baseline_days=12 * 7,
+                    min_cases=5, z_threshold=4.0, diseases=())
+    defaults.update(settings)
+    return OutbreakDetector(**defaults)
+
+
+def _feed_week(detector, week, cases, district="Gulu", disease="malaria"):
+    """Process ``cases`` diagnoses spread over ``week``; returns (case number, alert) for each alert"""
+    alerts = []
+    for case in range(cases):
+        when = WEEK_0 + timedelta(weeks=week, minutes=case)
+        alert = detector.process(district, disease, when)
+        if alert is not None:
+            alerts.append((case + 1, alert))
+    return alerts
+
+
+def _series(detector, district="Gulu", disease="malaria"):
+    fields = ("district", "disease", "head", "total", "mean", "var", "seen", "quiet_until", "ring")
+    for entry in detector.state()["series"]:
+        if entry[:2] == [district, disease]:
+            return dict(zip(fields, entry))
+    return None
+
+
+def _monitor(detector, checkpoint_path=None) -> OutbreakMonitor:
+    stream = LatestValueStream("Outbreak alert", order_key=attrgetter("id"))
+    return OutbreakMonitor(detector, stream, checkpoint_path=checkpoint_path)
+
+
+def test_steady_counts_never_alert():
+    detector = _detector()
+    for week in range(30):
+        assert _feed_week(detector, week, 10) == []
+    assert detector.alerts == 0
+
+
+def test_baseline_is_an_ewma_of_past_weeks():
+    detector = _detector()
+    for week in range(20):
+        _feed_week(detector, week, 10)
+    assert _series(detector)["mean"] == pytest.approx(10.0)
+    assert _series(detector)["var"] == pytest.approx(0.0)
+
+    # A gradual rise moves the baseline along without alerting
+    alpha = detector.alpha
+    for week in range(20, 30):
+        assert _feed_week(detector, week, 14) == []
+    # Weeks 20-28 have left the window and been learned
+    assert _series(detector)["mean"] == pytest.approx(14 - 4 * (1 - alpha) ** 9)
+
+
+def test_spike_alerts_at_the_threshold_crossing():
+    detector = _detector()
+    for week in range(20):
+        _feed_week(detector, week, 10)
+
+    alerts = _feed_week(detector, 20, 40)
+    # Expected 10 a week with a Poisson deviation of sqrt(10): 4 deviations is 22.6 cases
+    assert [case for case, _ in alerts] == [23]
+    alert = alerts[0][1]
+    assert alert["district"] == "Gulu" and alert["disease"] == "malaria"
+    assert alert["cases"] == 23
+    assert alert["expected"] == pytest.approx(10.0)
+    assert alert["z_score"] >= 4.0
+    assert alert["window_start"] == WEEK_0 + timedelta(weeks=20)
+    assert alert["window_end"] == WEEK_0 + timedelta(weeks=21)
+    # Quiet for the rest of the window
+    assert detector.alerts == 1
+
+
+def test_sparse_series_needs_min_cases():
+    detector = _detector()
+    _feed_week(detector, 0, 1, district="Lira")
+    # A zero baseline still needs OUTBREAK_MIN_CASES cases in the window
+    alerts = _feed_week(detector, 10, 5)
+    assert [case for case, _ in alerts] == [5]
+
+
+def test_no_alert_before_the_baseline_has_warmed_up():
+    detector = _detector()
+    # The first weeks the detector sees: no baseline to compare against yet
+    for week in range(detector.warmup_buckets):
+        assert _feed_week(detector, week, 50) == []
+    assert _series(detector)["seen"] < detector.warmup_buckets
+
+    # A series that appears later had no cases in the weeks already seen
+    for week in range(detector.warmup_buckets, 10):
+        _feed_week(detector, week, 10)
+    assert _feed_week(detector, 10, 10, district="Kitgum")
+
+
+def test_replayed_events_are_ignored():
+    detector = _detector()
+    when = WEEK_0
+    assert detector.process("Gulu", "malaria", when, event_id=1) is None
+    detector.process("Gulu", "malaria", when, event_id=1)
+    assert detector.events == 1 and detector.last_id == 1
+
+
+def test_checkpoint_restores_the_same_detector(tmp_path):
+    path = str(tmp_path / "outbreak_checkpoint.json")
+    times = [WEEK_0 + timedelta(weeks=week, minutes=case) for week in range(20) for case in range(10)]
+    history = [("Gulu", "malaria", when, event_id) for event_id, when in enumerate(times, start=1)]
+    spike = [("Gulu", "malaria", WEEK_0 + timedelta(weeks=20, minutes=case), len(history) + case + 1)
+             for case in range(40)]
+
+    uninterrupted = _monitor(_detector())
+    uninterrupted.feed(history + spike)
+
+    before = _monitor(_detector(), checkpoint_path=path)
+    before.feed(history)
+    before.checkpoint()
+    restarted = _monitor(_detector(), checkpoint_path=path)
+    assert restarted.load_checkpoint()
+    assert restarted.detector.state() == before.detector.state()
+    assert restarted.detector.last_id == len(history)
+
+    # Replaying what the checkpoint already covers raises nothing
+    assert restarted.feed(history) == 0
+    assert restarted.feed(spike) == 1
+    assert restarted.detector.state() == uninterrupted.detector.state()
+
+
+def test_checkpoint_with_other_settings_is_ignored(tmp_path):
+    path = str(tmp_path / "outbreak_checkpoint.json")
+    monitor = _monitor(_detector(), checkpoint_path=path)
+    monitor.feed([("Gulu", "malaria", WEEK_0, 1)])
+    monitor.checkpoint()
+    assert not _monitor(_detector(window_buckets=2), checkpoint_path=path).load_checkpoint()
+
+
+@pytest.fixture
+def scratch_sessions(tmp_path, monkeypatch):
+    """Sessions on an empty database that the monitor also reads from"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbreak.db'}")
+    migrate(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(outbreak, "ReadSessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def _diagnosis(session, district, created_at=None):
+    patient = models.Patient(first_name="Akello", last_name="Atim", district=district)
+    session.add(patient)
+    session.flush()
+    diagnosis = models.Diagnosis(patient_id=patient.id, diagnosis_type="malaria", symptoms=["fever"],
+                                 created_at=created_at or datetime.utcnow())
+    session.add(diagnosis)
+    return diagnosis
+
+
+def test_cold_start_replays_only_the_baseline_horizon(scratch_sessions):
+    detector = OutbreakDetector(diseases=())
+    with scratch_sessions() as session:
+        old = _diagnosis(session, "Old", datetime.utcnow() - timedelta(days=365))
+        recent = _diagnosis(session, "Recent", datetime.utcnow() - timedelta(days=1))
+        session.commit()
+        old_id, recent_id = old.id, recent.id
+
+    monitor = _monitor(detector)
+    assert not monitor.load_checkpoint()
+    monitor._cold_start()
+    assert detector.last_id == old_id < recent_id
+    assert monitor.catch_up() == 1
+    assert _series(detector, "Recent") is not None
+    assert _series(detector, "Old") is None
+
+
+def test_rolled_back_diagnosis_never_reaches_the_detector(scratch_sessions):
+    detector = _detector(bucket_minutes=60, window_buckets=24, baseline_days=28)
+    monitor = _monitor(detector)
+    monitor.mode = "hook"
+    monitor.watch(scratch_sessions)
+
+    with scratch_sessions() as session:
+        _diagnosis(session, "Gulu")
+        session.flush()
+        assert len(session.info["outbreak_events"]) == 1
+        # Flushed but not committed: nothing is fed yet
+        assert detector.events == 0
+        session.rollback()
+        assert "outbreak_events" not in session.info
+
+        _diagnosis(session, "Gulu")
+        session.commit()
+    assert detector.events == 1
+    assert _series(detector, "Gulu")["total"] == 1
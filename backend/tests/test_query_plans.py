@@ -0,0 +1,68 @@
+"""EXPLAIN QUERY PLAN checks for the hot queries behind the API.
+
+Every query the endpoints run on a filter or sort column is listed in
+``HOT_QUERIES``; each must be answered from an index, without a full table
+scan or a temporary sort, on a database built by the migrations.
+"""
+from datetime import date
+from typing import Callable, Dict, List
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from app.db.models import Diagnosis, EnergyLog, Patient
+from app.db.surveillance import surveillance_query
+
+HOT_QUERIES: Dict[str, Callable[[], Select]] = {
+    "patient_by_id": lambda: select(Patient).where(Patient.id == 1),
+    "patient_by_qr_code": lambda: select(Patient).where(Patient.qr_code == "SM-0001"),
+    "diagnosis_by_id": lambda: select(Diagnosis).where(Diagnosis.id == 1),
+    "diagnoses_by_patient": lambda: select(Diagnosis).where(Diagnosis.patient_id == 1),
+    "unsynced_diagnoses": lambda: select(Diagnosis).where(Diagnosis.synced == False),  # noqa: E712
+    "unsynced_diagnoses_count": lambda: (
+        select(func.count()).select_from(Diagnosis).where(Diagnosis.synced == False)  # noqa: E712
+    ),
+    "unsynced_energy_logs": lambda: select(EnergyLog).where(EnergyLog.synced == False),  # noqa: E712
+    "unsynced_energy_logs_count": lambda: (
+        select(func.count()).select_from(EnergyLog).where(EnergyLog.synced == False)  # noqa: E712
+    ),
+    "latest_energy_log": lambda: select(EnergyLog).order_by(EnergyLog.timestamp.desc()).limit(1),
+    "energy_logs_page": lambda: select(EnergyLog).order_by(EnergyLog.timestamp.desc()).offset(0).limit(100),
+    "surveillance_by_village": lambda: surveillance_query(date(2025, 1, 1), date(2025, 3, 31), district="Kole"),
+    "surveillance_by_district": lambda: surveillance_query(date(2025, 1, 1), date(2025, 3, 31), disease="malaria",
+                                                           by_village=False),
+}
+
+
+def explain(conn: Connection, statement: Select) -> List[str]:
+    """Return the detail column of EXPLAIN QUERY PLAN for a statement"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(plan: List[str]) -> List[str]:
+    """Plan steps that indicate a full table scan or an unindexed sort"""
+    problems = []
+    for detail in plan:
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            problems.append(detail)
+        elif detail.startswith("USE TEMP B-TREE"):
+            problems.append(detail)
+    return problems
+
+
+def test_plan_problems_flags_scans_and_sorts():
+    assert plan_problems(["SCAN patients", "USE TEMP B-TREE FOR ORDER BY"]) == [
+        "SCAN patients", "USE TEMP B-TREE FOR ORDER BY"]
+    assert plan_problems(["SCAN energy_logs USING INDEX ix_energy_logs_timestamp",
+                          "SEARCH patients USING INTEGER PRIMARY KEY (rowid=?)"]) == []
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(database, name):
+    with database.connect() as conn:
+        plan = explain(conn, HOT_QUERIES[name]())
+    assert not plan_problems(plan), f"{name} plan: {plan}"
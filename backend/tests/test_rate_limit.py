@@ -0,0 +1,28 @@
+"""Token-bucket rate limiting"""
+import asyncio
+import sqlite3
+import time
+
+from app.core.rate_limit import SharedTokenBucketLimiter
+
+
+def test_shared_limiter_waits_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    limiter = SharedTokenBucketLimiter(path, limit=5, window=60, routes={})
+    # Another worker holding the bucket file's write lock
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def scenario():
+        hit = asyncio.ensure_future(limiter.hit_async("10.0.0.1", "/"))
+        start = time.perf_counter()
+        await asyncio.sleep(0.05)
+        loop_lag = time.perf_counter() - start - 0.05
+        assert not hit.done()
+        other.execute("COMMIT")
+        return loop_lag, await hit
+
+    loop_lag, (allowed, retry_after) = asyncio.run(scenario())
+    other.close()
+    assert loop_lag < 0.04
+    assert allowed and retry_after == 0.0
@@ -0,0 +1,41 @@
+"""Import-time regression check for the API.
+
+``app.main`` is imported in a fresh interpreter, so nothing is cached
+in-process. It must not import any of the heavy ML modules and must stay
+within ``IMPORT_BUDGET_SECONDS``.
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous for a dev machine; the Pi target is a few times slower
+IMPORT_BUDGET_SECONDS = 5.0
+
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+from app.core.lazy_imports import loaded_heavy_modules
+print(json.dumps({"seconds": elapsed, "heavy": loaded_heavy_modules()}))
+"""
+
+
+def _import_app_main() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=BACKEND_DIR, env=dict(os.environ), capture_output=True, text=True, check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def test_app_main_imports_no_heavy_modules():
+    assert _import_app_main()["heavy"] == []
+
+
+def test_app_main_import_time():
+    # Best of three, so a busy CI machine doesn't fail the build
+    seconds = min(_import_app_main()["seconds"] for _ in range(3))
+    assert seconds <= IMPORT_BUDGET_SECONDS
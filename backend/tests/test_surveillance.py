@@ -0,0 +1,70 @@
+"""Incremental surveillance counts agree with a rebuild from scratch"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.db import surveillance
+from app.db.models import Diagnosis, Patient, SurveillanceDistrictWeek, SurveillanceWeek
+
+
+def _counts(conn):
+    return (
+        sorted(conn.execute(select(SurveillanceWeek.week_start, SurveillanceWeek.district, SurveillanceWeek.disease,
+                                   SurveillanceWeek.village, SurveillanceWeek.count)).all()),
+        sorted(conn.execute(select(SurveillanceDistrictWeek.week_start, SurveillanceDistrictWeek.district,
+                                   SurveillanceDistrictWeek.disease, SurveillanceDistrictWeek.count)).all()),
+    )
+
+
+def _patient_with_diagnoses(session: Session) -> Patient:
+    patient = Patient(first_name="Okot", last_name="Ayella", district="Kitgum", village="Pager")
+    session.add(patient)
+    session.flush()
+    session.add_all([Diagnosis(patient_id=patient.id, diagnosis_type=kind, symptoms=["fever"])
+                     for kind in ("malaria", "malaria", "tuberculosis")])
+    session.commit()
+    return patient
+
+
+def _assert_matches_rebuild(database):
+    with database.begin() as conn:
+        incremental = _counts(conn)
+        surveillance.rebuild(conn)
+        assert _counts(conn) == incremental
+
+
+def test_patient_delete_matches_rebuild(database, client, auth_headers):
+    with Session(database) as session:
+        patient_id = _patient_with_diagnoses(session).id
+
+    response = client.delete(f"/patients/api/patients/{patient_id}", headers=auth_headers)
+    assert response.status_code == 204, response.text
+    _assert_matches_rebuild(database)
+
+
+def test_patient_delete_leaving_diagnoses_matches_rebuild(database):
+    with Session(database) as session:
+        patient = _patient_with_diagnoses(session)
+        # As if the relationship left the diagnoses in place, like a passive delete
+        set_committed_value(patient, "diagnoses", [])
+        session.delete(patient)
+        session.commit()
+        # Detached, so a new patient given the reused id doesn't adopt them
+        assert session.scalar(select(func.count()).where(Diagnosis.patient_id == patient.id)) == 0
+    _assert_matches_rebuild(database)
+
+
+def test_prediction_and_type_share_a_disease_key(database):
+    with Session(database) as session:
+        patient = Patient(first_name="Lamwaka", last_name="Adong", district="Amuru", village="Pabbo")
+        session.add(patient)
+        session.flush()
+        session.add_all([
+            Diagnosis(patient_id=patient.id, diagnosis="covid19", diagnosis_type="covid", symptoms=["cough"]),
+            Diagnosis(patient_id=patient.id, diagnosis_type="covid", symptoms=["fever"]),
+        ])
+        session.commit()
+    with database.connect() as conn:
+        rows = conn.execute(surveillance.surveillance_query(district="Amuru", disease="covid19")).all()
+    assert [(row.disease, row.count) for row in rows] == [("covid", 2)]
+    _assert_matches_rebuild(database)
@@ -0,0 +1,63 @@
+"""Scheduler lease shared by worker processes"""
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import sys
+from app.core.workers import scheduler_lease
+
+def start():
+    print("scheduler", flush=True)
+
+if scheduler_lease.acquire():
+    start()
+else:
+    scheduler_lease.on_takeover(start)
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def _spawn(env):
+    worker = subprocess.Popen([sys.executable, "-c", WORKER], cwd=BACKEND_DIR, env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    worker.lines = queue.Queue()
+    threading.Thread(target=lambda: [worker.lines.put(line.strip()) for line in worker.stdout], daemon=True).start()
+    return worker
+
+
+def _readline(worker, timeout):
+    try:
+        return worker.lines.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+def test_another_worker_takes_over_when_the_scheduler_dies(tmp_path):
+    env = dict(os.environ, SHARED_STATE_DIR=str(tmp_path / "shared"), SCHEDULER_LEASE_RETRY="0.1")
+    holder = _spawn(env)
+    other = None
+    try:
+        assert _readline(holder, 30) == "scheduler"
+        assert _readline(holder, 30) == "ready"
+        other = _spawn(env)
+        assert _readline(other, 30) == "ready"
+        # Still held: no takeover while the scheduler worker is alive
+        assert _readline(other, 0.5) is None
+
+        holder.send_signal(signal.SIGKILL)
+        holder.wait()
+        assert _readline(other, 10) == "scheduler"
+    finally:
+        if holder.poll() is None:
+            holder.kill()
+        holder.wait()
+        if other is not None:
+            other.stdin.close()
+            other.wait()